@@ -1,28 +1,311 @@
-from typing import Dict, Iterable
+import asyncio
+import contextlib
+import functools
+import logging
+import time
+import uuid
+from enum import Enum
+from typing import Dict, Iterable, List, Optional, Set
 
-from fastapi import WebSocket
+from fastapi import WebSocket, status
+
+from app.config import settings
+from app.database import PoolUsage
+from app.metrics import metrics
+from app.services.chat_broker import ChatBroker, create_broker, user_channel
+from app.services.chat_codec import LEGACY_JSON, Frame, FrameCodec, negotiate
+from app.services.chat_presence import PresenceTracker, TypingCoalescer
+from app.utils.rate_limit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+
+class OverflowPolicy(str, Enum):
+    DROP = "drop"
+    DISCONNECT = "disconnect"
+
+
+class ClientConnection:
+    """A single socket with its own bounded outbound queue and writer task.
+
+    Producers only ever enqueue, so a slow reader fills its own queue instead
+    of holding up delivery to everyone else. Queued frames are already
+    encoded with the socket's negotiated codec.
+    """
+
+    def __init__(
+        self,
+        user_id: int,
+        websocket: Optional[WebSocket],
+        *,
+        max_queue: int,
+        overflow: OverflowPolicy,
+        coalesce_ms: int = 0,
+        batch_frames: bool = False,
+        codec: FrameCodec = LEGACY_JSON,
+    ):
+        self.user_id = user_id
+        self.websocket = websocket
+        self.codec = codec
+        self.queue: "asyncio.Queue[Frame]" = asyncio.Queue(maxsize=max_queue)
+        self.overflow = overflow
+        self.coalesce_delay = coalesce_ms / 1000
+        # Clients that opt in receive frames queued close together as one array frame
+        self.batch_frames = batch_frames
+        self.dropped = 0
+        self.closed = False
+        self.last_activity = time.monotonic()
+        self.last_ping = 0.0
+        # Database work done for this socket; each message is its own short session
+        self.db_usage = PoolUsage()
+        self._send_lock = asyncio.Lock()
+        self._writer: Optional[asyncio.Task] = None
+        # Held so the overflow close is not garbage-collected mid-flight
+        self._close_task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._writer = asyncio.create_task(self._drain())
+
+    def enqueue(self, message: dict) -> bool:
+        return self.enqueue_frame(self.codec.encode(message))
+
+    def enqueue_frame(self, frame: Frame) -> bool:
+        return self._put(frame)
+
+    def deliver(self, message: dict, frame: Frame) -> bool:
+        """Queue a fan-out ``frame``, already encoded from ``message`` with this connection's codec."""
+        return self.enqueue_frame(frame)
+
+    def _put(self, item) -> bool:
+        if self.closed:
+            return False
+        try:
+            self.queue.put_nowait(item)
+            return True
+        except asyncio.QueueFull:
+            self.dropped += 1
+            if self.overflow == OverflowPolicy.DISCONNECT:
+                if self._close_task is None:
+                    logger.warning(f"Outbound queue full for user {self.user_id}; disconnecting slow client")
+                    self._close_task = asyncio.create_task(self.close(code=status.WS_1013_TRY_AGAIN_LATER))
+            return False
+
+    async def close(self, code: int = status.WS_1000_NORMAL_CLOSURE):
+        if self.closed:
+            return
+        self.closed = True
+        if self._writer is not None and self._writer is not asyncio.current_task():
+            self._writer.cancel()
+        try:
+            await self.websocket.close(code=code)
+        except Exception:
+            # Already closed by the peer
+            pass
+
+    @contextlib.asynccontextmanager
+    async def paused(self):
+        """Hold queued delivery so frames can be written ahead of it via ``send_now``."""
+        async with self._send_lock:
+            yield
+
+    async def send_now(self, message: dict):
+        """Write ``message`` immediately; only valid inside ``paused()``."""
+        await self._send(self.codec.encode(message))
+
+    def _take_pending(self) -> List[Frame]:
+        frames = []
+        while not self.queue.empty():
+            frames.append(self.queue.get_nowait())
+        return frames
+
+    async def _send(self, frame: Frame):
+        if self.codec.binary:
+            await self.websocket.send_bytes(frame)
+        else:
+            await self.websocket.send_text(frame)
+
+    async def _drain(self):
+        try:
+            while True:
+                frames = [await self.queue.get()]
+                if self.batch_frames and self.coalesce_delay:
+                    await asyncio.sleep(self.coalesce_delay)
+                async with self._send_lock:
+                    frames.extend(self._take_pending())
+                    if self.batch_frames and len(frames) > 1:
+                        await self._send(self.codec.encode_batch(frames))
+                    else:
+                        for frame in frames:
+                            await self._send(frame)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.debug(f"Writer for user {self.user_id} stopped: {e}")
+            self.closed = True
 
 
 class ConnectionManager:
-    def __init__(self):
-        # Maps user_id to their active WebSocket connection
-        self.active_connections: Dict[int, WebSocket] = {}
+    def __init__(self, broker: Optional[ChatBroker] = None):
+        # Maps user_id to every socket (device) that user has open on this node
+        self.active_connections: Dict[int, Set[ClientConnection]] = {}
+        # Users connected to other nodes are reached through the broker
+        self.broker = broker or create_broker(settings.CHAT_BROKER_URL)
+        self.node_id = uuid.uuid4().hex
+        self.presence = PresenceTracker(
+            self,
+            interval=settings.CHAT_PRESENCE_INTERVAL_SECONDS,
+            timeout=settings.CHAT_PRESENCE_TIMEOUT_SECONDS,
+            max_watch=settings.CHAT_PRESENCE_MAX_WATCH,
+        )
+        self.typing = TypingCoalescer(
+            self,
+            flush_interval=settings.CHAT_TYPING_FLUSH_MS / 1000,
+            min_interval=settings.CHAT_TYPING_MIN_INTERVAL_MS / 1000,
+        )
+        # Inbound send budget per connected user, shared by all of their sockets
+        self.send_buckets: Dict[int, TokenBucket] = {}
+        self.heartbeat_interval = settings.CHAT_HEARTBEAT_INTERVAL_SECONDS
+        self.idle_timeout = settings.CHAT_IDLE_TIMEOUT_SECONDS
+        self._reaper: Optional[asyncio.Task] = None
+        metrics.gauge("chat.sockets.open", lambda: len(self._connections()))
+        metrics.gauge("chat.users.connected", lambda: len(self.active_connections))
+        metrics.gauge(
+            "chat.sockets.holding_db",
+            lambda: sum(1 for connection in self._connections() if connection.db_usage.in_flight),
+        )
+        metrics.gauge(
+            "chat.sockets.db_checkouts_max",
+            lambda: max((connection.db_usage.checkouts for connection in self._connections()), default=0),
+        )
 
-    async def connect(self, user_id: int, websocket: WebSocket):
-        await websocket.accept()
-        self.active_connections[user_id] = websocket
+    def _connections(self) -> List[ClientConnection]:
+        return [connection for connections in self.active_connections.values() for connection in connections]
 
-    def disconnect(self, user_id: int):
-        self.active_connections.pop(user_id, None)
+    async def start(self):
+        await self.broker.start()
+        await self.presence.start()
+        await self.typing.start()
+        self._reaper = asyncio.create_task(self._run_heartbeats())
 
-    async def send_personal_message(self, message: dict, user_id: int):
-        websocket = self.active_connections.get(user_id)
-        if websocket:
-            await websocket.send_json(message)
+    async def stop(self):
+        if self._reaper is not None:
+            self._reaper.cancel()
+            self._reaper = None
+        await self.typing.stop()
+        await self.presence.stop()
+        for connections in list(self.active_connections.values()):
+            for connection in list(connections):
+                await connection.close(code=status.WS_1001_GOING_AWAY)
+        await self.broker.stop()
+
+    async def connect(self, user_id: int, websocket: WebSocket, *, batch_frames: bool = False) -> ClientConnection:
+        codec = negotiate(websocket.scope.get("subprotocols", ()))
+        await websocket.accept(subprotocol=codec.subprotocol)
+        connection = ClientConnection(
+            user_id,
+            websocket,
+            max_queue=settings.CHAT_OUTBOUND_QUEUE_SIZE,
+            overflow=OverflowPolicy(settings.CHAT_OVERFLOW_POLICY),
+            coalesce_ms=settings.CHAT_COALESCE_MS,
+            batch_frames=batch_frames,
+            codec=codec,
+        )
+        await self.register(connection)
+        return connection
+
+    async def register(self, connection: ClientConnection):
+        """Start ``connection`` and route the user's fan-out to it (any transport)."""
+        user_id = connection.user_id
+        connection.start()
+        metrics.incr("chat.sockets.connected")
+        connections = self.active_connections.setdefault(user_id, set())
+        connections.add(connection)
+        if len(connections) == 1:
+            self.send_buckets[user_id] = TokenBucket(settings.CHAT_SEND_RATE_PER_SECOND, settings.CHAT_SEND_BURST)
+            await self.broker.subscribe(user_channel(user_id), functools.partial(self._on_broker_message, user_id))
+
+    async def disconnect(self, connection: ClientConnection, code: int = status.WS_1000_NORMAL_CLOSURE):
+        await connection.close(code=code)
+        self.presence.forget(connection)
+        connections = self.active_connections.get(connection.user_id)
+        if connections is None or connection not in connections:
+            return
+        connections.discard(connection)
+        metrics.observe("chat.socket.db_checkouts", connection.db_usage.checkouts)
+        metrics.observe("chat.socket.db_units", connection.db_usage.units)
+        if not connections:
+            del self.active_connections[connection.user_id]
+            self.send_buckets.pop(connection.user_id, None)
+            await self.broker.unsubscribe(user_channel(connection.user_id))
+
+    def throttle(self, connection: ClientConnection) -> Optional[float]:
+        """Spend one token of the user's inbound budget.
 
-    async def broadcast(self, message: dict, user_ids: Iterable[int]):
+        Returns None when the frame may proceed, otherwise the seconds until it would.
+        """
+        bucket = self.send_buckets.get(connection.user_id)
+        if bucket is None or bucket.take():
+            return None
+        metrics.incr("chat.frames.rate_limited")
+        return bucket.retry_after()
+
+    async def _run_heartbeats(self):
+        interval = min(self.heartbeat_interval, self.idle_timeout) / 2
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self._heartbeat()
+            except Exception:
+                logger.exception("Heartbeat sweep failed")
+
+    async def _heartbeat(self):
+        """Ping quiet sockets and close the ones that stopped answering (or whose writer died)."""
+        now = time.monotonic()
+        for connection in self._connections():
+            idle = now - connection.last_activity
+            if connection.closed or idle >= self.idle_timeout:
+                logger.info(f"Reaping socket for user {connection.user_id} after {idle:.0f}s idle")
+                metrics.incr("chat.sockets.reaped")
+                await self.disconnect(connection, code=status.WS_1001_GOING_AWAY)
+            elif idle >= self.heartbeat_interval and now - connection.last_ping >= self.heartbeat_interval:
+                connection.last_ping = now
+                connection.enqueue({"event": "ping"})
+
+    def _deliver_local(self, message: dict, user_ids: Iterable[int]):
+        # Encode once per codec, not once per recipient socket.
+        frames: Dict[FrameCodec, Frame] = {}
         for user_id in user_ids:
-            await self.send_personal_message(message, user_id)
+            for connection in self.active_connections.get(user_id, ()):
+                frame = frames.get(connection.codec)
+                if frame is None:
+                    frame = frames[connection.codec] = connection.codec.encode(message)
+                connection.deliver(message, frame)
+
+    async def _on_broker_message(self, user_id: int, envelope: dict):
+        # Our own publishes were already delivered locally.
+        if envelope.get("origin") == self.node_id:
+            return
+        self._deliver_local(envelope["message"], [user_id])
+
+    async def send_personal_message(self, message: dict, user_id: int):
+        await self.broadcast(message, [user_id])
+
+    async def broadcast(self, message: dict, user_ids: Iterable[int]) -> List[int]:
+        """Deliver ``message`` to every connection of ``user_ids`` on any node.
+
+        Returns the users no node has a connection for, i.e. who are offline.
+        """
+        user_ids = list(user_ids)
+        self._deliver_local(message, user_ids)
+        if self.broker.local:
+            # Every subscriber is in this process and has just been delivered to.
+            return [user_id for user_id in user_ids if user_id not in self.active_connections]
+        # One envelope for all recipients, so the broker serialises it once;
+        # each node learns the recipient from the channel it arrives on.
+        receivers = await self.broker.publish_many(
+            [user_channel(user_id) for user_id in user_ids], {"origin": self.node_id, "message": message}
+        )
+        return [user_id for user_id, count in zip(user_ids, receivers) if not count]
 
 
 manager = ConnectionManager()
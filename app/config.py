@@ -2,9 +2,36 @@ from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
     DATABASE_URL: str = "sqlite:///./app.db"
+    DATABASE_ECHO: bool = True
     SECRET_KEY: str = "CHANGE_ME_TO_RANDOM_KEY"
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60*24  # 1 day
+    # Authenticated principals are cached per worker; changes also invalidate them
+    PRINCIPAL_CACHE_SIZE: int = 10000
+    PRINCIPAL_CACHE_TTL_SECONDS: float = 60
+    # Revoked token IDs are held in a per-worker Bloom filter, rebuilt from the table periodically
+    TOKEN_REVOCATION_FILTER_CAPACITY: int = 100000
+    TOKEN_REVOCATION_FILTER_ERROR_RATE: float = 0.001
+    TOKEN_REVOCATION_REBUILD_SECONDS: float = 3600
+    # bcrypt runs in a process pool; stored hashes with another cost are rehashed at login
+    BCRYPT_ROUNDS: int = 12
+    PASSWORD_HASH_WORKERS: int = 2
+    PASSWORD_HASH_MAX_CONCURRENCY: int = 2
+    PASSWORD_HASH_MAX_QUEUE: int = 64
+    # Auth throttling as "count/period" token buckets (empty disables); a redis:// URL shares them across workers
+    AUTH_RATE_LIMIT_URL: str = ""
+    AUTH_LOGIN_RATE_PER_IP: str = "30/minute"
+    AUTH_LOGIN_RATE_PER_ACCOUNT: str = "10/minute"
+    AUTH_REGISTER_RATE_PER_IP: str = "10/hour"
+    AUTH_REGISTER_RATE_PER_ACCOUNT: str = "3/hour"
+    AUTH_RESEND_RATE_PER_IP: str = "10/hour"
+    AUTH_RESEND_RATE_PER_ACCOUNT: str = "3/hour"
+    # Proxies in front of the app that append to X-Forwarded-For (Fly/Render/Railway edge = 1; 0 trusts only the socket peer)
+    TRUSTED_PROXY_HOPS: int = 1
+    DB_EXECUTOR_WORKERS: int = 8
+    # SQLite durability pragmas, e.g. "WAL" / "NORMAL"; empty keeps the driver defaults
+    SQLITE_JOURNAL_MODE: str = ""
+    SQLITE_SYNCHRONOUS: str = ""
     UPLOAD_DIR: str = "./uploads"
     BASE_URL: str = "https://connectedcare-backend-production.up.railway.app"
     
@@ -18,5 +45,70 @@ class Settings(BaseSettings):
     MAIL_SSL_TLS: bool = False
     USE_CREDENTIALS: bool = True
     VALIDATE_CERTS: bool = True
+    # Outbound email goes through the EmailOutbox table and a worker with pooled SMTP connections
+    EMAIL_OUTBOX_ENABLED: bool = True
+    EMAIL_OUTBOX_BATCH_SIZE: int = 50
+    EMAIL_OUTBOX_POLL_SECONDS: float = 10
+    EMAIL_OUTBOX_LEASE_SECONDS: float = 300
+    EMAIL_SMTP_POOL_SIZE: int = 2
+    EMAIL_SMTP_TIMEOUT_SECONDS: float = 20
+    EMAIL_SMTP_IDLE_SECONDS: float = 60
+    EMAIL_MAX_ATTEMPTS: int = 8
+    EMAIL_RETRY_BASE_SECONDS: float = 30
+    EMAIL_RETRY_MAX_SECONDS: float = 3600
+    EMAIL_BREAKER_THRESHOLD: int = 5
+    EMAIL_BREAKER_RESET_SECONDS: float = 60
+    EMAIL_OUTBOX_RETENTION_DAYS: int = 30
+
+    # Chat fan-out: a redis:// URL enables cross-process delivery, empty stays in-process
+    CHAT_BROKER_URL: str = ""
+    # Per-socket outbound buffering; "drop" discards frames for a full queue, "disconnect" closes the socket
+    CHAT_OUTBOUND_QUEUE_SIZE: int = 256
+    CHAT_OVERFLOW_POLICY: str = "disconnect"
+    CHAT_COALESCE_MS: int = 5
+    # Conversation membership is cached per worker and reloaded after the TTL
+    CHAT_ROUTING_CACHE_SIZE: int = 50000
+    CHAT_ROUTING_TTL_SECONDS: float = 300
+    # Most messages replayed per conversation on resume/sync; clients page the rest
+    CHAT_RESUME_MAX_PER_CONVERSATION: int = 200
+    # Presence is heartbeat based; typing notices are coalesced per conversation
+    CHAT_PRESENCE_INTERVAL_SECONDS: float = 5
+    CHAT_PRESENCE_TIMEOUT_SECONDS: float = 45
+    CHAT_PRESENCE_MAX_WATCH: int = 500
+    CHAT_TYPING_FLUSH_MS: int = 300
+    CHAT_TYPING_MIN_INTERVAL_MS: int = 2000
+    # Write-behind persistence: messages are acknowledged first and group-committed
+    CHAT_WRITE_BEHIND: bool = False
+    CHAT_FLUSH_INTERVAL_MS: int = 25
+    CHAT_FLUSH_MAX_MESSAGES: int = 500
+    CHAT_ID_BLOCK_SIZE: int = 1000
+    CHAT_SEQ_CACHE_SIZE: int = 10000
+    # Messages older than this move to compressed MessageArchive blocks (0 disables archival)
+    CHAT_ARCHIVE_AFTER_DAYS: int = 180
+    CHAT_ARCHIVE_INTERVAL_SECONDS: float = 3600
+    CHAT_ARCHIVE_BLOCK_SIZE: int = 500
+    CHAT_ARCHIVE_MAX_BLOCKS_PER_RUN: int = 200
+    # Expired tokens and aged-out rows are deleted in short batches (0 disables the sweeper)
+    EXPIRY_SWEEP_INTERVAL_SECONDS: float = 900
+    EXPIRY_SWEEP_BATCH_SIZE: int = 500
+    EXPIRY_SWEEP_MAX_BATCHES: int = 20
+    HUMAN_ASSIST_ATTACHMENT_RETENTION_DAYS: int = 90
+    # Sockets silent for the heartbeat interval get a ping; silent past the idle timeout are closed
+    CHAT_HEARTBEAT_INTERVAL_SECONDS: float = 25
+    CHAT_IDLE_TIMEOUT_SECONDS: float = 75
+    CHAT_MAX_FRAME_BYTES: int = 64 * 1024
+    # Inbound frames per user, shared by all of the user's sockets on this node
+    CHAT_SEND_RATE_PER_SECOND: float = 5
+    CHAT_SEND_BURST: int = 20
+    # Push for offline chat recipients: "none" disables, "http" posts batches to PUSH_HTTP_URL, "stub" only logs (dev)
+    PUSH_TRANSPORT: str = "none"
+    PUSH_HTTP_URL: str = ""
+    PUSH_HTTP_API_KEY: str = ""
+    # Messages to the same user and conversation within this window become one notification
+    PUSH_COLLAPSE_SECONDS: float = 3
+    PUSH_BATCH_SIZE: int = 500
+    PUSH_MAX_PENDING: int = 100000
+    # Message text is health data; keep it out of provider payloads unless explicitly allowed
+    PUSH_INCLUDE_PREVIEW: bool = False
 
 settings = Settings()
\ No newline at end of file
@@ -1,13 +1,99 @@
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional, TypeVar
+
+from sqlalchemy import event
 from sqlmodel import SQLModel, create_engine, Session
 from app.config import settings
+from app.metrics import metrics
+
+T = TypeVar("T")
+
+engine = create_engine(settings.DATABASE_URL, echo=settings.DATABASE_ECHO)
+
+if engine.dialect.name == "sqlite" and (settings.SQLITE_JOURNAL_MODE or settings.SQLITE_SYNCHRONOUS):
+    @event.listens_for(engine, "connect")
+    def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        if settings.SQLITE_JOURNAL_MODE:
+            cursor.execute(f"PRAGMA journal_mode={settings.SQLITE_JOURNAL_MODE}")
+        if settings.SQLITE_SYNCHRONOUS:
+            cursor.execute(f"PRAGMA synchronous={settings.SQLITE_SYNCHRONOUS}")
+        cursor.close()
+
+# Pool usage, plus attribution of checkouts to whichever PoolUsage is
+# running a unit of work on the current thread (see run_in_session).
+_unit_usage = threading.local()
+
+@event.listens_for(engine, "checkout")
+def _count_checkout(dbapi_connection, connection_record, connection_proxy):
+    metrics.incr("db.pool.checkouts")
+    usage = getattr(_unit_usage, "current", None)
+    if usage is not None:
+        usage.checkouts += 1
+
+metrics.gauge("db.pool.checked_out", lambda: engine.pool.checkedout())
+metrics.gauge("db.pool.size", lambda: engine.pool.size())
 
-engine = create_engine(settings.DATABASE_URL, echo=True)
+# Blocking ORM work issued from async code (e.g. the chat websocket) runs on
+# these threads so a slow query or commit never stalls the event loop.
+db_executor = ThreadPoolExecutor(
+    max_workers=settings.DB_EXECUTOR_WORKERS, thread_name_prefix="db"
+)
+
+async def run_db(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(db_executor, functools.partial(fn, *args, **kwargs))
+
+class PoolUsage:
+    """Units of work and pool checkouts made on behalf of one long-lived caller."""
+
+    def __init__(self):
+        self.units = 0
+        self.checkouts = 0
+        self.in_flight = 0
+
+async def run_in_session(
+    fn: Callable[..., T], *args: Any, usage: Optional[PoolUsage] = None, **kwargs: Any
+) -> T:
+    """Run ``fn(session, *args, **kwargs)`` on a DB thread inside its own short session.
+
+    The session (and its pooled connection and identity map) lives only for
+    this call, so long-lived callers such as websockets never pin a
+    connection between messages.
+    """
+    def unit():
+        _unit_usage.current = usage
+        try:
+            with Session(engine) as session:
+                return fn(session, *args, **kwargs)
+        finally:
+            _unit_usage.current = None
+
+    if usage is not None:
+        usage.units += 1
+        usage.in_flight += 1
+    try:
+        return await run_db(unit)
+    finally:
+        if usage is not None:
+            usage.in_flight -= 1
 
 def init_db():
-    from app.models import user, patient, physician, pharmacy, prescription, document, links, chat, drug, verification, profile
+    from app.models import user, patient, physician, pharmacy, prescription, document, links, chat, drug, verification, profile, push, email_outbox, revoked_token
     # from app.models import notification  # Temporarily commented out to avoid SQLAlchemy error
     SQLModel.metadata.create_all(engine)
 
+    from app.services.chat_maintenance import upgrade_chat_schema
+    from app.services.chat_search import install_search_index
+    from app.services.expiry_sweeper import ensure_expiry_indexes
+    # Before the search index, whose backfill reads message.seq
+    upgrade_chat_schema(engine)
+    install_search_index(engine)
+    ensure_expiry_indexes(engine)
+
 def get_session():
     with Session(engine) as session:
         yield session
\ No newline at end of file
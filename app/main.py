@@ -3,6 +3,16 @@ from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
 
 from app.database import init_db
+from app.chat_manager import manager
+from app.services.message_writer import message_writer
+from app.services.chat_archive import archive_job
+from app.services.expiry_sweeper import expiry_sweep_job
+from app.services.principal_cache import principal_cache
+from app.services.token_revocation import revocation_filter_job, revoked_tokens
+from app.utils.passwords import password_hasher
+from app.utils.rate_limit import auth_rate_limiter
+from app.services.push_gateway import push_gateway
+from app.services.email_outbox import email_outbox
 
 from app.routers import (
     auth,
@@ -18,6 +28,7 @@ from app.routers import (
     drugs,   # only ONCE
     profile,
     human_assist,
+    push,
 )
 
 logger = logging.getLogger(__name__)
@@ -38,6 +49,32 @@ def on_startup():
         # Optionally re-raise the exception if you want it to still crash after logging
         # raise e
 
+# Periodic database maintenance, run by every worker
+maintenance_jobs = [archive_job, revocation_filter_job, expiry_sweep_job]
+
+@app.on_event("startup")
+async def start_chat_fanout():
+    await manager.start()
+    await principal_cache.attach(manager.broker)
+    await revoked_tokens.attach(manager.broker)
+    await message_writer.start()
+    await push_gateway.start()
+    await password_hasher.start()
+    await email_outbox.start()
+    for job in maintenance_jobs:
+        await job.start()
+
+@app.on_event("shutdown")
+async def stop_chat_fanout():
+    for job in maintenance_jobs:
+        await job.stop()
+    await email_outbox.stop()
+    await push_gateway.stop()
+    await message_writer.stop()
+    await manager.stop()
+    password_hasher.shutdown()
+    await auth_rate_limiter.backend.close()
+
 # Routers
 app.include_router(auth.router, prefix="/auth", tags=["auth"])
 app.include_router(patients.router, prefix="/patients", tags=["patients"])
@@ -54,6 +91,7 @@ app.include_router(profile.router, prefix="/profile", tags=["profile"])
 # Drugs router (NO prefix → gives clean `/drugs`, `/drugs/search`, etc.)
 app.include_router(drugs.router, prefix="/drugs", tags=["drugs"])
 app.include_router(human_assist.router)
+app.include_router(push.router)
 
 @app.get("/")
 async def root():
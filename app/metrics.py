@@ -0,0 +1,49 @@
+import threading
+from typing import Callable, Dict
+
+
+class Metrics:
+    """In-process counters, sampled gauges and value summaries (count/sum/max).
+
+    Cheap enough to update on hot paths; read through ``GET /admin/metrics``.
+    Values are per worker process.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, float] = {}
+        self._gauges: Dict[str, Callable[[], float]] = {}
+        self._summaries: Dict[str, Dict[str, float]] = {}
+
+    def incr(self, name: str, value: float = 1) -> None:
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def gauge(self, name: str, sample: Callable[[], float]) -> None:
+        """Register ``sample`` to be called for the current value at snapshot time."""
+        self._gauges[name] = sample
+
+    def observe(self, name: str, value: float) -> None:
+        with self._lock:
+            summary = self._summaries.setdefault(name, {"count": 0, "sum": 0.0, "max": 0.0})
+            summary["count"] += 1
+            summary["sum"] += value
+            summary["max"] = max(summary["max"], value)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            counters = dict(self._counters)
+            summaries = {
+                name: {**summary, "avg": summary["sum"] / summary["count"] if summary["count"] else 0.0}
+                for name, summary in self._summaries.items()
+            }
+        gauges = {}
+        for name, sample in list(self._gauges.items()):
+            try:
+                gauges[name] = sample()
+            except Exception:
+                gauges[name] = None
+        return {"counters": counters, "gauges": gauges, "summaries": summaries}
+
+
+metrics = Metrics()
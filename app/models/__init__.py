@@ -13,8 +13,13 @@ from .chat import (
     ConversationParticipant,
     ConversationParticipantRole,
     Message,
+    MessageArchive,
+    MessageIdAllocator,
     MessageType,
 )
+from .push import PushDevice
+from .email_outbox import EmailOutbox, EmailStatus
+from .revoked_token import RevokedToken
 
 __all__ = [
     "User", "UserRole", "UserStatus",
@@ -24,5 +29,8 @@ __all__ = [
     "HumanAssistRequest",
     # "Notification", "NotificationPreference", # Temporarily commented out
     "Conversation", "ConversationParticipant", "ConversationParticipantRole",
-    "Message", "MessageType",
+    "Message", "MessageArchive", "MessageIdAllocator", "MessageType",
+    "PushDevice",
+    "EmailOutbox", "EmailStatus",
+    "RevokedToken",
 ]
\ No newline at end of file
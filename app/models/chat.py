@@ -1,6 +1,7 @@
 from datetime import datetime
 from enum import Enum
 from typing import Optional, List, TYPE_CHECKING
+from sqlalchemy import Column, Index, LargeBinary, Text
 from sqlmodel import SQLModel, Field, Relationship
 
 if TYPE_CHECKING:
@@ -10,10 +11,14 @@ if TYPE_CHECKING:
 class Conversation(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     title: Optional[str] = Field(default=None)
+    # "<low user id>:<high user id>" for 1:1 chats, NULL for group chats
+    direct_key: Optional[str] = Field(default=None, unique=True, index=True)
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
     last_message_at: Optional[datetime] = Field(default=None, index=True)
     last_message_preview: Optional[str] = Field(default=None)
+    # Highest seq handed out in this conversation; doubles as the message count.
+    last_seq: int = Field(default=0, nullable=False)
 
     participants: List["ConversationParticipant"] = Relationship(back_populates="conversation")
     messages: List["Message"] = Relationship(back_populates="conversation")
@@ -30,6 +35,8 @@ class ConversationParticipant(SQLModel, table=True):
     user_id: int = Field(foreign_key="user.id", primary_key=True)
     role: ConversationParticipantRole = Field(default=ConversationParticipantRole.PATIENT)
     joined_at: datetime = Field(default_factory=datetime.utcnow)
+    # Highest seq this participant has read; unread count is last_seq - last_read_seq
+    last_read_seq: int = Field(default=0, nullable=False)
 
     conversation: "Conversation" = Relationship(back_populates="participants")
     user: "User" = Relationship(back_populates="conversations")
@@ -41,15 +48,63 @@ class MessageType(str, Enum):
 
 
 class Message(SQLModel, table=True):
+    __table_args__ = (
+        Index("ix_message_conversation_seq", "conversation_id", "seq", unique=True),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
-    conversation_id: int = Field(foreign_key="conversation.id", index=True)
+    # Lookups by conversation are served by ix_message_conversation_seq.
+    conversation_id: int = Field(foreign_key="conversation.id")
+    seq: int = Field(nullable=False, description="Monotonic position within the conversation")
     sender_id: int = Field(foreign_key="user.id", index=True)
 
     content: Optional[str] = Field(default=None, description="Text content of the message")
     attachment_url: Optional[str] = Field(default=None, description="URL to uploaded image/file")
     type: MessageType = Field(default=MessageType.TEXT, index=True)
     timestamp: datetime = Field(default_factory=datetime.utcnow, index=True)
-    is_read: bool = Field(default=False, index=True)
 
     conversation: "Conversation" = Relationship(back_populates="messages")
-    sender: "User" = Relationship(back_populates="sent_messages")
\ No newline at end of file
+    sender: "User" = Relationship(back_populates="sent_messages")
+
+
+class MessageIdAllocator(SQLModel, table=True):
+    """Next message ID to hand out when IDs are reserved ahead of the insert."""
+
+    name: str = Field(primary_key=True)
+    next_id: int = Field(nullable=False)
+
+
+class MessageDeadLetter(SQLModel, table=True):
+    """A write-behind message whose row was rejected by the database.
+
+    The message had already been delivered, so it is kept here instead of
+    being dropped; ``payload`` is the row as JSON.
+    """
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    message_id: int = Field(index=True)
+    conversation_id: int = Field(index=True)
+    seq: int = Field(nullable=False)
+    payload: str = Field(sa_column=Column(Text, nullable=False))
+    error: str = Field(nullable=False)
+    failed_at: datetime = Field(default_factory=datetime.utcnow, nullable=False)
+
+
+class MessageArchive(SQLModel, table=True):
+    """A compressed block of consecutive cold messages moved out of ``message``.
+
+    ``payload`` is zlib-compressed JSON holding the rows with seqs
+    ``first_seq``..``last_seq``; see ``app.services.chat_archive``.
+    """
+
+    __table_args__ = (
+        Index("ix_messagearchive_conversation_seq", "conversation_id", "first_seq", unique=True),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    conversation_id: int = Field(foreign_key="conversation.id")
+    first_seq: int = Field(nullable=False)
+    last_seq: int = Field(nullable=False)
+    message_count: int = Field(nullable=False)
+    payload: bytes = Field(sa_column=Column(LargeBinary, nullable=False))
+    archived_at: datetime = Field(default_factory=datetime.utcnow, nullable=False)
@@ -0,0 +1,38 @@
+from datetime import datetime
+from enum import Enum
+from typing import Optional
+
+from sqlalchemy import Column, Index, Text
+from sqlmodel import Field, SQLModel
+
+
+class EmailStatus(str, Enum):
+    PENDING = "pending"
+    SENT = "sent"
+    FAILED = "failed"
+
+
+class EmailOutbox(SQLModel, table=True):
+    """An email waiting to be sent (or already sent) by the outbox worker.
+
+    Rows are written in the same transaction as whatever triggered the
+    email, so nothing is lost or sent for a rolled-back request.
+    """
+
+    __table_args__ = (
+        Index("ix_emailoutbox_status_next_attempt", "status", "next_attempt_at"),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    recipient: str = Field(nullable=False, index=True)
+    subject: str = Field(nullable=False)
+    html_body: str = Field(sa_column=Column(Text, nullable=False))
+    kind: str = Field(nullable=False, description="e.g. verification, password_reset")
+    status: EmailStatus = Field(default=EmailStatus.PENDING, nullable=False)
+    attempts: int = Field(default=0, nullable=False)
+    next_attempt_at: datetime = Field(default_factory=datetime.utcnow, nullable=False)
+    # Set while a worker holds the row; the lease ends at next_attempt_at
+    claim_token: Optional[str] = Field(default=None, index=True)
+    last_error: Optional[str] = None
+    created_at: datetime = Field(default_factory=datetime.utcnow, nullable=False)
+    sent_at: Optional[datetime] = None
@@ -22,3 +22,5 @@ class HumanAssistRequest(SQLModel, table=True):
     )
     contact_email: Optional[str] = Field(default=None)
     contact_whatsapp: Optional[str] = Field(default=None)
+    # Set once the expiry sweep has dropped the inline file data
+    attachments_stripped_at: Optional[datetime] = Field(default=None)
@@ -0,0 +1,15 @@
+from datetime import datetime
+from typing import Optional
+
+from sqlmodel import Field, SQLModel
+
+
+class PushDevice(SQLModel, table=True):
+    """A device token registered for chat push notifications."""
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    user_id: int = Field(foreign_key="user.id", index=True)
+    token: str = Field(nullable=False, unique=True, index=True)
+    platform: str = Field(nullable=False, description="ios, android or web")
+    created_at: datetime = Field(default_factory=datetime.utcnow, nullable=False)
+    last_seen_at: datetime = Field(default_factory=datetime.utcnow, nullable=False)
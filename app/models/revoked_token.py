@@ -0,0 +1,14 @@
+from datetime import datetime
+from typing import Optional
+
+from sqlmodel import Field, SQLModel
+
+
+class RevokedToken(SQLModel, table=True):
+    """An access token (by its ``jti`` claim) that must no longer be accepted."""
+
+    jti: str = Field(primary_key=True)
+    user_id: Optional[int] = Field(default=None, foreign_key="user.id", index=True)
+    # The token's own expiry; the row is useless afterwards
+    expires_at: datetime = Field(nullable=False, index=True)
+    revoked_at: datetime = Field(default_factory=datetime.utcnow, nullable=False)
@@ -7,14 +7,14 @@ class EmailVerification(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     email: str = Field(index=True, nullable=False)
     token: str = Field(unique=True, index=True)
-    expires_at: datetime
+    expires_at: datetime = Field(index=True)
     is_used: bool = Field(default=False)
     created_at: datetime = Field(default_factory=datetime.utcnow)
     
     @classmethod
     def generate_token(cls, email: str) -> 'EmailVerification':
         """Generate a new verification token for email"""
-        token = secrets.urlsafe_b64encode(secrets.token_bytes(32)).decode()
+        token = secrets.token_urlsafe(32)
         expires_at = datetime.utcnow() + timedelta(hours=24)  # Token expires in 24 hours
         return cls(email=email, token=token, expires_at=expires_at)
 
@@ -22,13 +22,13 @@ class PasswordReset(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     email: str = Field(index=True, nullable=False)
     token: str = Field(unique=True, index=True)
-    expires_at: datetime
+    expires_at: datetime = Field(index=True)
     is_used: bool = Field(default=False)
     created_at: datetime = Field(default_factory=datetime.utcnow)
     
     @classmethod
     def generate_token(cls, email: str) -> 'PasswordReset':
         """Generate a new password reset token"""
-        token = secrets.urlsafe_b64encode(secrets.token_bytes(32)).decode()
+        token = secrets.token_urlsafe(32)
         expires_at = datetime.utcnow() + timedelta(hours=1)  # Token expires in 1 hour
         return cls(email=email, token=token, expires_at=expires_at)
@@ -4,6 +4,7 @@ from fastapi import APIRouter, Depends, HTTPException, Security
 from fastapi.security import APIKeyHeader
 from starlette import status
 from app.database import init_db
+from app.metrics import metrics
 
 # Add the project root to the Python path to allow importing from the root-level script
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
@@ -55,3 +56,8 @@ async def trigger_drug_import():
             detail=result["message"]
         )
     return result
+
+@router.get("/metrics", dependencies=[Depends(verify_api_key)])
+def get_metrics():
+    """Counters, gauges and value summaries for this worker process."""
+    return metrics.snapshot()
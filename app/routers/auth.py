@@ -1,11 +1,19 @@
-from fastapi import APIRouter, Depends, HTTPException
+import math
+from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException, Request
 from fastapi.security import OAuth2PasswordRequestForm
+from sqlalchemy import update
 from sqlmodel import Session, select
 from pydantic import BaseModel, EmailStr
-from app.database import init_db, get_session
+from app.database import init_db, get_session, run_in_session
 from app.models.user import User, UserRole, UserStatus
 from app.models.verification import EmailVerification
-from app.utils.security import verify_password, get_password_hash, create_access_token
+from app.services.token_revocation import revoked_tokens
+from app.utils.security import create_access_token, oauth2_scheme, verify_token
+from app.utils.passwords import PasswordHasherBusy, password_hasher
+from app.config import settings
+from app.utils.rate_limit import auth_rate_limiter, client_ip
+from app.services.email_outbox import email_outbox
 from app.services.email_service import email_service
 import logging
 
@@ -13,6 +21,28 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+async def _throttle(action: str, request: Request, account: str) -> None:
+    """429 before any DB or bcrypt work once the client IP or the account is over its limit."""
+    ip = client_ip(
+        request.client.host if request.client else None,
+        request.headers.get("x-forwarded-for"),
+        settings.TRUSTED_PROXY_HOPS,
+    )
+    retry_after = await auth_rate_limiter.check(action, ip, account)
+    if retry_after is not None:
+        raise HTTPException(
+            status_code=429,
+            detail="Too many requests, please retry later",
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+        )
+
+def _hasher_busy() -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail="Too many authentication requests, please retry shortly",
+        headers={"Retry-After": "1"},
+    )
+
 class RegisterRequest(BaseModel):
     email: str
     password: str
@@ -21,39 +51,42 @@ class RegisterRequest(BaseModel):
     phone: str | None = None
     role: UserRole = UserRole.PATIENT
 
+def _user_by_email(session: Session, email: str) -> User | None:
+    return session.exec(select(User).where(User.email == email)).first()
+
+def _create_pending_user(session: Session, register_data: RegisterRequest, hashed_password: str) -> User:
+    """Store the user with its verification token and email in one transaction."""
+    user = User(
+        email=register_data.email,
+        hashed_password=hashed_password,
+        full_name=f"{register_data.first_name} {register_data.last_name}",
+        phone=register_data.phone,
+        role=register_data.role,
+        status=UserStatus.PENDING,  # Start as pending until email verified
+        is_email_verified=False
+    )
+    session.add(user)
+    # Create the verification token; the outbox worker sends the email
+    verification = EmailVerification.generate_token(register_data.email)
+    session.add(verification)
+    email_service.queue_verification_email(session, register_data.email, verification.token)
+    session.commit()
+    session.refresh(user)
+    return user
+
 @router.post("/register")
-async def register_user(register_data: RegisterRequest, session: Session = Depends(get_session)):
+async def register_user(register_data: RegisterRequest, request: Request):
+    await _throttle("register", request, register_data.email)
     try:
-        user_exists = session.exec(select(User).where(User.email == register_data.email)).first()
-        if user_exists:
+        if await run_in_session(_user_by_email, register_data.email):
             raise HTTPException(status_code=400, detail="Email already registered")
-        
-        full_name = f"{register_data.first_name} {register_data.last_name}"
-        hashed_pw = get_password_hash(register_data.password)
-        user = User(
-            email=register_data.email, 
-            hashed_password=hashed_pw, 
-            full_name=full_name, 
-            phone=register_data.phone,
-            role=register_data.role,
-            status=UserStatus.PENDING,  # Start as pending until email verified
-            is_email_verified=False
-        )
-        session.add(user)
-        session.commit()
-        session.refresh(user)
-        
-        # Create and send email verification
-        verification = EmailVerification.generate_token(register_data.email)
-        session.add(verification)
-        session.commit()
-        
-        # Send verification email (async)
+
         try:
-            await email_service.send_verification_email(register_data.email, verification.token)
-        except Exception as e:
-            logger.error(f"Failed to send verification email: {e}")
-            # Don't fail registration if email fails
+            hashed_pw = await password_hasher.hash(register_data.password)
+        except PasswordHasherBusy:
+            raise _hasher_busy()
+        user = await run_in_session(_create_pending_user, register_data, hashed_pw)
+        email_outbox.wake()
         
         # Return full user info
         user_response = {
@@ -76,6 +109,8 @@ async def register_user(register_data: RegisterRequest, session: Session = Depen
             "message": "Registration successful. Please check your email to verify your account.",
             "user": user_response
         }
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error in register_user: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -122,8 +157,9 @@ async def verify_email(token: str, session: Session = Depends(get_session)):
         raise HTTPException(status_code=500, detail="Email verification failed")
 
 @router.post("/resend-verification")
-async def resend_verification(email: str, session: Session = Depends(get_session)):
+async def resend_verification(email: str, request: Request, session: Session = Depends(get_session)):
     """Resend verification email"""
+    await _throttle("resend_verification", request, email)
     try:
         user = session.exec(select(User).where(User.email == email)).first()
         if not user:
@@ -132,13 +168,19 @@ async def resend_verification(email: str, session: Session = Depends(get_session
         if user.is_email_verified:
             raise HTTPException(status_code=400, detail="Email is already verified")
         
-        # Create new verification token
+        # Earlier links stop working once a new one is sent
+        session.execute(
+            update(EmailVerification)
+            .where(EmailVerification.email == email, EmailVerification.is_used == False)
+            .values(is_used=True)
+        )
+        
+        # Create new verification token and queue the email
         verification = EmailVerification.generate_token(email)
         session.add(verification)
+        email_service.queue_verification_email(session, email, verification.token)
         session.commit()
-        
-        # Send verification email
-        await email_service.send_verification_email(email, verification.token)
+        email_outbox.wake()
         
         return {"message": "Verification email sent successfully"}
         
@@ -148,12 +190,27 @@ async def resend_verification(email: str, session: Session = Depends(get_session
         logger.error(f"Error in resend_verification: {e}")
         raise HTTPException(status_code=500, detail="Failed to resend verification email")
 
+def _store_password_hash(session: Session, user_id: int, hashed_password: str) -> None:
+    session.execute(update(User).where(User.id == user_id).values(hashed_password=hashed_password))
+    session.commit()
+
 @router.post("/login")
-def login(form_data: OAuth2PasswordRequestForm = Depends(), session: Session = Depends(get_session)):
+async def login(request: Request, form_data: OAuth2PasswordRequestForm = Depends()):
+    await _throttle("login", request, form_data.username)
     try:
-        user = session.exec(select(User).where(User.email == form_data.username)).first()
-        if not user or not verify_password(form_data.password, user.hashed_password):
+        # DB work runs on the DB threads; this handler is async so bcrypt can be awaited
+        user = await run_in_session(_user_by_email, form_data.username)
+        if not user:
             raise HTTPException(status_code=401, detail="Invalid credentials")
+        try:
+            valid, new_hash = await password_hasher.verify_and_update(form_data.password, user.hashed_password)
+        except PasswordHasherBusy:
+            raise _hasher_busy()
+        if not valid:
+            raise HTTPException(status_code=401, detail="Invalid credentials")
+        if new_hash is not None:
+            # Stored with an older bcrypt cost; upgrade while we have the plaintext
+            await run_in_session(_store_password_hash, user.id, new_hash)
         
         # Check if email is verified
         if not user.is_email_verified:
@@ -191,6 +248,25 @@ def login(form_data: OAuth2PasswordRequestForm = Depends(), session: Session = D
         }
         
         return {"access_token": token, "token_type": "bearer", "user": user_response}
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error in login: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/logout", status_code=204)
+async def logout(token: str = Depends(oauth2_scheme)):
+    """Revoke the presented access token on every node."""
+    payload = verify_token(token)
+    if payload is None:
+        raise HTTPException(status_code=401, detail="Could not validate credentials")
+    jti = payload.get("jti")
+    if not jti:
+        # Issued before tokens carried an ID; it simply runs out at its expiry
+        raise HTTPException(status_code=400, detail="Token cannot be revoked")
+    sub = payload.get("sub")
+    await revoked_tokens.revoke(
+        jti,
+        int(sub) if sub is not None else None,
+        datetime.utcfromtimestamp(payload["exp"]),
+    )
@@ -1,21 +1,27 @@
 from datetime import datetime
-import json
-from typing import List
+from typing import Dict, FrozenSet, List, Optional, Tuple
 
 from fastapi import (
     APIRouter,
     Depends,
     HTTPException,
     Query,
+    Request,
     WebSocket,
     WebSocketDisconnect,
     status,
 )
-from sqlalchemy import func
+from fastapi.responses import StreamingResponse
+from sqlalchemy import insert as sa_insert, update
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
 from sqlmodel import Session, select
 
-from app.chat_manager import manager
-from app.database import get_session
+from app.chat_manager import ClientConnection, OverflowPolicy, manager
+from app.config import settings
+from app.database import PoolUsage, get_session, run_in_session
+from app.metrics import metrics
 from app.models import (
     Conversation,
     ConversationParticipant,
@@ -25,16 +31,30 @@ from app.models import (
     User,
     UserRole,
 )
+from app.services.chat_routing import conversation_routes
+from app.services.chat_archive import load_messages, with_read_state
+from app.services.chat_export import EXPORTERS, conversation_header
+from app.services.chat_search import search_messages
+from app.services.chat_sse import SseConnection, decode_event_id
+from app.services.message_writer import message_writer
+from app.services.push_gateway import push_gateway
 from app.schemas.chat import (
     ConversationCreate,
     ConversationListItem,
     ConversationRead,
     MessageHistoryResponse,
     MessageRead,
+    MessageSearchHit,
+    MessageSearchResponse,
+    ReadReceipt,
+    SyncConversation,
+    SyncRequest,
+    SyncResponse,
 )
+from app.services.principal_cache import Principal
 from app.utils.security import (
     get_current_active_user,
-    get_user_from_token,
+    principal_from_token,
 )
 
 router = APIRouter(tags=["Chat"])
@@ -50,23 +70,12 @@ def _map_role(user: User) -> ConversationParticipantRole:
 
 
 def _ensure_participant(session: Session, conversation_id: int, user_id: int) -> None:
-    exists = session.exec(
-        select(ConversationParticipant).where(
-            ConversationParticipant.conversation_id == conversation_id,
-            ConversationParticipant.user_id == user_id,
-        )
-    ).first()
-    if not exists:
+    if not conversation_routes.is_participant(session, conversation_id, user_id):
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not a conversation participant")
 
 
 def _get_participant_ids(session: Session, conversation_id: int) -> List[int]:
-    rows = session.exec(
-        select(ConversationParticipant.user_id).where(
-            ConversationParticipant.conversation_id == conversation_id
-        )
-    ).all()
-    return [row[0] if isinstance(row, tuple) else row for row in rows]
+    return sorted(conversation_routes.participants(session, conversation_id))
 
 
 def _serialize_conversation(session: Session, conversation: Conversation) -> ConversationRead:
@@ -86,15 +95,124 @@ def _serialize_message(message: Message) -> MessageRead:
     return MessageRead.model_validate(message)
 
 
-def _get_unread_count(session: Session, conversation_id: int, user_id: int) -> int:
-    result = session.exec(
-        select(func.count(Message.id)).where(
-            Message.conversation_id == conversation_id,
-            Message.sender_id != user_id,
-            Message.is_read.is_(False),
+def _message_preview(content: Optional[str], attachment_url: Optional[str]) -> Optional[str]:
+    if content:
+        return content[:140]
+    if attachment_url:
+        return "Image attachment"
+    return None
+
+
+def _advance_conversation(
+    session: Session, conversation_id: int, *, timestamp: datetime, preview: Optional[str]
+) -> Optional[int]:
+    """Bump ``last_seq`` and the last-message fields in one statement.
+
+    Returns the seq reserved for the new message, or ``None`` when the
+    conversation does not exist. The row lock taken by the UPDATE serialises
+    concurrent senders until the surrounding transaction commits.
+    """
+    values = {
+        "last_seq": Conversation.last_seq + 1,
+        "last_message_at": timestamp,
+        "updated_at": datetime.utcnow(),
+    }
+    if preview:
+        values["last_message_preview"] = preview
+    statement = (
+        update(Conversation)
+        .where(Conversation.id == conversation_id)
+        .values(**values)
+        .returning(Conversation.last_seq)
+        .execution_options(synchronize_session=False)
+    )
+    return session.execute(statement).scalar_one_or_none()
+
+
+def _read_state(session: Session, conversation_id: int, user_id: int) -> ReadReceipt:
+    last_seq, last_read_seq = session.exec(
+        select(Conversation.last_seq, ConversationParticipant.last_read_seq)
+        .join(ConversationParticipant)
+        .where(
+            ConversationParticipant.conversation_id == conversation_id,
+            ConversationParticipant.user_id == user_id,
         )
     ).one()
-    return int(result or 0)
+    last_seq = max(last_seq, message_writer.known_last_seq(conversation_id) or 0)
+    return ReadReceipt(
+        conversation_id=conversation_id,
+        user_id=user_id,
+        last_read_seq=last_read_seq,
+        unread_count=max(last_seq - last_read_seq, 0),
+    )
+
+
+def _advance_read_watermark(
+    session: Session, conversation_id: int, user_id: int, up_to: Optional[int]
+) -> ReadReceipt:
+    """Move the participant's read watermark forward (never back) to ``up_to``.
+
+    ``None`` marks everything read. Blocking; call it through ``run_in_session``.
+    """
+    _ensure_participant(session, conversation_id, user_id)
+    state = _read_state(session, conversation_id, user_id)
+    last_seq = state.last_read_seq + state.unread_count
+    target = last_seq if up_to is None else min(up_to, last_seq)
+    if target <= state.last_read_seq:
+        return state
+
+    session.execute(
+        update(ConversationParticipant)
+        .where(
+            ConversationParticipant.conversation_id == conversation_id,
+            ConversationParticipant.user_id == user_id,
+            ConversationParticipant.last_read_seq < target,
+        )
+        .values(last_read_seq=target)
+        .execution_options(synchronize_session=False)
+    )
+    session.commit()
+    return ReadReceipt(
+        conversation_id=conversation_id,
+        user_id=user_id,
+        last_read_seq=target,
+        unread_count=last_seq - target,
+    )
+
+
+def _mark_read(
+    session: Session, conversation_id: int, user_id: int, up_to: Optional[int]
+) -> Tuple[ReadReceipt, List[int]]:
+    """Advance the watermark; returns the receipt and who to tell about it."""
+    receipt = _advance_read_watermark(session, conversation_id, user_id, up_to)
+    return receipt, _get_participant_ids(session, conversation_id)
+
+
+def _mark_message_read(
+    session: Session, message_id: int, user_id: int
+) -> Tuple[MessageRead, ReadReceipt, List[int]]:
+    message = session.get(Message, message_id)
+    if not message:
+        raise HTTPException(status_code=404, detail="Message not found")
+    _ensure_participant(session, message.conversation_id, user_id)
+    if message.sender_id == user_id:
+        raise HTTPException(status_code=400, detail="Cannot mark your own message as read")
+
+    receipt, participant_ids = _mark_read(session, message.conversation_id, user_id, message.seq)
+    [serialized] = with_read_state(session, message.conversation_id, [message])
+    return serialized, receipt, participant_ids
+
+
+async def _publish_read_receipt(receipt: ReadReceipt, participant_ids: List[int]) -> None:
+    await manager.broadcast(
+        {
+            "event": "read",
+            "conversation_id": receipt.conversation_id,
+            "user_id": receipt.user_id,
+            "last_read_seq": receipt.last_read_seq,
+        },
+        participant_ids,
+    )
 
 
 def _create_conversation(
@@ -120,6 +238,151 @@ def _create_conversation(
 
     session.commit()
     session.refresh(conversation)
+    conversation_routes.set(conversation.id, user_ids)
+    return conversation
+
+
+def _build_message(user_id: int, conversation_id: int, message_data: dict) -> Message:
+    message_type_value = message_data.get("type", MessageType.TEXT.value)
+    try:
+        message_type = MessageType(message_type_value)
+    except ValueError:
+        message_type = MessageType.TEXT
+
+    return Message(
+        conversation_id=conversation_id,
+        sender_id=user_id,
+        content=message_data.get("content"),
+        attachment_url=message_data.get("attachment_url"),
+        type=message_type,
+    )
+
+
+def _store_message(
+    session: Session, user_id: int, conversation_id: int, message_data: dict
+) -> Optional[Tuple[dict, List[int]]]:
+    """Persist one inbound socket message.
+
+    Returns the broadcast payload and its recipients, or ``None`` when the
+    conversation no longer exists. Blocking; call it through ``run_in_session``.
+    """
+    _ensure_participant(session, conversation_id, user_id)
+
+    db_message = _build_message(user_id, conversation_id, message_data)
+    seq = _advance_conversation(
+        session,
+        conversation_id,
+        timestamp=db_message.timestamp,
+        preview=_message_preview(db_message.content, db_message.attachment_url),
+    )
+    if seq is None:
+        session.rollback()
+        return None
+
+    db_message.seq = seq
+    session.add(db_message)
+    # Senders have read everything up to their own message.
+    session.execute(
+        update(ConversationParticipant)
+        .where(
+            ConversationParticipant.conversation_id == conversation_id,
+            ConversationParticipant.user_id == user_id,
+        )
+        .values(last_read_seq=seq)
+        .execution_options(synchronize_session=False)
+    )
+    session.flush()
+    # Serialise before commit expires the instance, saving a refresh round-trip.
+    payload = _serialize_message(db_message).model_dump(mode="json")
+    session.commit()
+
+    return payload, _get_participant_ids(session, conversation_id)
+
+
+async def _cached_participants(conversation_id: int, usage: Optional[PoolUsage] = None) -> FrozenSet[int]:
+    """Participants from the routing table, loading them in a short session on a miss."""
+    participants = conversation_routes.get(conversation_id)
+    if participants is None:
+        participants = await run_in_session(conversation_routes.participants, conversation_id, usage=usage)
+    return participants
+
+
+async def _submit_message(
+    user_id: int, conversation_id: int, message_data: dict, usage: Optional[PoolUsage] = None
+) -> Optional[Tuple[dict, List[int]]]:
+    """Write-behind counterpart of ``_store_message``: the row is flushed later."""
+    participants = await _cached_participants(conversation_id, usage)
+    if user_id not in participants:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not a conversation participant")
+
+    db_message = _build_message(user_id, conversation_id, message_data)
+    preview = _message_preview(db_message.content, db_message.attachment_url)
+    if await message_writer.submit(db_message, preview) is None:
+        return None
+
+    return _serialize_message(db_message).model_dump(mode="json"), sorted(participants)
+
+
+def _direct_key(user_a: int, user_b: int) -> str:
+    low, high = sorted((user_a, user_b))
+    return f"{low}:{high}"
+
+
+def _insert_ignoring_conflicts(session: Session, model, rows: List[dict], conflict_columns: List[str]) -> None:
+    dialect = session.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        insert = postgresql_insert if dialect == "postgresql" else sqlite_insert
+        session.execute(insert(model).values(rows).on_conflict_do_nothing(index_elements=conflict_columns))
+        return
+    for row in rows:
+        try:
+            with session.begin_nested():
+                session.execute(sa_insert(model).values(**row))
+        except IntegrityError:
+            pass
+
+
+def _get_or_create_direct_conversation(session: Session, user_a: int, user_b: int) -> Conversation:
+    """Return the 1:1 conversation for a user pair, creating it at most once.
+
+    Lookup is a single probe of the unique ``direct_key`` index; concurrent
+    creators race on the insert and the loser simply reads the winner's row.
+    """
+    key = _direct_key(user_a, user_b)
+    existing = session.exec(select(Conversation).where(Conversation.direct_key == key)).first()
+    if existing:
+        return existing
+
+    users = session.exec(select(User).where(User.id.in_([user_a, user_b]))).all()
+    if len(users) != 2:
+        raise HTTPException(status_code=404, detail="One or more participants were not found")
+
+    now = datetime.utcnow()
+    _insert_ignoring_conflicts(
+        session,
+        Conversation,
+        [{"direct_key": key, "created_at": now, "updated_at": now, "last_seq": 0}],
+        ["direct_key"],
+    )
+    conversation = session.exec(select(Conversation).where(Conversation.direct_key == key)).one()
+    _insert_ignoring_conflicts(
+        session,
+        ConversationParticipant,
+        [
+            {
+                "conversation_id": conversation.id,
+                "user_id": user.id,
+                "role": _map_role(user),
+                "joined_at": now,
+                "last_read_seq": 0,
+            }
+            for user in users
+        ],
+        ["conversation_id", "user_id"],
+    )
+    session.commit()
+    session.refresh(conversation)
+    conversation_routes.set(conversation.id, [user.id for user in users])
     return conversation
 
 
@@ -131,7 +394,7 @@ def _create_conversation(
 def create_conversation(
     payload: ConversationCreate,
     session: Session = Depends(get_session),
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_active_user),
 ):
     participant_ids = set(payload.participant_ids)
     participant_ids.add(current_user.id)
@@ -146,43 +409,32 @@ def create_conversation(
     return _serialize_conversation(session, conversation)
 
 
-@router.get("/conversations/{conversation_id}", response_model=ConversationRead)
-def get_conversation(
-    conversation_id: int,
-    session: Session = Depends(get_session),
-    current_user: User = Depends(get_current_active_user),
-):
-    conversation = session.get(Conversation, conversation_id)
-    if not conversation:
-        raise HTTPException(status_code=404, detail="Conversation not found")
-    _ensure_participant(session, conversation_id, current_user.id)
-    return _serialize_conversation(session, conversation)
-
-
 @router.get("/conversations/by-users", response_model=ConversationRead)
 def get_or_create_conversation(
     user_a: int,
     user_b: int,
     session: Session = Depends(get_session),
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_active_user),
 ):
     if current_user.id not in {user_a, user_b}:
         raise HTTPException(status_code=403, detail="Access denied")
     if user_a == user_b:
         raise HTTPException(status_code=400, detail="user_a and user_b must be different")
 
-    user_set = {user_a, user_b}
-    subquery = (
-        select(ConversationParticipant.conversation_id)
-        .where(ConversationParticipant.user_id.in_(user_set))
-        .group_by(ConversationParticipant.conversation_id)
-        .having(func.count(ConversationParticipant.user_id) == len(user_set))
-    )
-    existing = session.exec(select(Conversation).where(Conversation.id.in_(subquery))).first()
-    if existing:
-        return _serialize_conversation(session, existing)
+    conversation = _get_or_create_direct_conversation(session, user_a, user_b)
+    return _serialize_conversation(session, conversation)
+
 
-    conversation = _create_conversation(session, participant_ids=list(user_set))
+@router.get("/conversations/{conversation_id}", response_model=ConversationRead)
+def get_conversation(
+    conversation_id: int,
+    session: Session = Depends(get_session),
+    current_user: Principal = Depends(get_current_active_user),
+):
+    conversation = session.get(Conversation, conversation_id)
+    if not conversation:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    _ensure_participant(session, conversation_id, current_user.id)
     return _serialize_conversation(session, conversation)
 
 
@@ -193,25 +445,25 @@ def get_or_create_conversation(
 def list_user_conversations(
     user_id: int,
     session: Session = Depends(get_session),
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_active_user),
 ):
     if current_user.id != user_id:
         raise HTTPException(status_code=403, detail="Cannot view another user's conversations")
 
-    conversations = session.exec(
-        select(Conversation)
+    rows = session.exec(
+        select(Conversation, ConversationParticipant.last_read_seq)
         .join(ConversationParticipant)
         .where(ConversationParticipant.user_id == user_id)
         .order_by(Conversation.last_message_at.desc().nullslast())
     ).all()
 
     items: List[ConversationListItem] = []
-    for conversation in conversations:
+    for conversation, last_read_seq in rows:
         serialized = _serialize_conversation(session, conversation)
         items.append(
             ConversationListItem(
                 **serialized.model_dump(),
-                unread_count=_get_unread_count(session, conversation.id, user_id),
+                unread_count=max(conversation.last_seq - last_read_seq, 0),
             )
         )
     return items
@@ -224,118 +476,346 @@ def list_user_conversations(
 def get_message_history(
     conversation_id: int,
     limit: int = Query(50, ge=1, le=200),
-    offset: int = Query(0, ge=0),
+    before_seq: Optional[int] = Query(None, ge=1, description="Return messages older than this seq"),
+    after_seq: Optional[int] = Query(None, ge=0, description="Return messages newer than this seq"),
+    offset: int = Query(0, ge=0, deprecated=True),
     session: Session = Depends(get_session),
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_active_user),
 ):
+    if before_seq is not None and after_seq is not None:
+        raise HTTPException(status_code=400, detail="Use either before_seq or after_seq, not both")
+
     _ensure_participant(session, conversation_id, current_user.id)
+    conversation = session.get(Conversation, conversation_id)
+    if not conversation:
+        raise HTTPException(status_code=404, detail="Conversation not found")
 
-    total = session.exec(
-        select(func.count(Message.id)).where(Message.conversation_id == conversation_id)
-    ).one()
+    if after_seq is None and before_seq is None and offset:
+        # Legacy offset paging, mapped onto seqs (dense within a conversation).
+        before_seq = max(1, conversation.last_seq - offset + 1)
 
-    messages = session.exec(
-        select(Message)
-        .where(Message.conversation_id == conversation_id)
-        .order_by(Message.timestamp.desc())
-        .offset(offset)
-        .limit(limit)
-    ).all()
+    # Fetch one extra row to learn whether another page exists without counting.
+    messages = load_messages(session, conversation_id, limit=limit + 1, after_seq=after_seq, before_seq=before_seq)
+    has_more = len(messages) > limit
+    messages = messages[:limit] if after_seq is not None else messages[-limit:]
+    return MessageHistoryResponse(items=messages, total=conversation.last_seq, has_more=has_more)
+
+
+@router.get("/conversations/{conversation_id}/export")
+def export_conversation(
+    conversation_id: int,
+    format: str = Query("json", pattern="^(json|csv|pdf)$"),
+    session: Session = Depends(get_session),
+    current_user: Principal = Depends(get_current_active_user),
+):
+    """Full transcript as a download, for medical records.
+
+    Streams straight from a database cursor in batches, so memory use does
+    not depend on the size of the conversation.
+    """
+    conversation = session.get(Conversation, conversation_id)
+    if not conversation:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Conversation not found")
+    _ensure_participant(session, conversation_id, current_user.id)
 
-    serialized = [_serialize_message(message) for message in reversed(messages)]
-    return MessageHistoryResponse(items=serialized, total=int(total or 0))
+    exporter, media_type = EXPORTERS[format]
+    return StreamingResponse(
+        exporter(conversation_id, conversation_header(conversation)),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="conversation-{conversation_id}.{format}"'},
+    )
+
+
+@router.get("/messages/search", response_model=MessageSearchResponse)
+def search_message_history(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None),
+    session: Session = Depends(get_session),
+    current_user: Principal = Depends(get_current_active_user),
+):
+    """Full-text search across every conversation the caller takes part in."""
+    try:
+        hits, next_cursor = search_messages(session, current_user.id, q, limit=limit, cursor=cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return MessageSearchResponse(
+        items=[MessageSearchHit.model_validate(hit) for hit in hits],
+        next_cursor=next_cursor,
+    )
+
+
+@router.post("/conversations/{conversation_id}/read", response_model=ReadReceipt)
+async def mark_conversation_read(
+    conversation_id: int,
+    up_to: Optional[int] = Query(None, ge=0, description="Last seq read; defaults to the newest message"),
+    current_user: Principal = Depends(get_current_active_user),
+):
+    receipt, participant_ids = await run_in_session(_mark_read, conversation_id, current_user.id, up_to)
+    await _publish_read_receipt(receipt, participant_ids)
+    return receipt
 
 
-@router.patch("/messages/{message_id}/read", response_model=MessageRead)
-def mark_message_read(
+@router.patch("/messages/{message_id}/read", response_model=MessageRead, deprecated=True)
+async def mark_message_read(
     message_id: int,
+    current_user: Principal = Depends(get_current_active_user),
+):
+    """Kept for older clients; advances the read watermark to this message."""
+    serialized, receipt, participant_ids = await run_in_session(_mark_message_read, message_id, current_user.id)
+    await _publish_read_receipt(receipt, participant_ids)
+    return serialized
+
+
+def _collect_missed(
+    session: Session, user_id: int, cursors: Dict[int, int], limit: int
+) -> List[SyncConversation]:
+    """Messages newer than each cursor, for every conversation the user is in.
+
+    Conversations without a cursor resume from the user's read watermark.
+    Only conversations with something new are returned.
+    """
+    rows = session.exec(
+        select(Conversation.id, Conversation.last_seq, ConversationParticipant.last_read_seq)
+        .join(ConversationParticipant)
+        .where(ConversationParticipant.user_id == user_id)
+    ).all()
+
+    result: List[SyncConversation] = []
+    for conversation_id, last_seq, last_read_seq in rows:
+        cursor = cursors.get(conversation_id, last_read_seq)
+        if last_seq <= cursor:
+            continue
+        messages = load_messages(session, conversation_id, limit=limit + 1, after_seq=cursor)
+        result.append(
+            SyncConversation(
+                conversation_id=conversation_id,
+                last_seq=last_seq,
+                last_read_seq=last_read_seq,
+                items=messages[:limit],
+                has_more=len(messages) > limit,
+            )
+        )
+    return result
+
+
+async def _resume(connection: ClientConnection, cursors: Dict[int, int]) -> None:
+    """Replay missed messages to one socket, then let live delivery continue.
+
+    Live frames queue up behind the replay, so nothing committed after the
+    replay query is lost; clients drop duplicates by (conversation_id, seq).
+    """
+    async with connection.paused():
+        missed = await run_in_session(
+            _collect_missed,
+            connection.user_id,
+            cursors,
+            settings.CHAT_RESUME_MAX_PER_CONVERSATION,
+            usage=connection.db_usage,
+        )
+        await connection.send_now({"event": "resume.begin", "conversations": len(missed)})
+        for conversation in missed:
+            await connection.send_now({"event": "replay", **conversation.model_dump(mode="json")})
+        await connection.send_now({"event": "resume.end"})
+
+
+@router.post("/sync", response_model=SyncResponse)
+def sync_conversations(
+    payload: SyncRequest,
     session: Session = Depends(get_session),
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_active_user),
 ):
-    message = session.get(Message, message_id)
-    if not message:
-        raise HTTPException(status_code=404, detail="Message not found")
+    """Cold-start catch-up with the same semantics as the socket ``resume`` event."""
+    missed = _collect_missed(
+        session, current_user.id, payload.cursors, settings.CHAT_RESUME_MAX_PER_CONVERSATION
+    )
+    return SyncResponse(conversations=missed)
 
-    _ensure_participant(session, message.conversation_id, current_user.id)
 
-    if message.sender_id == current_user.id:
-        raise HTTPException(status_code=400, detail="Cannot mark your own message as read")
+def _shared_contacts(session: Session, user_id: int, candidates: List[int]) -> List[int]:
+    """Users among ``candidates`` who share at least one conversation with ``user_id``."""
+    my_conversations = select(ConversationParticipant.conversation_id).where(
+        ConversationParticipant.user_id == user_id
+    )
+    return list(
+        session.exec(
+            select(ConversationParticipant.user_id)
+            .where(
+                ConversationParticipant.conversation_id.in_(my_conversations),
+                ConversationParticipant.user_id.in_(candidates),
+            )
+            .distinct()
+        ).all()
+    )
+
+
+async def _handle_event(connection: ClientConnection, data: dict) -> None:
+    """Handle a control frame (one carrying an ``event`` key) from a socket."""
+    event = data.get("event")
+    if event == "ping":
+        connection.enqueue({"event": "pong"})
+    elif event == "pong":
+        # Answer to a server heartbeat; receiving it already refreshed the socket's activity.
+        pass
+    elif event == "typing":
+        conversation_id = int(data.get("conversation_id") or 0)
+        if connection.user_id not in await _cached_participants(conversation_id, connection.db_usage):
+            connection.enqueue({"error": "Not a conversation participant"})
+            return
+        manager.typing.note(conversation_id, connection.user_id)
+    elif event == "resume":
+        cursors = {int(key): int(value) for key, value in (data.get("cursors") or {}).items()}
+        await _resume(connection, cursors)
+    elif event == "presence.subscribe":
+        candidates = [int(user_id) for user_id in data.get("user_ids", [])][: settings.CHAT_PRESENCE_MAX_WATCH]
+        visible = []
+        if candidates:
+            visible = await run_in_session(
+                _shared_contacts, connection.user_id, candidates, usage=connection.db_usage
+            )
+        connection.enqueue(manager.presence.watch(connection, visible))
+    else:
+        connection.enqueue({"error": f"Unknown event {event!r}"})
 
-    if not message.is_read:
-        message.is_read = True
-        session.add(message)
-        session.commit()
-        session.refresh(message)
 
-    return _serialize_message(message)
+# Heartbeat traffic never counts against a user's send budget.
+_UNMETERED_EVENTS = ("ping", "pong")
 
 
 @router.websocket("/ws")
 async def websocket_endpoint(
     websocket: WebSocket,
     token: str = Query(...),
-    db: Session = Depends(get_session),
+    batch: bool = Query(False, description="Receive frames queued together as one array frame"),
 ):
-    """Authenticate via token query param and relay chat messages."""
-
-    user = get_user_from_token(token=token, db=db)
-    if not user:
+    """Authenticate via token query param and relay chat messages.
+
+    Clients may offer the ``connectedcare.msgpack.v1`` or ``connectedcare.json.v1``
+    subprotocol; without one, frames are plain JSON text. Frames with an
+    ``event`` key (``ping``, ``typing``, ``presence.subscribe``, ``resume``) are control
+    frames; everything else is a chat message. After reconnecting, clients send
+    ``{"event": "resume", "cursors": {conversation_id: last_seen_seq}}`` to get
+    what they missed before live delivery resumes.
+
+    The server sends ``{"event": "ping"}`` to quiet sockets and closes those
+    silent for ``CHAT_IDLE_TIMEOUT_SECONDS``; clients answer with
+    ``{"event": "pong"}``. Frames over ``CHAT_MAX_FRAME_BYTES`` close the socket
+    (1009), and frames beyond the per-user send rate are refused with an error.
+
+    The socket holds no database session of its own: authentication and each
+    inbound frame run as a short unit of work with a fresh session.
+    """
+
+    principal = await principal_from_token(token)
+    if principal is None:
         await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
         return
+    user_id = principal.id
 
-    user_id = user.id
-    await manager.connect(user_id, websocket)
+    connection = await manager.connect(user_id, websocket, batch_frames=batch)
 
     try:
         while True:
-            data = await websocket.receive_text()
-            message_data = json.loads(data)
+            frame = await websocket.receive()
+            if frame["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(frame.get("code", status.WS_1000_NORMAL_CLOSURE))
+            data = frame.get("text") if frame.get("text") is not None else frame.get("bytes")
+            size = len(data) if isinstance(data, bytes) else len(data.encode("utf-8"))
+            if size > settings.CHAT_MAX_FRAME_BYTES:
+                metrics.incr("chat.frames.too_large")
+                await manager.disconnect(connection, code=status.WS_1009_MESSAGE_TOO_BIG)
+                return
+            message_data = connection.codec.decode(data)
+            manager.presence.touch(connection)
+            if message_data.get("event") not in _UNMETERED_EVENTS:
+                retry_after = manager.throttle(connection)
+                if retry_after is not None:
+                    connection.enqueue({"error": "Rate limit exceeded", "retry_after": round(retry_after, 3)})
+                    continue
+            if "event" in message_data:
+                await _handle_event(connection, message_data)
+                continue
+
             conversation_id = message_data.get("conversation_id")
             if conversation_id is None:
-                await websocket.send_json({"error": "conversation_id is required"})
+                connection.enqueue({"error": "conversation_id is required"})
                 continue
 
-            _ensure_participant(db, int(conversation_id), user_id)
-
-            message_type_value = message_data.get("type", MessageType.TEXT.value)
-            try:
-                message_type = MessageType(message_type_value)
-            except ValueError:
-                message_type = MessageType.TEXT
-
-            content = message_data.get("content")
-            attachment_url = message_data.get("attachment_url")
-
-            db_message = Message(
-                conversation_id=conversation_id,
-                sender_id=user_id,
-                content=content,
-                attachment_url=attachment_url,
-                type=message_type,
-                is_read=True,
-            )
-            conversation = db.get(Conversation, conversation_id)
-            if not conversation:
-                await websocket.send_json({"error": "Conversation not found"})
+            if message_writer.enabled:
+                stored = await _submit_message(user_id, int(conversation_id), message_data, connection.db_usage)
+            else:
+                stored = await run_in_session(
+                    _store_message, user_id, int(conversation_id), message_data, usage=connection.db_usage
+                )
+            if stored is None:
+                connection.enqueue({"error": "Conversation not found"})
                 continue
 
-            conversation.last_message_at = db_message.timestamp
-            conversation.updated_at = datetime.utcnow()
-            if content:
-                conversation.last_message_preview = content[:140]
-            elif attachment_url:
-                conversation.last_message_preview = "Image attachment"
-
-            db.add(db_message)
-            db.add(conversation)
-            db.commit()
-            db.refresh(db_message)
-
-            participants = _get_participant_ids(db, conversation_id)
-            payload = _serialize_message(db_message).model_dump()
-            await manager.broadcast(payload, participants)
+            payload, participants = stored
+            offline = await manager.broadcast(payload, participants)
+            push_gateway.notify(offline, payload)
 
     except WebSocketDisconnect:
-        manager.disconnect(user_id)
+        await manager.disconnect(connection)
     except Exception:
-        manager.disconnect(user_id)
+        await manager.disconnect(connection)
+
+
+@router.get("/events")
+async def event_stream(
+    request: Request,
+    token: str = Query(...),
+    last_event_id: Optional[str] = Query(
+        None, description="For clients that cannot send the Last-Event-ID header"
+    ),
+):
+    """Server-Sent Events fallback for networks that block websockets.
+
+    Streams the same events as ``/ws`` as ``data:`` lines of JSON. Chat
+    messages carry an ``id`` encoding the last seq seen per conversation
+    (e.g. ``12.40-15.3``); on reconnect, missed messages since that id are
+    replayed as ``replay`` events before live delivery continues. Sending is
+    done over the regular HTTP endpoints.
+    """
+    principal = await principal_from_token(token)
+    if principal is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Could not validate credentials")
+    user_id = principal.id
+
+    cursors = decode_event_id(request.headers.get("last-event-id") or last_event_id)
+    connection = SseConnection(
+        user_id,
+        max_queue=settings.CHAT_OUTBOUND_QUEUE_SIZE,
+        overflow=OverflowPolicy(settings.CHAT_OVERFLOW_POLICY),
+        cursors=cursors,
+    )
+    # Register before querying what was missed so nothing committed meanwhile is lost.
+    await manager.register(connection)
+
+    async def stream():
+        try:
+            yield "retry: 3000\n\n"
+            if cursors:
+                missed = await run_in_session(
+                    _collect_missed,
+                    user_id,
+                    cursors,
+                    settings.CHAT_RESUME_MAX_PER_CONVERSATION,
+                    usage=connection.db_usage,
+                )
+                for conversation in missed:
+                    frame = connection.codec.encode({"event": "replay", **conversation.model_dump(mode="json")})
+                    last = conversation.items[-1].seq if conversation.items else 0
+                    chunk = connection.format(frame, (conversation.conversation_id, last))
+                    if chunk is not None:
+                        yield chunk
+            async for chunk in connection.events():
+                yield chunk
+        finally:
+            await manager.disconnect(connection)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
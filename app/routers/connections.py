@@ -4,7 +4,7 @@ from datetime import datetime
 
 from app.database import get_session
 from app.models.links import PatientPhysicianLink
-from app.models.user import User
+from app.services.principal_cache import Principal
 from app.utils.security import get_current_active_user
 
 router = APIRouter(tags=["Connections"])
@@ -13,7 +13,7 @@ router = APIRouter(tags=["Connections"])
 def link_patient_to_physician(
     physician_id: int,
     session: Session = Depends(get_session),
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_active_user),
 ):
     """
     Allows a logged-in patient to request a connection with a physician.
@@ -68,15 +68,15 @@ def link_patient_to_physician(
 def accept_patient_connection(
     patient_id: int,
     session: Session = Depends(get_session),
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_active_user),
 ):
     """
     Allows a physician to accept a patient connection request.
     """
-    if current_user.role != "physician" or current_user.physician is None:
+    if current_user.role != "physician" or current_user.physician_id is None:
         raise HTTPException(status_code=403, detail="Only physicians can perform this action.")
 
-    physician_id = current_user.physician.id
+    physician_id = current_user.physician_id
 
     # Find the pending link
     link = session.exec(
@@ -102,15 +102,15 @@ def accept_patient_connection(
 def reject_patient_connection(
     patient_id: int,
     session: Session = Depends(get_session),
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_active_user),
 ):
     """
     Allows a physician to reject a patient connection request.
     """
-    if current_user.role != "physician" or current_user.physician is None:
+    if current_user.role != "physician" or current_user.physician_id is None:
         raise HTTPException(status_code=403, detail="Only physicians can perform this action.")
 
-    physician_id = current_user.physician.id
+    physician_id = current_user.physician_id
 
     # Find the pending link
     link = session.exec(
@@ -135,15 +135,15 @@ def reject_patient_connection(
 @router.get("/pending-requests")
 def get_pending_connection_requests(
     session: Session = Depends(get_session),
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_active_user),
 ):
     """
     Get all pending connection requests for the current physician.
     """
-    if current_user.role != "physician" or current_user.physician is None:
+    if current_user.role != "physician" or current_user.physician_id is None:
         raise HTTPException(status_code=403, detail="Only physicians can perform this action.")
 
-    physician_id = current_user.physician.id
+    physician_id = current_user.physician_id
 
     # Get all pending links for this physician
     pending_links = session.exec(
@@ -2,7 +2,7 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlmodel import Session, select
 from app.models.pharmacy import Pharmacy
 from app.models.prescription import Prescription
-from app.models.user import User
+from app.services.principal_cache import Principal
 from app.database import get_session
 from app.utils.security import get_current_active_user
 
@@ -21,14 +21,14 @@ def list_pharmacies(session: Session = Depends(get_session)):
 
 @router.get("/me/prescriptions")
 def get_pharmacy_prescriptions(
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_active_user),
     session: Session = Depends(get_session)
 ):
     """Get all prescriptions assigned to the current pharmacist's pharmacy"""
-    if current_user.role != "pharmacy" or current_user.pharmacy is None:
+    if current_user.role != "pharmacy" or current_user.pharmacy_id is None:
         raise HTTPException(status_code=403, detail="Only pharmacists can access this endpoint")
     
-    pharmacy_id = current_user.pharmacy.id
+    pharmacy_id = current_user.pharmacy_id
     
     # Get all prescriptions for this pharmacy
     prescriptions = session.exec(
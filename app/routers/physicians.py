@@ -5,7 +5,7 @@ from app.models.physician import Physician
 from app.models.patient import Patient
 from app.models.links import PatientPhysicianLink
 from app.models.document import Document
-from app.models.user import User
+from app.services.principal_cache import Principal
 from app.database import get_session
 from app.utils.security import get_current_active_user
 
@@ -158,14 +158,14 @@ def create_sample_physicians(session: Session = Depends(get_session)):
 
 @router.get("/me/patients")
 def get_physician_patients(
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_active_user),
     session: Session = Depends(get_session)
 ):
     """Get all patients linked to the current physician"""
-    if current_user.role != "physician" or current_user.physician is None:
+    if current_user.role != "physician" or current_user.physician_id is None:
         raise HTTPException(status_code=403, detail="Only physicians can access this endpoint")
     
-    physician_id = current_user.physician.id
+    physician_id = current_user.physician_id
     
     # Get all active links for this physician
     links = session.exec(
@@ -191,14 +191,14 @@ def get_physician_patients(
 @router.get("/patients/{patient_id}/documents")
 def get_patient_documents(
     patient_id: int,
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_active_user),
     session: Session = Depends(get_session)
 ):
     """Get documents for a specific patient (only if physician is linked to patient)"""
-    if current_user.role != "physician" or current_user.physician is None:
+    if current_user.role != "physician" or current_user.physician_id is None:
         raise HTTPException(status_code=403, detail="Only physicians can access this endpoint")
     
-    physician_id = current_user.physician.id
+    physician_id = current_user.physician_id
     
     # Check if link exists and is active
     link = session.exec(
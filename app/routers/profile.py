@@ -5,7 +5,8 @@ from datetime import datetime
 from app.database import get_session
 from app.models.user import User, UserRole
 from app.models.profile import UserProfile, ProfileVerification, VerificationStatus
-from app.utils.security import get_current_user
+from app.services.principal_cache import Principal
+from app.utils.security import get_current_principal
 from app.services.upload_service import upload_file
 import logging
 
@@ -36,7 +37,7 @@ class ProfileUpdate(SQLModel):
     blood_type: Optional[str] = None
 
 @router.get("/profile")
-async def get_profile(current_user: User = Depends(get_current_user), session: Session = Depends(get_session)):
+async def get_profile(current_user: Principal = Depends(get_current_principal), session: Session = Depends(get_session)):
     """Get current user's profile"""
     profile = session.exec(select(UserProfile).where(UserProfile.user_id == current_user.id)).first()
     
@@ -52,7 +53,7 @@ async def get_profile(current_user: User = Depends(get_current_user), session: S
 @router.put("/profile")
 async def update_profile(
     profile_data: ProfileUpdate,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     session: Session = Depends(get_session)
 ):
     """Update user profile"""
@@ -88,7 +89,7 @@ async def upload_verification_document(
     issue_date: Optional[str] = Form(None),
     expiry_date: Optional[str] = Form(None),
     file: UploadFile = File(...),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     session: Session = Depends(get_session)
 ):
     """Upload verification document for professional accounts"""
@@ -137,7 +138,7 @@ async def upload_verification_document(
 
 @router.get("/verification-documents")
 async def get_verification_documents(
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     session: Session = Depends(get_session)
 ):
     """Get user's verification documents"""
@@ -149,7 +150,7 @@ async def get_verification_documents(
 
 @router.get("/pending-approvals")
 async def get_pending_approvals(
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     session: Session = Depends(get_session)
 ):
     """Get pending professional approvals (admin only)"""
@@ -167,7 +168,7 @@ async def get_pending_approvals(
 @router.post("/approve-verification/{verification_id}")
 async def approve_verification(
     verification_id: int,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     session: Session = Depends(get_session)
 ):
     """Approve verification document (admin only)"""
@@ -211,7 +212,7 @@ async def approve_verification(
 async def reject_verification(
     verification_id: int,
     rejection_reason: str = Form(...),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     session: Session = Depends(get_session)
 ):
     """Reject verification document (admin only)"""
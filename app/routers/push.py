@@ -0,0 +1,51 @@
+from datetime import datetime
+
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlmodel import Session, select
+
+from app.database import get_session
+from app.models import PushDevice
+from app.services.principal_cache import Principal
+from app.schemas.push import PushDeviceRead, PushDeviceRegister
+from app.utils.security import get_current_active_user
+
+router = APIRouter(prefix="/push", tags=["Push"])
+
+
+@router.post("/devices", response_model=PushDeviceRead)
+def register_device(
+    payload: PushDeviceRegister,
+    session: Session = Depends(get_session),
+    current_user: Principal = Depends(get_current_active_user),
+):
+    """Register (or refresh) this device's push token for the signed-in user.
+
+    A token belongs to one device, so registering it again under another
+    account moves it there.
+    """
+    device = session.exec(select(PushDevice).where(PushDevice.token == payload.token)).first()
+    if device is None:
+        device = PushDevice(user_id=current_user.id, token=payload.token, platform=payload.platform)
+    else:
+        device.user_id = current_user.id
+        device.platform = payload.platform
+        device.last_seen_at = datetime.utcnow()
+    session.add(device)
+    session.commit()
+    session.refresh(device)
+    return device
+
+
+@router.delete("/devices/{token}", status_code=status.HTTP_204_NO_CONTENT)
+def unregister_device(
+    token: str,
+    session: Session = Depends(get_session),
+    current_user: Principal = Depends(get_current_active_user),
+):
+    device = session.exec(
+        select(PushDevice).where(PushDevice.token == token, PushDevice.user_id == current_user.id)
+    ).first()
+    if device is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Device not registered")
+    session.delete(device)
+    session.commit()
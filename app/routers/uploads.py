@@ -2,7 +2,7 @@ import shutil
 from pathlib import Path
 from fastapi import APIRouter, Depends, UploadFile, File, HTTPException
 from app.utils.security import get_current_active_user
-from app.models.user import User
+from app.services.principal_cache import Principal
 
 router = APIRouter(prefix="/uploads", tags=["Uploads"])
 
@@ -13,7 +13,7 @@ UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
 @router.post("/chat-image")
 async def upload_chat_image(
     file: UploadFile = File(...),
-    current_user: User = Depends(get_current_active_user)
+    current_user: Principal = Depends(get_current_active_user)
 ):
     """
     Handles uploading an image for use in chat.
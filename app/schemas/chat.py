@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 from pydantic import ConfigDict
 from sqlmodel import SQLModel
@@ -39,12 +39,23 @@ class MessageRead(SQLModel):
 
     id: int
     conversation_id: int
+    seq: int
     sender_id: int
     content: Optional[str]
     attachment_url: Optional[str]
     type: str
     timestamp: datetime
-    is_read: bool
+    # Every other participant's read watermark has reached this seq
+    is_read: bool = False
+
+
+class ReadReceipt(SQLModel):
+    """Read watermark of one participant in a conversation."""
+
+    conversation_id: int
+    user_id: int
+    last_read_seq: int
+    unread_count: int
 
 
 class MessageHistoryResponse(SQLModel):
@@ -52,3 +63,42 @@ class MessageHistoryResponse(SQLModel):
 
     items: List[MessageRead]
     total: int
+    has_more: bool = False
+
+
+class MessageSearchHit(SQLModel):
+    """A ranked full-text match with a highlighted snippet."""
+
+    message_id: int
+    conversation_id: int
+    seq: int
+    sender_id: int
+    timestamp: datetime
+    snippet: str
+
+
+class MessageSearchResponse(SQLModel):
+    """Page of search hits; pass ``next_cursor`` back to continue."""
+
+    items: List[MessageSearchHit]
+    next_cursor: Optional[str] = None
+
+
+class SyncRequest(SQLModel):
+    """Last seq the client has seen, per conversation id."""
+
+    cursors: Dict[int, int] = {}
+
+
+class SyncConversation(SQLModel):
+    """Messages a client missed in one conversation."""
+
+    conversation_id: int
+    last_seq: int
+    last_read_seq: int
+    items: List[MessageRead]
+    has_more: bool = False
+
+
+class SyncResponse(SQLModel):
+    conversations: List[SyncConversation]
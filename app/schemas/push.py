@@ -0,0 +1,19 @@
+from datetime import datetime
+
+from pydantic import ConfigDict, Field
+from sqlmodel import SQLModel
+
+
+class PushDeviceRegister(SQLModel):
+    token: str = Field(..., min_length=1, max_length=4096)
+    platform: str = Field(..., pattern="^(ios|android|web)$")
+
+
+class PushDeviceRead(SQLModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    token: str
+    platform: str
+    created_at: datetime
+    last_seen_at: datetime
@@ -0,0 +1,251 @@
+import json
+import logging
+import zlib
+from collections import namedtuple
+from datetime import datetime, timedelta
+from typing import Iterable, Iterator, List, Optional
+
+from sqlalchemy import delete, func
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, select
+
+from app.config import settings
+from app.database import engine
+from app.models.chat import ConversationParticipant, Message, MessageArchive
+from app.schemas.chat import MessageRead
+from app.services.periodic import PeriodicJob
+
+logger = logging.getLogger(__name__)
+
+# Same attribute names as a ``Message`` column row, so readers can treat both alike
+ArchivedMessage = namedtuple(
+    "ArchivedMessage",
+    ["id", "conversation_id", "seq", "sender_id", "content", "attachment_url", "type", "timestamp"],
+)
+
+_COLUMNS = (
+    Message.id,
+    Message.conversation_id,
+    Message.seq,
+    Message.sender_id,
+    Message.content,
+    Message.attachment_url,
+    Message.type,
+    Message.timestamp,
+)
+
+
+def _encode_block(rows) -> bytes:
+    records = [
+        [
+            row.id,
+            row.seq,
+            row.sender_id,
+            row.content,
+            row.attachment_url,
+            getattr(row.type, "value", row.type),
+            row.timestamp.isoformat(),
+        ]
+        for row in rows
+    ]
+    return zlib.compress(json.dumps(records, separators=(",", ":"), ensure_ascii=False).encode(), 6)
+
+
+def _decode_block(block: MessageArchive) -> List[ArchivedMessage]:
+    return [
+        ArchivedMessage(
+            id=record[0],
+            conversation_id=block.conversation_id,
+            seq=record[1],
+            sender_id=record[2],
+            content=record[3],
+            attachment_url=record[4],
+            type=record[5],
+            timestamp=datetime.fromisoformat(record[6]),
+        )
+        # Blocks written before read watermarks carry a trailing is_read flag; it is ignored
+        for record in json.loads(zlib.decompress(block.payload))
+    ]
+
+
+def archived_through(session: Session, conversation_id: int) -> int:
+    """Highest seq held in the archive for a conversation (0 if none)."""
+    return session.exec(
+        select(func.coalesce(func.max(MessageArchive.last_seq), 0)).where(
+            MessageArchive.conversation_id == conversation_id
+        )
+    ).one()
+
+
+def iter_archived(session: Session, conversation_id: int, after_seq: int = 0) -> Iterator[List[ArchivedMessage]]:
+    """Archived messages with seq above ``after_seq``, one decompressed block at a time."""
+    last_seq = after_seq
+    while True:
+        block = session.exec(
+            select(MessageArchive)
+            .where(MessageArchive.conversation_id == conversation_id, MessageArchive.last_seq > last_seq)
+            .order_by(MessageArchive.first_seq.asc())
+            .limit(1)
+        ).first()
+        if block is None:
+            return
+        last_seq = block.last_seq
+        session.expunge(block)
+        yield [message for message in _decode_block(block) if message.seq > after_seq]
+
+
+def _archived_before(session: Session, conversation_id: int, before_seq: int, limit: int) -> List[ArchivedMessage]:
+    """Up to ``limit`` archived messages just below ``before_seq``, in ascending order."""
+    found: List[ArchivedMessage] = []
+    upper = before_seq
+    while len(found) < limit:
+        block = session.exec(
+            select(MessageArchive)
+            .where(MessageArchive.conversation_id == conversation_id, MessageArchive.first_seq < upper)
+            .order_by(MessageArchive.first_seq.desc())
+            .limit(1)
+        ).first()
+        if block is None:
+            break
+        upper = block.first_seq
+        session.expunge(block)
+        found = [message for message in _decode_block(block) if message.seq < before_seq] + found
+    return found[-limit:]
+
+
+def with_read_state(session: Session, conversation_id: int, messages: Iterable) -> List[MessageRead]:
+    """Serialize ``messages``, marking those every other participant has read.
+
+    Read state comes only from the participants' ``last_read_seq``
+    watermarks, so every endpoint reports the same answer.
+    """
+    watermarks = session.exec(
+        select(ConversationParticipant.user_id, ConversationParticipant.last_read_seq).where(
+            ConversationParticipant.conversation_id == conversation_id
+        )
+    ).all()
+    result = []
+    for message in messages:
+        serialized = MessageRead.model_validate(message)
+        serialized.is_read = all(
+            last_read_seq >= message.seq for user_id, last_read_seq in watermarks if user_id != message.sender_id
+        )
+        result.append(serialized)
+    return result
+
+
+def load_messages(
+    session: Session,
+    conversation_id: int,
+    *,
+    limit: int,
+    after_seq: Optional[int] = None,
+    before_seq: Optional[int] = None,
+) -> List[MessageRead]:
+    """A page of messages in ascending seq order, read through the archive.
+
+    With ``after_seq`` the page starts just after it; otherwise it ends just
+    before ``before_seq`` (or at the newest message). Hot rows always have
+    higher seqs than archived ones, so the archive is only touched when the
+    page reaches below the hot table.
+    """
+    through = archived_through(session, conversation_id)
+    statement = select(Message).where(Message.conversation_id == conversation_id)
+
+    if after_seq is not None:
+        messages: list = []
+        if after_seq < through:
+            for block in iter_archived(session, conversation_id, after_seq):
+                messages.extend(block)
+                if len(messages) >= limit:
+                    return with_read_state(session, conversation_id, messages[:limit])
+        hot = session.exec(
+            statement.where(Message.seq > max(after_seq, through))
+            .order_by(Message.seq.asc())
+            .limit(limit - len(messages))
+        ).all()
+        return with_read_state(session, conversation_id, messages + list(hot))
+
+    if before_seq is not None:
+        statement = statement.where(Message.seq < before_seq)
+    hot = list(session.exec(statement.order_by(Message.seq.desc()).limit(limit)).all())
+    hot.reverse()
+    messages = hot
+    if len(hot) < limit and through:
+        upper = hot[0].seq if hot else min(before_seq or through + 1, through + 1)
+        messages = _archived_before(session, conversation_id, upper, limit - len(hot)) + hot
+    return with_read_state(session, conversation_id, messages)
+
+
+def archive_cold_messages(engine: Engine, *, older_than: timedelta, block_size: int, max_blocks: int) -> int:
+    """Move messages older than ``older_than`` into compressed archive blocks.
+
+    Works conversation by conversation on the oldest rows, one block per
+    transaction, and stops after ``max_blocks`` so a backlog drains over
+    several runs. Returns the number of messages archived.
+
+    The newest message row is never archived: SQLite hands out
+    ``max(id) + 1`` for new rows, so deleting it would let an id that is
+    already in an archive block (and in ``message_fts``) be reused.
+    """
+    cutoff = datetime.utcnow() - older_than
+    archived = 0
+    blocks = 0
+    with Session(engine) as session:
+        newest = session.exec(
+            select(Message.conversation_id, Message.seq).order_by(Message.id.desc()).limit(1)
+        ).first()
+        boundaries = session.exec(
+            select(Message.conversation_id, func.max(Message.seq))
+            .where(Message.timestamp < cutoff)
+            .group_by(Message.conversation_id)
+        ).all()
+
+        for conversation_id, boundary in boundaries:
+            if conversation_id == newest.conversation_id:
+                boundary = min(boundary, newest.seq - 1)
+            while blocks < max_blocks:
+                rows = session.exec(
+                    select(*_COLUMNS)
+                    .where(Message.conversation_id == conversation_id, Message.seq <= boundary)
+                    .order_by(Message.seq.asc())
+                    .limit(block_size)
+                ).all()
+                if not rows:
+                    break
+                session.add(
+                    MessageArchive(
+                        conversation_id=conversation_id,
+                        first_seq=rows[0].seq,
+                        last_seq=rows[-1].seq,
+                        message_count=len(rows),
+                        payload=_encode_block(rows),
+                    )
+                )
+                session.execute(delete(Message).where(Message.id.in_([row.id for row in rows])))
+                try:
+                    session.commit()
+                except IntegrityError:
+                    # Another worker archived this range first.
+                    session.rollback()
+                    break
+                archived += len(rows)
+                blocks += 1
+            if blocks >= max_blocks:
+                break
+
+    if archived:
+        logger.info(f"Archived {archived} messages in {blocks} blocks")
+    return archived
+
+
+archive_job = PeriodicJob(
+    "chat_archive",
+    settings.CHAT_ARCHIVE_INTERVAL_SECONDS if settings.CHAT_ARCHIVE_AFTER_DAYS > 0 else 0,
+    archive_cold_messages,
+    engine,
+    older_than=timedelta(days=settings.CHAT_ARCHIVE_AFTER_DAYS),
+    block_size=settings.CHAT_ARCHIVE_BLOCK_SIZE,
+    max_blocks=settings.CHAT_ARCHIVE_MAX_BLOCKS_PER_RUN,
+)
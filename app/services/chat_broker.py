@@ -0,0 +1,209 @@
+import asyncio
+import json
+import logging
+from abc import ABC, abstractmethod
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[[dict], Awaitable[None]]
+
+
+def user_channel(user_id: int) -> str:
+    return f"chat:user:{user_id}"
+
+
+class ChatBroker(ABC):
+    """Publish/subscribe transport used to fan chat events out across processes.
+
+    Payloads are JSON-serialisable dicts. Each channel has at most one local
+    handler; a node only subscribes to channels it has local interest in.
+    ``local`` is True when every subscriber lives in this process, so
+    publishing can reach nobody the caller could not reach directly.
+    """
+
+    local = False
+
+    async def start(self) -> None:
+        pass
+
+    async def stop(self) -> None:
+        pass
+
+    @abstractmethod
+    async def subscribe(self, channel: str, handler: Handler) -> None:
+        ...
+
+    @abstractmethod
+    async def unsubscribe(self, channel: str) -> None:
+        ...
+
+    @abstractmethod
+    async def publish(self, channel: str, data: dict) -> int:
+        """Publish ``data`` and return how many subscribers received it."""
+
+    async def publish_many(self, channels: Iterable[str], data: dict) -> List[int]:
+        """Publish the same ``data`` on each of ``channels``; returns the receiver count per channel."""
+        return [await self.publish(channel, data) for channel in channels]
+
+
+class InMemoryHub:
+    """Channel registry shared by in-memory brokers that should see each other."""
+
+    def __init__(self):
+        self.subscribers: Dict[str, Set["InMemoryBroker"]] = {}
+
+
+class InMemoryBroker(ChatBroker):
+    """Single-process broker.
+
+    Used when no broker URL is configured. Tests can simulate several nodes by
+    passing the same :class:`InMemoryHub` to multiple instances.
+    """
+
+    def __init__(self, hub: Optional[InMemoryHub] = None):
+        self.local = hub is None
+        self.hub = hub or InMemoryHub()
+        self._handlers: Dict[str, Handler] = {}
+        self._inbox: "asyncio.Queue[Tuple[str, dict]]" = asyncio.Queue()
+        self._reader: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        if self._reader is None:
+            self._reader = asyncio.create_task(self._read_loop())
+
+    async def stop(self) -> None:
+        if self._reader is not None:
+            self._reader.cancel()
+            try:
+                await self._reader
+            except asyncio.CancelledError:
+                pass
+            self._reader = None
+        for channel in list(self._handlers):
+            await self.unsubscribe(channel)
+
+    async def subscribe(self, channel: str, handler: Handler) -> None:
+        self._handlers[channel] = handler
+        self.hub.subscribers.setdefault(channel, set()).add(self)
+
+    async def unsubscribe(self, channel: str) -> None:
+        self._handlers.pop(channel, None)
+        subscribers = self.hub.subscribers.get(channel)
+        if subscribers is not None:
+            subscribers.discard(self)
+            if not subscribers:
+                del self.hub.subscribers[channel]
+
+    async def publish(self, channel: str, data: dict) -> int:
+        subscribers = self.hub.subscribers.get(channel, ())
+        # Round-trip through JSON so in-process delivery sees what Redis would.
+        encoded = json.dumps(data)
+        for broker in subscribers:
+            broker._inbox.put_nowait((channel, json.loads(encoded)))
+        return len(subscribers)
+
+    async def publish_many(self, channels: Iterable[str], data: dict) -> List[int]:
+        # One JSON round-trip for the whole fan-out; subscribers share the decoded copy.
+        decoded = json.loads(json.dumps(data))
+        counts = []
+        for channel in channels:
+            subscribers = self.hub.subscribers.get(channel, ())
+            for broker in subscribers:
+                broker._inbox.put_nowait((channel, decoded))
+            counts.append(len(subscribers))
+        return counts
+
+    async def _read_loop(self) -> None:
+        while True:
+            channel, data = await self._inbox.get()
+            handler = self._handlers.get(channel)
+            if handler is None:
+                continue
+            try:
+                await handler(data)
+            except Exception:
+                logger.exception(f"Broker handler for {channel} failed")
+
+
+class RedisBroker(ChatBroker):
+    """Redis pub/sub broker for multi-worker and multi-machine deployments."""
+
+    def __init__(self, url: str):
+        self.url = url
+        self._redis = None
+        self._pubsub = None
+        self._handlers: Dict[str, Handler] = {}
+        self._reader: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        from redis import asyncio as aioredis
+
+        self._redis = aioredis.from_url(self.url)
+        self._pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+        self._reader = asyncio.create_task(self._read_loop())
+        logger.info("Redis chat broker started")
+
+    async def stop(self) -> None:
+        if self._reader is not None:
+            self._reader.cancel()
+            try:
+                await self._reader
+            except asyncio.CancelledError:
+                pass
+            self._reader = None
+        if self._pubsub is not None:
+            await self._pubsub.aclose()
+        if self._redis is not None:
+            await self._redis.aclose()
+        self._handlers.clear()
+
+    async def subscribe(self, channel: str, handler: Handler) -> None:
+        self._handlers[channel] = handler
+        await self._pubsub.subscribe(channel)
+
+    async def unsubscribe(self, channel: str) -> None:
+        if self._handlers.pop(channel, None) is not None:
+            await self._pubsub.unsubscribe(channel)
+
+    async def publish(self, channel: str, data: dict) -> int:
+        return await self._redis.publish(channel, json.dumps(data))
+
+    async def publish_many(self, channels: Iterable[str], data: dict) -> List[int]:
+        encoded = json.dumps(data)
+        pipe = self._redis.pipeline(transaction=False)
+        for channel in channels:
+            pipe.publish(channel, encoded)
+        return await pipe.execute()
+
+    async def _read_loop(self) -> None:
+        # A broadcast arrives as the same payload on several user channels in a
+        # row; decode it once for all of them.
+        last_raw, last_decoded = None, None
+        while True:
+            try:
+                if not self._handlers:
+                    await asyncio.sleep(0.1)
+                    continue
+                message = await self._pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                if message is None:
+                    continue
+                channel = message["channel"]
+                if isinstance(channel, bytes):
+                    channel = channel.decode()
+                handler = self._handlers.get(channel)
+                if handler is not None:
+                    if message["data"] != last_raw:
+                        last_raw, last_decoded = message["data"], json.loads(message["data"])
+                    await handler(last_decoded)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Redis chat broker read loop error")
+                await asyncio.sleep(1)
+
+
+def create_broker(url: str) -> ChatBroker:
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisBroker(url)
+    return InMemoryBroker()
@@ -0,0 +1,98 @@
+import json
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Union
+
+import msgpack
+
+Frame = Union[str, bytes]
+
+
+class FrameCodec(ABC):
+    """Encodes chat events for one websocket subprotocol."""
+
+    subprotocol: Optional[str] = None
+    binary = False
+
+    @abstractmethod
+    def encode(self, event: dict) -> Frame:
+        ...
+
+    @abstractmethod
+    def encode_batch(self, frames: List[Frame]) -> Frame:
+        ...
+
+    @abstractmethod
+    def decode(self, data: Frame) -> Any:
+        ...
+
+
+class JsonCodec(FrameCodec):
+    """Plain JSON text frames; the default for clients that negotiate nothing."""
+
+    def __init__(self, subprotocol: Optional[str] = None):
+        self.subprotocol = subprotocol
+
+    def encode(self, event: dict) -> Frame:
+        return json.dumps(event, separators=(",", ":"), ensure_ascii=False)
+
+    def encode_batch(self, frames: List[Frame]) -> Frame:
+        return "[" + ",".join(frames) + "]"
+
+    def decode(self, data: Frame) -> Any:
+        return json.loads(data)
+
+
+def _compact(value: Any, key: str = "") -> Any:
+    if isinstance(value, dict):
+        return {k: _compact(v, k) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_compact(item) for item in value]
+    if isinstance(value, str) and (key == "timestamp" or key.endswith("_at")):
+        try:
+            moment = datetime.fromisoformat(value)
+        except ValueError:
+            return value
+        if moment.tzinfo is None:
+            moment = moment.replace(tzinfo=timezone.utc)
+        return int(moment.timestamp() * 1000)
+    return value
+
+
+class MsgpackCodec(FrameCodec):
+    """Binary MessagePack frames.
+
+    Same field names as JSON, but ``timestamp`` and ``*_at`` values are sent
+    as integer milliseconds since the epoch (UTC).
+    """
+
+    subprotocol = "connectedcare.msgpack.v1"
+    binary = True
+
+    def encode(self, event: dict) -> Frame:
+        return msgpack.packb(_compact(event), use_bin_type=True)
+
+    def encode_batch(self, frames: List[Frame]) -> Frame:
+        packer = msgpack.Packer(use_bin_type=True)
+        return packer.pack_array_header(len(frames)) + b"".join(frames)
+
+    def decode(self, data: Frame) -> Any:
+        if isinstance(data, str):
+            return json.loads(data)
+        return msgpack.unpackb(data, raw=False)
+
+
+LEGACY_JSON = JsonCodec()
+CODECS: Dict[str, FrameCodec] = {
+    "connectedcare.json.v1": JsonCodec("connectedcare.json.v1"),
+    MsgpackCodec.subprotocol: MsgpackCodec(),
+}
+
+
+def negotiate(offered: Iterable[str]) -> FrameCodec:
+    """Pick the most compact codec the client offered, in server preference order."""
+    offered = set(offered)
+    for subprotocol in (MsgpackCodec.subprotocol, "connectedcare.json.v1"):
+        if subprotocol in offered:
+            return CODECS[subprotocol]
+    return LEGACY_JSON
@@ -0,0 +1,321 @@
+import csv
+import io
+import json
+import os
+import tempfile
+import textwrap
+from itertools import chain
+from typing import Dict, Iterator, List, Optional, Sequence
+
+from PIL import Image, ImageDraw, ImageFont
+from sqlalchemy.engine import Row
+from sqlmodel import Session, select
+
+from app.config import settings
+from app.database import engine
+from app.models.chat import Conversation, Message
+from app.models.user import User
+from app.services.chat_archive import iter_archived
+
+EXPORT_BATCH_SIZE = 1000
+CSV_COLUMNS = [
+    "seq", "message_id", "timestamp", "sender_id", "sender_name",
+    "type", "content", "attachment_url", "attachment_bytes",
+]
+
+# PDF pages are rendered as bilevel A4 images at 150 dpi (CCITT G4 compressed,
+# roughly 40 KB per page) and appended to the file in groups; the first page
+# goes out on its own so the download starts straight away.
+PAGE_DPI = 150
+PAGE_SIZE = (1240, 1754)
+PAGE_MARGIN = 90
+FONT_SIZE = 20
+LINE_HEIGHT = 28
+PAGES_PER_APPEND = 50
+
+
+def _message_rows(session: Session, conversation_id: int, after_seq: int = 0) -> Iterator[Sequence[Row]]:
+    """Hot messages above ``after_seq`` in seq order, ``EXPORT_BATCH_SIZE`` rows at a time.
+
+    Plain column rows through ``yield_per`` (a server-side cursor on
+    Postgres) keep memory flat: nothing is added to the identity map.
+    """
+    statement = (
+        select(
+            Message.id,
+            Message.seq,
+            Message.sender_id,
+            Message.type,
+            Message.content,
+            Message.attachment_url,
+            Message.timestamp,
+        )
+        .where(Message.conversation_id == conversation_id, Message.seq > after_seq)
+        .order_by(Message.seq.asc())
+        .execution_options(yield_per=EXPORT_BATCH_SIZE)
+    )
+    yield from session.execute(statement).partitions()
+
+
+class _Resolver:
+    """Resolves sender names and attachment files once per batch instead of per message.
+
+    Batches are archive blocks followed by hot-table cursor partitions.
+    """
+
+    def __init__(self, session: Session):
+        self.session = session
+        self.names: Dict[int, str] = {}
+
+    def senders(self, rows: Sequence[Row]) -> None:
+        missing = {row.sender_id for row in rows} - self.names.keys()
+        if missing:
+            for user_id, full_name in self.session.execute(
+                select(User.id, User.full_name).where(User.id.in_(missing))
+            ):
+                self.names[user_id] = full_name
+
+    @staticmethod
+    def attachments(rows: Sequence[Row]) -> Dict[str, dict]:
+        resolved: Dict[str, dict] = {}
+        for url in {row.attachment_url for row in rows if row.attachment_url}:
+            absolute = url
+            size: Optional[int] = None
+            if "/media/" in url:
+                relative = url.split("/media/", 1)[1]
+                if url.startswith("/"):
+                    absolute = f"{settings.BASE_URL}{url}"
+                try:
+                    size = os.stat(os.path.join(settings.UPLOAD_DIR, relative)).st_size
+                except OSError:
+                    size = None
+            resolved[url] = {"url": absolute, "bytes": size}
+        return resolved
+
+    def _rows(self, conversation_id: int) -> Iterator[Sequence[Row]]:
+        # Archived blocks hold the oldest seqs, so they come first. The archiver
+        # may move rows while we read, so the archive is read again once the
+        # hot cursor has its snapshot: anything archived before that snapshot
+        # is found there, anything archived after it is still in the snapshot.
+        last_seq = 0
+        for rows in iter_archived(self.session, conversation_id):
+            yield rows
+            last_seq = rows[-1].seq
+        hot = _message_rows(self.session, conversation_id, last_seq)
+        first = next(hot, None)
+        for rows in iter_archived(self.session, conversation_id, last_seq):
+            yield rows
+            last_seq = rows[-1].seq
+        for rows in chain([first] if first else [], hot):
+            rows = [row for row in rows if row.seq > last_seq]
+            if rows:
+                yield rows
+
+    def batches(self, conversation_id: int) -> Iterator[List[dict]]:
+        for rows in self._rows(conversation_id):
+            self.senders(rows)
+            attachments = self.attachments(rows)
+            yield [
+                {
+                    "seq": row.seq,
+                    "message_id": row.id,
+                    "timestamp": row.timestamp.isoformat(),
+                    "sender_id": row.sender_id,
+                    "sender_name": self.names.get(row.sender_id),
+                    "type": row.type.value if hasattr(row.type, "value") else row.type,
+                    "content": row.content,
+                    "attachment": attachments.get(row.attachment_url) if row.attachment_url else None,
+                }
+                for row in rows
+            ]
+
+
+def conversation_header(conversation: Conversation) -> dict:
+    """Export metadata, built before the response starts.
+
+    Exporters take it as an argument so that a conversation deleted
+    mid-download cannot break the stream.
+    """
+    return {
+        "id": conversation.id,
+        "title": conversation.title,
+        "created_at": conversation.created_at.isoformat(),
+        "message_count": conversation.last_seq,
+    }
+
+
+def export_json(conversation_id: int, header: dict) -> Iterator[str]:
+    """``{"conversation": {...}, "messages": [...]}``, written incrementally."""
+    with Session(engine) as session:
+        yield f'{{"conversation":{json.dumps(header, ensure_ascii=False)},"messages":['
+        first = True
+        for batch in _Resolver(session).batches(conversation_id):
+            chunk = ",".join(json.dumps(item, ensure_ascii=False, separators=(",", ":")) for item in batch)
+            yield chunk if first else "," + chunk
+            first = False
+        yield "]}"
+
+
+def export_csv(conversation_id: int, header: dict) -> Iterator[str]:
+    with Session(engine) as session:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(CSV_COLUMNS)
+        for batch in _Resolver(session).batches(conversation_id):
+            for item in batch:
+                attachment = item["attachment"] or {}
+                writer.writerow([
+                    item["seq"], item["message_id"], item["timestamp"], item["sender_id"], item["sender_name"],
+                    item["type"], item["content"], attachment.get("url"), attachment.get("bytes"),
+                ])
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        # Header only, for a conversation without messages
+        if buffer.tell():
+            yield buffer.getvalue()
+
+
+def _load_font() -> ImageFont.FreeTypeFont:
+    # DejaVu covers accented names and symbols; Pillow's bundled font is Latin-only
+    try:
+        return ImageFont.truetype("DejaVuSans.ttf", FONT_SIZE)
+    except OSError:
+        return ImageFont.load_default(size=FONT_SIZE)
+
+
+class _GlyphCache:
+    """Rasterises each character once; lines are then composed by pasting glyphs.
+
+    FreeType rendering costs milliseconds per line, which is far too slow
+    for transcripts of 100k messages. Kerning is lost, which a transcript
+    can live without.
+    """
+
+    def __init__(self, font: ImageFont.ImageFont):
+        self.font = font
+        self._glyphs: Dict[str, tuple] = {}
+
+    def glyph(self, char: str) -> tuple:
+        cached = self._glyphs.get(char)
+        if cached is None:
+            left, top, right, bottom = self.font.getbbox(char)
+            mask = None
+            if right > 0 and bottom > 0 and right > left and bottom > top:
+                mask = Image.new("L", (right, bottom), 0)
+                ImageDraw.Draw(mask).text((0, 0), char, fill=255, font=self.font)
+            cached = self._glyphs[char] = (mask, self.font.getlength(char))
+        return cached
+
+    def draw(self, page: Image.Image, position: tuple, text: str) -> None:
+        x, y = position
+        for char in text:
+            mask, advance = self.glyph(char)
+            if mask is not None:
+                page.paste(0, (int(x), y), mask)
+            x += advance
+
+
+class _PdfWriter:
+    """Renders lines onto page images and appends them to a PDF file in small groups.
+
+    Pillow's append mode adds each group as an incremental update after the
+    bytes already written, which never change again, so they can be sent
+    as soon as a group lands (see ``flushed``).
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.font = _load_font()
+        self.glyphs = _GlyphCache(self.font)
+        width = self.font.getlength("x" * 50) / 50
+        self.chars_per_line = max(20, int((PAGE_SIZE[0] - 2 * PAGE_MARGIN) / width))
+        self.lines_per_page = (PAGE_SIZE[1] - 2 * PAGE_MARGIN) // LINE_HEIGHT
+        self.pages: List[Image.Image] = []
+        self.written = 0
+        self.sent = 0
+        self._new_page()
+
+    def _new_page(self):
+        self.page = Image.new("1", PAGE_SIZE, 1)
+        self.line = 0
+
+    def write(self, text: str) -> None:
+        for paragraph in text.splitlines() or [""]:
+            for line in textwrap.wrap(paragraph, self.chars_per_line) or [""]:
+                if self.line >= self.lines_per_page:
+                    self._finish_page()
+                self.glyphs.draw(self.page, (PAGE_MARGIN, PAGE_MARGIN + self.line * LINE_HEIGHT), line)
+                self.line += 1
+
+    def _finish_page(self):
+        self.pages.append(self.page)
+        self._new_page()
+        if len(self.pages) >= (PAGES_PER_APPEND if self.written else 1):
+            self._append()
+
+    def _append(self):
+        if not self.pages:
+            return
+        first, rest = self.pages[0], self.pages[1:]
+        first.save(self.path, "PDF", resolution=PAGE_DPI, save_all=True, append_images=rest, append=self.written > 0)
+        self.written += len(self.pages)
+        self.pages = []
+
+    def close(self) -> None:
+        if self.line or not self.written:
+            self.pages.append(self.page)
+        self._append()
+
+    def flushed(self, chunk_size: int) -> Iterator[bytes]:
+        """File bytes appended since the last call."""
+        if not self.written:
+            return
+        with open(self.path, "rb") as f:
+            f.seek(self.sent)
+            while True:
+                data = f.read(chunk_size)
+                if not data:
+                    return
+                self.sent += len(data)
+                yield data
+
+
+def export_pdf(conversation_id: int, header: dict, chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+    """Printable transcript.
+
+    Pages are rendered a few at a time and appended to a temporary file
+    (Pillow's PDF append mode), so memory holds at most ``PAGES_PER_APPEND``
+    page images. Each appended group is streamed as soon as it is written,
+    so the first bytes leave after one page rather than after the whole
+    transcript; the file is removed at the end.
+    """
+    handle, path = tempfile.mkstemp(suffix=".pdf")
+    os.close(handle)
+    try:
+        with Session(engine) as session:
+            pdf = _PdfWriter(path)
+            pdf.write(f"Conversation {header['id']}: {header['title'] or 'Direct conversation'}")
+            pdf.write(f"Started {header['created_at']} - {header['message_count']} messages")
+            pdf.write("")
+            for batch in _Resolver(session).batches(conversation_id):
+                for item in batch:
+                    sender = item["sender_name"] or f"User {item['sender_id']}"
+                    pdf.write(f"[{item['timestamp']}] #{item['seq']} {sender}:")
+                    if item["content"]:
+                        pdf.write(item["content"])
+                    if item["attachment"]:
+                        pdf.write(f"Attachment: {item['attachment']['url']}")
+                    pdf.write("")
+                yield from pdf.flushed(chunk_size)
+            pdf.close()
+            yield from pdf.flushed(chunk_size)
+    finally:
+        os.remove(path)
+
+
+EXPORTERS = {
+    "json": (export_json, "application/json"),
+    "csv": (export_csv, "text/csv"),
+    "pdf": (export_pdf, "application/pdf"),
+}
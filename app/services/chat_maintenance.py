@@ -0,0 +1,144 @@
+import logging
+
+from sqlalchemy import bindparam, func, inspect, text, update
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, select
+
+from app.models.chat import Conversation, ConversationParticipant, Message
+
+logger = logging.getLogger(__name__)
+
+# Columns added to tables that predate them, with the DDL type and default
+# used to add them. ``create_all`` only creates missing tables.
+_ADDED_COLUMNS = [
+    ("message", "seq", "INTEGER NOT NULL DEFAULT 0"),
+    ("conversation", "last_seq", "INTEGER NOT NULL DEFAULT 0"),
+    ("conversation", "direct_key", "VARCHAR(64)"),
+    ("conversationparticipant", "last_read_seq", "INTEGER NOT NULL DEFAULT 0"),
+]
+
+# Columns (and their indexes) no longer mapped, dropped once the backfills
+# above no longer need them.
+_DROPPED_COLUMNS = [
+    ("message", "is_read", "ix_message_is_read"),
+]
+
+_BACKFILL_BATCH = 5000
+
+
+def _number_messages(connection: Connection) -> int:
+    """Number every conversation's messages 1, 2, ... in id order."""
+    rows = connection.execute(
+        select(Message.id, Message.conversation_id).order_by(Message.conversation_id, Message.id)
+    ).all()
+    numbered = []
+    conversation_id, seq = None, 0
+    for message_id, message_conversation_id in rows:
+        if message_conversation_id != conversation_id:
+            conversation_id, seq = message_conversation_id, 0
+        seq += 1
+        numbered.append({"message_id": message_id, "new_seq": seq})
+    statement = update(Message.__table__).where(Message.__table__.c.id == bindparam("message_id")).values(
+        seq=bindparam("new_seq")
+    )
+    for start in range(0, len(numbered), _BACKFILL_BATCH):
+        connection.execute(statement, numbered[start:start + _BACKFILL_BATCH])
+    return len(numbered)
+
+
+def upgrade_chat_schema(engine: Engine) -> None:
+    """Bring chat tables created before seqs, read watermarks and direct keys up to date.
+
+    Adds the missing columns, numbers existing messages per conversation in
+    id order, sets each conversation's ``last_seq`` and each participant's
+    ``last_read_seq`` (up to their first unread message from someone else,
+    going by the old per-message ``is_read`` flags, which are then dropped),
+    keys existing 1:1 chats, and only then creates the indexes that depend
+    on those values.
+    Does nothing on a database that is already current.
+    """
+    inspector = inspect(engine)
+    added = set()
+    with engine.begin() as connection:
+        for table, column, ddl in _ADDED_COLUMNS:
+            if column not in {c["name"] for c in inspector.get_columns(table)}:
+                connection.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+                added.add(column)
+
+        if "seq" in added:
+            count = _number_messages(connection)
+            logger.info(f"Numbered {count} existing messages")
+        if "last_seq" in added:
+            connection.execute(text(
+                "UPDATE conversation SET last_seq = COALESCE("
+                "(SELECT MAX(m.seq) FROM message AS m WHERE m.conversation_id = conversation.id), 0)"
+            ))
+        if "last_read_seq" in added:
+            connection.execute(text(
+                "UPDATE conversationparticipant SET last_read_seq = COALESCE("
+                "(SELECT MIN(m.seq) - 1 FROM message AS m"
+                " WHERE m.conversation_id = conversationparticipant.conversation_id"
+                " AND m.sender_id <> conversationparticipant.user_id AND m.is_read = :unread),"
+                " (SELECT c.last_seq FROM conversation AS c WHERE c.id = conversationparticipant.conversation_id))"
+            ), {"unread": False})
+
+        for table, column, index in _DROPPED_COLUMNS:
+            if column in {c["name"] for c in inspector.get_columns(table)}:
+                if index in {i["name"] for i in inspector.get_indexes(table)}:
+                    on_table = f" ON {table}" if engine.dialect.name == "mysql" else ""
+                    connection.execute(text(f"DROP INDEX {index}{on_table}"))
+                connection.execute(text(f"ALTER TABLE {table} DROP COLUMN {column}"))
+                logger.info(f"Dropped {table}.{column}")
+
+    if "direct_key" in added:
+        backfill_direct_keys(engine)
+    for model in (Conversation, ConversationParticipant, Message):
+        for index in model.__table__.indexes:
+            index.create(bind=engine, checkfirst=True)
+
+
+def backfill_direct_keys(engine: Engine) -> int:
+    """Give untitled two-person conversations created before ``direct_key`` their key.
+
+    When a pair has several such conversations, the oldest one becomes the
+    canonical chat; the others keep a NULL key and remain reachable by id.
+    """
+    with Session(engine) as session:
+        pairs = session.exec(
+            select(
+                ConversationParticipant.conversation_id,
+                func.min(ConversationParticipant.user_id),
+                func.max(ConversationParticipant.user_id),
+            )
+            .join(Conversation)
+            .where(Conversation.direct_key.is_(None), Conversation.title.is_(None))
+            .group_by(ConversationParticipant.conversation_id)
+            .having(func.count(ConversationParticipant.user_id) == 2)
+            .order_by(ConversationParticipant.conversation_id)
+        ).all()
+
+        claimed = 0
+        seen = set()
+        for conversation_id, low, high in pairs:
+            key = f"{low}:{high}"
+            if key in seen:
+                continue
+            seen.add(key)
+            try:
+                with session.begin_nested():
+                    session.execute(
+                        update(Conversation)
+                        .where(Conversation.id == conversation_id)
+                        .values(direct_key=key)
+                        .execution_options(synchronize_session=False)
+                    )
+                claimed += 1
+            except IntegrityError:
+                # The pair already has a keyed conversation.
+                pass
+        session.commit()
+
+    if claimed:
+        logger.info(f"Assigned direct_key to {claimed} existing conversations")
+    return claimed
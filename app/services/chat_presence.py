@@ -0,0 +1,178 @@
+import asyncio
+import logging
+import time
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Set, Tuple
+
+from app.services.chat_routing import conversation_routes
+
+if TYPE_CHECKING:
+    from app.chat_manager import ClientConnection, ConnectionManager
+
+logger = logging.getLogger(__name__)
+
+PRESENCE_CHANNEL = "chat:presence"
+
+
+class PresenceTracker:
+    """Heartbeat-based online/offline state, delivered to watchers as diffs.
+
+    A user is online while one of their sockets (on any node) has shown
+    activity within ``timeout`` seconds. Each node publishes its locally
+    online users once per ``interval``; watchers get a snapshot when they
+    subscribe and afterwards only the users whose state changed.
+    """
+
+    def __init__(self, manager: "ConnectionManager", *, interval: float, timeout: float, max_watch: int):
+        self.manager = manager
+        self.interval = interval
+        self.timeout = timeout
+        self.max_watch = max_watch
+        self._remote_seen: Dict[int, float] = {}
+        self._watchers: Dict[int, Set["ClientConnection"]] = {}
+        self._watching: Dict["ClientConnection", Set[int]] = {}
+        self._published: Dict[int, bool] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        await self.manager.broker.subscribe(PRESENCE_CHANNEL, self._on_heartbeat)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def touch(self, connection: "ClientConnection"):
+        connection.last_activity = time.monotonic()
+
+    def _local_online(self, user_id: int, now: float) -> bool:
+        return any(
+            now - connection.last_activity < self.timeout
+            for connection in self.manager.active_connections.get(user_id, ())
+        )
+
+    def is_online(self, user_id: int, now: Optional[float] = None) -> bool:
+        now = time.monotonic() if now is None else now
+        if self._local_online(user_id, now):
+            return True
+        seen = self._remote_seen.get(user_id)
+        return seen is not None and now - seen < self.timeout
+
+    def watch(self, connection: "ClientConnection", user_ids: Iterable[int]) -> dict:
+        """Replace what ``connection`` watches and return a snapshot frame."""
+        self.forget(connection)
+        watched = set(list(user_ids)[: self.max_watch])
+        self._watching[connection] = watched
+        now = time.monotonic()
+        online: List[int] = []
+        offline: List[int] = []
+        for user_id in watched:
+            self._watchers.setdefault(user_id, set()).add(connection)
+            state = self._published.setdefault(user_id, self.is_online(user_id, now))
+            (online if state else offline).append(user_id)
+        return {"event": "presence", "snapshot": True, "online": sorted(online), "offline": sorted(offline)}
+
+    def forget(self, connection: "ClientConnection"):
+        for user_id in self._watching.pop(connection, ()):
+            watchers = self._watchers.get(user_id)
+            if watchers is None:
+                continue
+            watchers.discard(connection)
+            if not watchers:
+                del self._watchers[user_id]
+                self._published.pop(user_id, None)
+
+    async def _on_heartbeat(self, data: dict):
+        if data.get("origin") == self.manager.node_id:
+            return
+        now = time.monotonic()
+        for user_id in data.get("online", ()):
+            self._remote_seen[int(user_id)] = now
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self._tick()
+            except Exception:
+                logger.exception("Presence tick failed")
+
+    async def _tick(self):
+        now = time.monotonic()
+        local = [user_id for user_id in self.manager.active_connections if self._local_online(user_id, now)]
+        await self.manager.broker.publish(PRESENCE_CHANNEL, {"origin": self.manager.node_id, "online": local})
+
+        for user_id, seen in list(self._remote_seen.items()):
+            if now - seen >= self.timeout:
+                del self._remote_seen[user_id]
+
+        diffs: Dict["ClientConnection", Tuple[List[int], List[int]]] = {}
+        for user_id, watchers in self._watchers.items():
+            state = self.is_online(user_id, now)
+            if self._published.get(user_id) == state:
+                continue
+            self._published[user_id] = state
+            for connection in watchers:
+                online, offline = diffs.setdefault(connection, ([], []))
+                (online if state else offline).append(user_id)
+
+        for connection, (online, offline) in diffs.items():
+            connection.enqueue({"event": "presence", "online": online, "offline": offline})
+
+
+class TypingCoalescer:
+    """Collects "typing" notices and fans them out once per conversation per window.
+
+    Each sender is accepted at most once per ``min_interval`` seconds per
+    conversation, so holding a key down cannot trigger a fan-out per keystroke.
+    """
+
+    def __init__(self, manager: "ConnectionManager", *, flush_interval: float, min_interval: float):
+        self.manager = manager
+        self.flush_interval = flush_interval
+        self.min_interval = min_interval
+        self._pending: Dict[int, Set[int]] = {}
+        self._last_accepted: Dict[Tuple[int, int], float] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def note(self, conversation_id: int, user_id: int) -> bool:
+        now = time.monotonic()
+        key = (conversation_id, user_id)
+        last = self._last_accepted.get(key)
+        if last is not None and now - last < self.min_interval:
+            return False
+        self._last_accepted[key] = now
+        self._pending.setdefault(conversation_id, set()).add(user_id)
+        return True
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self._flush()
+            except Exception:
+                logger.exception("Typing flush failed")
+
+    async def _flush(self):
+        pending, self._pending = self._pending, {}
+        for conversation_id, user_ids in pending.items():
+            participants = conversation_routes.get(conversation_id)
+            if participants is None:
+                continue
+            await self.manager.broadcast(
+                {"event": "typing", "conversation_id": conversation_id, "user_ids": sorted(user_ids)},
+                participants,
+            )
+
+        cutoff = time.monotonic() - self.min_interval
+        for key, accepted in list(self._last_accepted.items()):
+            if accepted < cutoff:
+                del self._last_accepted[key]
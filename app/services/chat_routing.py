@@ -0,0 +1,77 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import FrozenSet, Iterable, Optional, Tuple
+
+from sqlmodel import Session, select
+
+from app.config import settings
+from app.models.chat import ConversationParticipant
+
+logger = logging.getLogger(__name__)
+
+
+class ConversationRoutingTable:
+    """In-memory conversation -> participant IDs map with a TTL.
+
+    Entries are loaded on first use, so authorising a sender and resolving
+    fan-out targets cost no queries in the common case. Membership is fixed
+    when a conversation is created (no endpoint adds or removes
+    participants), so there is nothing to broadcast to other processes;
+    the TTL bounds staleness for changes made directly in the database.
+    Used from the event loop and DB executor threads alike.
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._members: "OrderedDict[int, Tuple[FrozenSet[int], float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, conversation_id: int) -> Optional[FrozenSet[int]]:
+        with self._lock:
+            entry = self._members.get(conversation_id)
+            if entry is None:
+                return None
+            members, expires_at = entry
+            if time.monotonic() >= expires_at:
+                del self._members[conversation_id]
+                return None
+            self._members.move_to_end(conversation_id)
+            return members
+
+    def set(self, conversation_id: int, user_ids: Iterable[int]) -> FrozenSet[int]:
+        members = frozenset(user_ids)
+        with self._lock:
+            self._members[conversation_id] = (members, time.monotonic() + self.ttl)
+            self._members.move_to_end(conversation_id)
+            while len(self._members) > self.max_entries:
+                self._members.popitem(last=False)
+        return members
+
+    def invalidate(self, conversation_id: int) -> None:
+        with self._lock:
+            self._members.pop(conversation_id, None)
+
+    def participants(self, session: Session, conversation_id: int) -> FrozenSet[int]:
+        members = self.get(conversation_id)
+        if members is not None:
+            return members
+        rows = session.exec(
+            select(ConversationParticipant.user_id).where(
+                ConversationParticipant.conversation_id == conversation_id
+            )
+        ).all()
+        if not rows:
+            # Unknown conversations are not cached; they may be created later.
+            return frozenset()
+        return self.set(conversation_id, rows)
+
+    def is_participant(self, session: Session, conversation_id: int, user_id: int) -> bool:
+        return user_id in self.participants(session, conversation_id)
+
+
+conversation_routes = ConversationRoutingTable(
+    max_entries=settings.CHAT_ROUTING_CACHE_SIZE, ttl=settings.CHAT_ROUTING_TTL_SECONDS
+)
@@ -0,0 +1,258 @@
+import base64
+import logging
+import re
+from typing import List, Optional, Tuple
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+from sqlmodel import Session, select
+
+from app.models.chat import ConversationParticipant, Message
+
+logger = logging.getLogger(__name__)
+
+# The index lives in its own table fed by an insert trigger, so it keeps
+# working when rows leave the hot ``message`` table. ``conversation_id`` is
+# indexed too, so a search matches only inside the caller's conversations
+# instead of ranking every hit in the database and filtering afterwards.
+_SQLITE_TABLE = """
+    CREATE VIRTUAL TABLE {name} USING fts5(
+        content,
+        conversation_id,
+        seq UNINDEXED,
+        sender_id UNINDEXED,
+        timestamp UNINDEXED,
+        tokenize = 'porter unicode61 remove_diacritics 2'
+    )
+"""
+
+_SQLITE_TRIGGER = """
+    CREATE TRIGGER message_fts_ai AFTER INSERT ON message WHEN new.content IS NOT NULL BEGIN
+        INSERT INTO message_fts (rowid, content, conversation_id, seq, sender_id, timestamp)
+        VALUES (new.id, new.content, new.conversation_id, new.seq, new.sender_id, new.timestamp);
+    END
+"""
+
+_SQLITE_DDL = [
+    _SQLITE_TABLE.format(name="message_fts"),
+    _SQLITE_TRIGGER,
+    """
+    INSERT INTO message_fts (rowid, content, conversation_id, seq, sender_id, timestamp)
+    SELECT id, content, conversation_id, seq, sender_id, timestamp FROM message WHERE content IS NOT NULL
+    """,
+]
+
+# Rebuilds an index created with an unindexed conversation_id. It copies
+# the old index rather than re-reading ``message``, which no longer holds
+# archived rows.
+_SQLITE_REINDEX = [
+    "DROP TRIGGER IF EXISTS message_fts_ai",
+    _SQLITE_TABLE.format(name="message_fts_scoped"),
+    """
+    INSERT INTO message_fts_scoped (rowid, content, conversation_id, seq, sender_id, timestamp)
+    SELECT rowid, content, conversation_id, seq, sender_id, timestamp FROM message_fts
+    """,
+    "DROP TABLE message_fts",
+    "ALTER TABLE message_fts_scoped RENAME TO message_fts",
+    _SQLITE_TRIGGER,
+]
+
+_POSTGRES_DDL = [
+    """
+    CREATE TABLE message_search (
+        message_id INTEGER PRIMARY KEY,
+        conversation_id INTEGER NOT NULL,
+        seq INTEGER NOT NULL,
+        sender_id INTEGER NOT NULL,
+        timestamp TIMESTAMP NOT NULL,
+        content TEXT NOT NULL,
+        document TSVECTOR GENERATED ALWAYS AS (to_tsvector('english', content)) STORED
+    )
+    """,
+    "CREATE INDEX ix_message_search_document ON message_search USING GIN (document)",
+    "CREATE INDEX ix_message_search_conversation ON message_search (conversation_id)",
+    """
+    CREATE FUNCTION message_search_ai() RETURNS trigger AS $$
+    BEGIN
+        IF NEW.content IS NOT NULL THEN
+            INSERT INTO message_search (message_id, conversation_id, seq, sender_id, timestamp, content)
+            VALUES (NEW.id, NEW.conversation_id, NEW.seq, NEW.sender_id, NEW.timestamp, NEW.content);
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER message_search_ai AFTER INSERT ON message
+    FOR EACH ROW EXECUTE FUNCTION message_search_ai()
+    """,
+    """
+    INSERT INTO message_search (message_id, conversation_id, seq, sender_id, timestamp, content)
+    SELECT id, conversation_id, seq, sender_id, timestamp, content FROM message WHERE content IS NOT NULL
+    """,
+]
+
+# Lower score ranks first on both backends; ties are broken by message id.
+_SQLITE_QUERY = """
+SELECT * FROM (
+    SELECT f.rowid AS message_id, f.conversation_id, f.seq, f.sender_id, f.timestamp,
+           snippet(message_fts, 0, '<b>', '</b>', '…', 16) AS snippet,
+           bm25(message_fts, 1.0, 0.0) AS score
+    FROM message_fts AS f
+    JOIN conversationparticipant AS p
+      ON p.conversation_id = f.conversation_id AND p.user_id = :user_id
+    WHERE message_fts MATCH :query
+) AS hits
+WHERE (score, message_id) > (:after_score, :after_id)
+ORDER BY score, message_id
+LIMIT :limit
+"""
+
+_POSTGRES_QUERY = """
+SELECT hits.message_id, hits.conversation_id, hits.seq, hits.sender_id, hits.timestamp,
+       ts_headline('english', hits.content, websearch_to_tsquery('english', :query),
+                   'MaxWords=24, MinWords=8, MaxFragments=1') AS snippet,
+       hits.score
+FROM (
+    SELECT s.message_id, s.conversation_id, s.seq, s.sender_id, s.timestamp, s.content,
+           -ts_rank_cd(s.document, websearch_to_tsquery('english', :query)) AS score
+    FROM message_search AS s
+    JOIN conversationparticipant AS p
+      ON p.conversation_id = s.conversation_id AND p.user_id = :user_id
+    WHERE s.document @@ websearch_to_tsquery('english', :query)
+) AS hits
+WHERE (hits.score, hits.message_id) > (:after_score, :after_id)
+ORDER BY hits.score, hits.message_id
+LIMIT :limit
+"""
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+
+def install_search_index(engine: Engine) -> None:
+    """Create the full-text index and its trigger if this database lacks them."""
+    dialect = engine.dialect.name
+    if dialect == "sqlite":
+        table, statements = "message_fts", _SQLITE_DDL
+    elif dialect == "postgresql":
+        table, statements = "message_search", _POSTGRES_DDL
+    else:
+        logger.warning(f"No full-text index on {dialect}; chat search falls back to LIKE over hot messages")
+        return
+
+    if inspect(engine).has_table(table):
+        if dialect == "sqlite" and _sqlite_index_unscoped(engine):
+            with engine.begin() as connection:
+                for statement in _SQLITE_REINDEX:
+                    connection.execute(text(statement))
+            logger.info("Rebuilt chat search index with conversation_id indexed")
+        return
+    with engine.begin() as connection:
+        for statement in statements:
+            connection.execute(text(statement))
+    logger.info(f"Created chat search index {table}")
+
+
+def _sqlite_index_unscoped(engine: Engine) -> bool:
+    with engine.connect() as connection:
+        ddl = connection.execute(
+            text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'message_fts'")
+        ).scalar()
+    return "conversation_id UNINDEXED" in (ddl or "")
+
+
+def _sqlite_match(query: str, conversation_ids: List[int]) -> str:
+    # Quote every term so user input cannot inject FTS5 operators.
+    terms = " ".join(f'"{token}"' for token in _TOKEN.findall(query))
+    if not terms or not conversation_ids:
+        return ""
+    scope = " OR ".join(f'"{conversation_id}"' for conversation_id in conversation_ids)
+    return f"content : ({terms}) AND conversation_id : ({scope})"
+
+
+def _like_search(
+    session: Session, user_id: int, query: str, *, after_id: Optional[int], limit: int
+) -> List[dict]:
+    """Fallback for databases without a full-text index: newest matching hot messages first.
+
+    Every term must appear in the content. Archived messages are not
+    searched. The score is the negated message id, which keeps the cursor
+    format shared with the indexed backends.
+    """
+    terms = _TOKEN.findall(query)
+    if not terms:
+        return []
+    statement = (
+        select(Message.id, Message.conversation_id, Message.seq, Message.sender_id, Message.timestamp, Message.content)
+        .join(
+            ConversationParticipant,
+            (ConversationParticipant.conversation_id == Message.conversation_id)
+            & (ConversationParticipant.user_id == user_id),
+        )
+        .where(*(Message.content.contains(term, autoescape=True) for term in terms))
+        .order_by(Message.id.desc())
+        .limit(limit)
+    )
+    if after_id is not None:
+        statement = statement.where(Message.id < after_id)
+    return [
+        {
+            "message_id": message_id,
+            "conversation_id": conversation_id,
+            "seq": seq,
+            "sender_id": sender_id,
+            "timestamp": timestamp,
+            "snippet": content[:160],
+            "score": float(-message_id),
+        }
+        for message_id, conversation_id, seq, sender_id, timestamp, content in session.exec(statement).all()
+    ]
+
+
+def encode_cursor(score: float, message_id: int) -> str:
+    return base64.urlsafe_b64encode(f"{score!r}:{message_id}".encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[float, int]:
+    score, message_id = base64.urlsafe_b64decode(cursor.encode()).decode().split(":")
+    return float(score), int(message_id)
+
+
+def search_messages(
+    session: Session, user_id: int, query: str, *, limit: int, cursor: Optional[str] = None
+) -> Tuple[List[dict], Optional[str]]:
+    """Rank messages matching ``query`` in conversations ``user_id`` belongs to.
+
+    Returns one page of hits plus the cursor for the next page, if any.
+    """
+    dialect = session.get_bind().dialect.name
+    after_score, after_id = decode_cursor(cursor) if cursor else (float("-inf"), 0)
+    if dialect not in ("sqlite", "postgresql"):
+        rows = _like_search(session, user_id, query, after_id=after_id if cursor else None, limit=limit + 1)
+    else:
+        if dialect == "sqlite":
+            conversation_ids = session.exec(
+                select(ConversationParticipant.conversation_id).where(ConversationParticipant.user_id == user_id)
+            ).all()
+            statement, query = _SQLITE_QUERY, _sqlite_match(query, conversation_ids)
+        else:
+            statement = _POSTGRES_QUERY
+        if not query.strip():
+            return [], None
+        rows = session.execute(
+            text(statement),
+            {
+                "user_id": user_id,
+                "query": query,
+                "after_score": after_score,
+                "after_id": after_id,
+                "limit": limit + 1,
+            },
+        ).mappings().all()
+
+    hits = [dict(row) for row in rows[:limit]]
+    next_cursor = None
+    if len(rows) > limit:
+        last = hits[-1]
+        next_cursor = encode_cursor(last["score"], last["message_id"])
+    return hits, next_cursor
@@ -0,0 +1,94 @@
+import asyncio
+import time
+from typing import AsyncIterator, Dict, Optional, Tuple
+
+from fastapi import status
+
+from app.chat_manager import ClientConnection, OverflowPolicy
+from app.services.chat_codec import LEGACY_JSON, Frame
+
+# (conversation_id, seq) of a queued chat message, or None for other events
+Cursor = Optional[Tuple[int, int]]
+
+
+def encode_event_id(cursors: Dict[int, int]) -> str:
+    """``{12: 40, 15: 3}`` -> ``"12.40-15.3"``: the last seq seen per conversation."""
+    return "-".join(f"{conversation_id}.{seq}" for conversation_id, seq in sorted(cursors.items()))
+
+
+def decode_event_id(value: Optional[str]) -> Dict[int, int]:
+    """Inverse of ``encode_event_id``; malformed parts are ignored."""
+    cursors: Dict[int, int] = {}
+    for part in (value or "").split("-"):
+        conversation_id, _, seq = part.partition(".")
+        if conversation_id.isdigit() and seq.isdigit():
+            cursors[int(conversation_id)] = int(seq)
+    return cursors
+
+
+class SseConnection(ClientConnection):
+    """A Server-Sent Events stream registered with ``ConnectionManager`` like a socket.
+
+    It receives the same fan-out as websockets (sharing their legacy JSON
+    frames), but instead of a writer task the HTTP response pulls from the
+    queue via ``events()``. Chat messages carry an ``id`` encoding the last
+    seq seen per conversation, so a reconnect's ``Last-Event-ID`` resumes
+    exactly where the stream stopped.
+    """
+
+    def __init__(self, user_id: int, *, max_queue: int, overflow: OverflowPolicy, cursors: Dict[int, int]):
+        super().__init__(user_id, None, max_queue=max_queue, overflow=overflow, codec=LEGACY_JSON)
+        self.cursors = dict(cursors)
+
+    def start(self):
+        # The streaming response drives delivery; see events().
+        pass
+
+    def enqueue(self, message: dict) -> bool:
+        if message.get("event") == "ping":
+            # Heartbeats become SSE comments, which clients never see as events.
+            return self._put((None, None))
+        return super().enqueue(message)
+
+    def enqueue_frame(self, frame: Frame) -> bool:
+        return self._put((None, frame))
+
+    def deliver(self, message: dict, frame: Frame) -> bool:
+        cursor = None
+        if "event" not in message and message.get("seq") is not None:
+            cursor = (message["conversation_id"], message["seq"])
+        return self._put((cursor, frame))
+
+    async def close(self, code: int = status.WS_1000_NORMAL_CLOSURE):
+        if self.closed:
+            return
+        self.closed = True
+        # Wake events(); if the queue is full it stops after the next item anyway.
+        try:
+            self.queue.put_nowait(None)
+        except asyncio.QueueFull:
+            pass
+
+    def format(self, frame: Optional[Frame], cursor: Cursor = None) -> Optional[str]:
+        """Render one queued item as SSE text, or None for a message already replayed."""
+        if frame is None:
+            return ": ping\n\n"
+        event_id = ""
+        if cursor is not None:
+            conversation_id, seq = cursor
+            if seq <= self.cursors.get(conversation_id, 0):
+                return None
+            self.cursors[conversation_id] = seq
+            event_id = f"id: {encode_event_id(self.cursors)}\n"
+        return f"{event_id}data: {frame}\n\n"
+
+    async def events(self) -> AsyncIterator[str]:
+        while not self.closed:
+            item = await self.queue.get()
+            if item is None:
+                break
+            cursor, frame = item
+            chunk = self.format(frame, cursor)
+            if chunk is not None:
+                yield chunk
+                self.last_activity = time.monotonic()
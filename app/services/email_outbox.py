@@ -0,0 +1,330 @@
+import asyncio
+import logging
+import random
+import time
+import uuid
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+import aiosmtplib
+from sqlalchemy import update
+from sqlmodel import Session, select
+
+from app.config import settings
+from app.database import run_in_session
+from app.metrics import metrics
+from app.models.email_outbox import EmailOutbox, EmailStatus
+
+logger = logging.getLogger(__name__)
+
+# Errors that say nothing about the message itself: the server is down,
+# unreachable or overloaded. They count towards the circuit breaker.
+_CONNECTION_ERRORS = (
+    aiosmtplib.SMTPConnectError,
+    aiosmtplib.SMTPServerDisconnected,
+    aiosmtplib.SMTPTimeoutError,
+    aiosmtplib.SMTPAuthenticationError,
+    asyncio.TimeoutError,
+    OSError,
+)
+
+
+def enqueue_email(session: Session, recipient: str, subject: str, html_body: str, kind: str) -> EmailOutbox:
+    """Add an email to the outbox; it is sent once ``session`` commits."""
+    email = EmailOutbox(recipient=recipient, subject=subject, html_body=html_body, kind=kind)
+    session.add(email)
+    return email
+
+
+class CircuitBreaker:
+    """Stops SMTP attempts for ``reset_timeout`` seconds after ``threshold`` consecutive failures.
+
+    Once the timeout passes one trial batch is let through (half-open);
+    its first success closes the breaker again, a failure reopens it.
+    """
+
+    def __init__(self, threshold: int, reset_timeout: float):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+
+    @property
+    def is_open(self) -> bool:
+        return self.opened_at is not None and time.monotonic() - self.opened_at < self.reset_timeout
+
+    def allow(self) -> bool:
+        return not self.is_open
+
+    def record_success(self) -> None:
+        if self.opened_at is not None:
+            logger.info("SMTP circuit breaker closed")
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.failures >= self.threshold and not self.is_open:
+            self.opened_at = time.monotonic()
+            metrics.incr("email.breaker.opened")
+            logger.warning(f"SMTP circuit breaker open for {self.reset_timeout}s after {self.failures} failures")
+
+
+class SmtpPool:
+    """Keeps up to ``size`` authenticated SMTP connections open between batches.
+
+    Connections idle for longer than ``idle_timeout`` are closed before
+    reuse (servers drop them anyway); any error discards the connection.
+    """
+
+    def __init__(self, size: int, idle_timeout: float):
+        self.idle_timeout = idle_timeout
+        self._idle: "asyncio.Queue[Tuple[Optional[aiosmtplib.SMTP], float]]" = asyncio.Queue()
+        for _ in range(size):
+            self._idle.put_nowait((None, 0.0))
+
+    async def _connect(self) -> aiosmtplib.SMTP:
+        smtp = aiosmtplib.SMTP(
+            hostname=settings.MAIL_SERVER,
+            port=settings.MAIL_PORT,
+            use_tls=settings.MAIL_SSL_TLS,
+            start_tls=settings.MAIL_STARTTLS if not settings.MAIL_SSL_TLS else False,
+            validate_certs=settings.VALIDATE_CERTS,
+            timeout=settings.EMAIL_SMTP_TIMEOUT_SECONDS,
+        )
+        await smtp.connect()
+        if settings.USE_CREDENTIALS and settings.MAIL_USERNAME:
+            await smtp.login(settings.MAIL_USERNAME, settings.MAIL_PASSWORD)
+        metrics.incr("email.smtp.connects")
+        return smtp
+
+    @staticmethod
+    async def _close(smtp: Optional[aiosmtplib.SMTP]) -> None:
+        if smtp is None or not smtp.is_connected:
+            return
+        try:
+            await smtp.quit()
+        except Exception:
+            smtp.close()
+
+    @asynccontextmanager
+    async def connection(self) -> AsyncIterator[aiosmtplib.SMTP]:
+        smtp, last_used = await self._idle.get()
+        try:
+            if smtp is not None and (not smtp.is_connected or time.monotonic() - last_used > self.idle_timeout):
+                await self._close(smtp)
+                smtp = None
+            if smtp is None:
+                smtp = await self._connect()
+            yield smtp
+        except BaseException:
+            await self._close(smtp)
+            smtp = None
+            raise
+        finally:
+            self._idle.put_nowait((smtp, time.monotonic()))
+
+    async def close(self) -> None:
+        for _ in range(self._idle.qsize()):
+            smtp, _ = self._idle.get_nowait()
+            await self._close(smtp)
+            self._idle.put_nowait((None, 0.0))
+
+
+class EmailOutboxWorker:
+    """Sends outbox rows in batches over pooled SMTP connections.
+
+    Each round claims up to ``batch_size`` due rows (a claim token plus a
+    lease, so several workers never send the same row), sends them over
+    the pool's connections, and records the outcome in one transaction.
+    Failures are retried with exponential backoff and jitter until
+    ``max_attempts``. A run of connection failures opens the circuit
+    breaker, which pauses sending; emails it holds back keep their
+    attempt count.
+    """
+
+    def __init__(
+        self,
+        pool: SmtpPool,
+        breaker: CircuitBreaker,
+        *,
+        enabled: bool,
+        batch_size: int,
+        poll_interval: float,
+        max_attempts: int,
+        retry_base: float,
+        retry_max: float,
+        lease_seconds: float,
+    ):
+        self.pool = pool
+        self.breaker = breaker
+        self.enabled = enabled
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.lease_seconds = lease_seconds
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        metrics.gauge("email.breaker.open", lambda: int(self.breaker.is_open))
+
+    async def start(self):
+        if self.enabled and self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.pool.close()
+
+    def wake(self) -> None:
+        """Send newly committed emails now instead of at the next poll."""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                # Keep going while full batches come back
+                while await self.run_once() >= self.batch_size:
+                    pass
+            except Exception:
+                logger.exception("Email outbox round failed")
+
+    def _claim(self, session: Session) -> List[EmailOutbox]:
+        now = datetime.utcnow()
+        due = session.exec(
+            select(EmailOutbox.id)
+            .where(EmailOutbox.status == EmailStatus.PENDING, EmailOutbox.next_attempt_at <= now)
+            .order_by(EmailOutbox.next_attempt_at)
+            .limit(self.batch_size)
+        ).all()
+        if not due:
+            return []
+        token = uuid.uuid4().hex
+        session.execute(
+            update(EmailOutbox)
+            .where(
+                EmailOutbox.id.in_(due),
+                EmailOutbox.status == EmailStatus.PENDING,
+                EmailOutbox.next_attempt_at <= now,
+            )
+            .values(claim_token=token, next_attempt_at=now + timedelta(seconds=self.lease_seconds))
+        )
+        session.commit()
+        claimed = session.exec(select(EmailOutbox).where(EmailOutbox.claim_token == token)).all()
+        for email in claimed:
+            session.expunge(email)
+        return list(claimed)
+
+    def _backoff(self, attempts: int) -> timedelta:
+        delay = min(self.retry_max, self.retry_base * 2 ** (attempts - 1))
+        return timedelta(seconds=delay * random.uniform(0.5, 1.0))
+
+    def _record(self, session: Session, outcomes: Dict[int, Optional[str]], attempted: List[EmailOutbox]) -> None:
+        now = datetime.utcnow()
+        for email in attempted:
+            values = {"claim_token": None}
+            error = outcomes.get(email.id)
+            if email.id in outcomes and error is None:
+                values.update(status=EmailStatus.SENT, sent_at=now, attempts=email.attempts + 1, last_error=None)
+            elif email.id in outcomes:
+                attempts = email.attempts + 1
+                values.update(attempts=attempts, last_error=error[:500])
+                if attempts >= self.max_attempts:
+                    values.update(status=EmailStatus.FAILED)
+                    metrics.incr("email.failed")
+                    logger.error(f"Giving up on email {email.id} to {email.recipient}: {error}")
+                else:
+                    values.update(next_attempt_at=now + self._backoff(attempts))
+                    metrics.incr("email.retried")
+            else:
+                # Not attempted (breaker opened mid-batch): release without spending an attempt
+                values.update(next_attempt_at=now + timedelta(seconds=self.breaker.reset_timeout))
+            session.execute(update(EmailOutbox).where(EmailOutbox.id == email.id).values(**values))
+        session.commit()
+
+    async def _send(self, smtp: aiosmtplib.SMTP, email: EmailOutbox) -> None:
+        message = EmailMessage()
+        message["From"] = settings.MAIL_FROM
+        message["To"] = email.recipient
+        message["Subject"] = email.subject
+        message.set_content(email.html_body, subtype="html")
+        started_at = time.perf_counter()
+        await smtp.send_message(message)
+        metrics.observe("email.send_seconds", time.perf_counter() - started_at)
+
+    async def _drain(self, queue: "asyncio.Queue[EmailOutbox]", outcomes: Dict[int, Optional[str]]) -> None:
+        """Send queued emails over one pooled connection until the queue is empty or the breaker opens."""
+        while not queue.empty() and self.breaker.allow():
+            try:
+                async with self.pool.connection() as smtp:
+                    while not queue.empty() and self.breaker.allow():
+                        email = queue.get_nowait()
+                        try:
+                            await self._send(smtp, email)
+                        except _CONNECTION_ERRORS as e:
+                            outcomes[email.id] = str(e) or type(e).__name__
+                            raise
+                        except Exception as e:
+                            # Rejected recipient or content, or a message that cannot be
+                            # built (e.g. CR/LF in the address): the connection is still good
+                            outcomes[email.id] = str(e) or type(e).__name__
+                            continue
+                        outcomes[email.id] = None
+                        self.breaker.record_success()
+                        metrics.incr("email.sent")
+            except _CONNECTION_ERRORS as e:
+                self.breaker.record_failure()
+                logger.warning(f"SMTP connection failed: {e!r}")
+
+    async def run_once(self) -> int:
+        """Claim and send one batch; returns how many rows were claimed."""
+        if not self.breaker.allow():
+            return 0
+        batch = await run_in_session(self._claim)
+        if not batch:
+            return 0
+        queue: "asyncio.Queue[EmailOutbox]" = asyncio.Queue()
+        for email in batch:
+            queue.put_nowait(email)
+        outcomes: Dict[int, Optional[str]] = {}
+        try:
+            results = await asyncio.gather(
+                *(self._drain(queue, outcomes) for _ in range(settings.EMAIL_SMTP_POOL_SIZE)),
+                return_exceptions=True,
+            )
+        finally:
+            # Even on failure or cancellation, so emails that went out are not sent again after the lease
+            await run_in_session(self._record, outcomes, batch)
+        for result in results:
+            if isinstance(result, Exception):
+                logger.error("Email outbox send failed", exc_info=result)
+        return len(batch)
+
+
+email_outbox = EmailOutboxWorker(
+    SmtpPool(settings.EMAIL_SMTP_POOL_SIZE, idle_timeout=settings.EMAIL_SMTP_IDLE_SECONDS),
+    CircuitBreaker(settings.EMAIL_BREAKER_THRESHOLD, settings.EMAIL_BREAKER_RESET_SECONDS),
+    enabled=settings.EMAIL_OUTBOX_ENABLED,
+    batch_size=settings.EMAIL_OUTBOX_BATCH_SIZE,
+    poll_interval=settings.EMAIL_OUTBOX_POLL_SECONDS,
+    max_attempts=settings.EMAIL_MAX_ATTEMPTS,
+    retry_base=settings.EMAIL_RETRY_BASE_SECONDS,
+    retry_max=settings.EMAIL_RETRY_MAX_SECONDS,
+    lease_seconds=settings.EMAIL_OUTBOX_LEASE_SECONDS,
+)
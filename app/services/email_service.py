@@ -5,6 +5,8 @@ from fastapi_mail.errors import ConnectionErrors
 from pydantic import EmailStr
 from jinja2 import Environment, FileSystemLoader
 from typing import Dict, Any
+from sqlmodel import Session
+from app.services.email_outbox import enqueue_email
 
 logger = logging.getLogger(__name__)
 
@@ -29,18 +31,25 @@ class EmailService:
         template_dir = os.path.join(os.path.dirname(__file__), "..", "templates")
         self.jinja_env = Environment(loader=FileSystemLoader(template_dir))
     
+    def render_verification_email(self, email: str, token: str) -> str:
+        verification_url = f"https://connectedcare-app.com/verify-email?token={token}"
+        template = self.jinja_env.get_template("verification_email.html")
+        return template.render(verification_url=verification_url, email=email)
+    
+    def queue_verification_email(self, session: Session, email: str, token: str) -> None:
+        """Add the verification email to the outbox; it goes out after ``session`` commits"""
+        enqueue_email(
+            session,
+            recipient=email,
+            subject="Verify your ConnectedCare account",
+            html_body=self.render_verification_email(email, token),
+            kind="verification",
+        )
+    
     async def send_verification_email(self, email: str, token: str) -> bool:
         """Send email verification email"""
         try:
-            # Create verification URL
-            verification_url = f"https://connectedcare-app.com/verify-email?token={token}"
-            
-            # Render template
-            template = self.jinja_env.get_template("verification_email.html")
-            html_content = template.render(
-                verification_url=verification_url,
-                email=email
-            )
+            html_content = self.render_verification_email(email, token)
             
             message = MessageSchema(
                 subject="Verify your ConnectedCare account",
@@ -0,0 +1,150 @@
+import logging
+from datetime import datetime, timedelta
+from typing import Dict
+
+from sqlalchemy import delete, inspect, text, update
+from sqlalchemy.engine import Engine
+from sqlmodel import Session, select
+
+from app.config import settings
+from app.database import engine
+from app.metrics import metrics
+from app.models.email_outbox import EmailOutbox, EmailStatus
+from app.models.human_assist import HumanAssistRequest
+from app.models.revoked_token import RevokedToken
+from app.models.verification import EmailVerification, PasswordReset
+from app.services.periodic import PeriodicJob
+
+logger = logging.getLogger(__name__)
+
+RESOLVED_ASSIST_STATUSES = ("resolved",)
+
+
+def ensure_expiry_indexes(engine: Engine) -> None:
+    """Create the ``expires_at`` indexes and the ``attachments_stripped_at`` column on tables that predate them.
+
+    ``create_all`` only creates missing tables, not missing columns or
+    indexes on existing ones.
+    """
+    if "attachments_stripped_at" not in {c["name"] for c in inspect(engine).get_columns("humanassistrequest")}:
+        with engine.begin() as connection:
+            connection.execute(text("ALTER TABLE humanassistrequest ADD COLUMN attachments_stripped_at TIMESTAMP"))
+    for model in (EmailVerification, PasswordReset):
+        for index in model.__table__.indexes:
+            index.create(bind=engine, checkfirst=True)
+
+
+def _delete_in_batches(session: Session, key, order_by, condition, *, batch_size: int, max_batches: int) -> int:
+    """Delete rows matching ``condition`` ``batch_size`` at a time, one short transaction each.
+
+    Each batch is picked through the index on ``order_by``, so no
+    statement scans or locks more than one batch worth of rows.
+    """
+    table = key.table
+    deleted = 0
+    for _ in range(max_batches):
+        batch = select(key).where(condition).order_by(order_by).limit(batch_size).scalar_subquery()
+        result = session.execute(delete(table).where(key.in_(batch)).execution_options(synchronize_session=False))
+        session.commit()
+        deleted += result.rowcount
+        if result.rowcount < batch_size:
+            break
+    return deleted
+
+
+def _strip_assist_attachments(session: Session, cutoff: datetime, *, batch_size: int, max_batches: int) -> int:
+    """Drop the inline file data of resolved human-assist requests, keeping name/kind metadata.
+
+    Every request looked at is stamped with ``attachments_stripped_at``,
+    so later runs only see requests resolved since and always make progress.
+    """
+    stripped = 0
+    for _ in range(max_batches):
+        rows = session.exec(
+            select(HumanAssistRequest.id, HumanAssistRequest.attachments)
+            .where(
+                HumanAssistRequest.attachments_stripped_at.is_(None),
+                HumanAssistRequest.status.in_(RESOLVED_ASSIST_STATUSES),
+                HumanAssistRequest.updated_at < cutoff,
+            )
+            .order_by(HumanAssistRequest.id)
+            .limit(batch_size)
+        ).all()
+        now = datetime.utcnow()
+        for request_id, attachments in rows:
+            if any(attachment.get("base64") for attachment in attachments or ()):
+                session.execute(
+                    update(HumanAssistRequest)
+                    .where(HumanAssistRequest.id == request_id)
+                    .values(attachments=[{**attachment, "base64": None} for attachment in attachments])
+                )
+                stripped += 1
+        if rows:
+            session.execute(
+                update(HumanAssistRequest)
+                .where(HumanAssistRequest.id.in_([request_id for request_id, _ in rows]))
+                .values(attachments_stripped_at=now)
+            )
+        session.commit()
+        if len(rows) < batch_size:
+            break
+    return stripped
+
+
+def sweep_expired(
+    engine: Engine,
+    *,
+    batch_size: int,
+    max_batches: int,
+    outbox_retention: timedelta,
+    assist_attachment_retention: timedelta,
+) -> Dict[str, int]:
+    """Remove expired tokens and aged-out rows; returns rows affected per kind.
+
+    Each kind is capped at ``max_batches`` batches per run, so a backlog
+    drains over several runs instead of in one long delete.
+    """
+    now = datetime.utcnow()
+    counts: Dict[str, int] = {}
+    with Session(engine) as session:
+        # Used verification/reset tokens are never read again; they go once expired too.
+        counts["email_verifications"] = _delete_in_batches(
+            session, EmailVerification.id, EmailVerification.expires_at, EmailVerification.expires_at < now,
+            batch_size=batch_size, max_batches=max_batches,
+        )
+        counts["password_resets"] = _delete_in_batches(
+            session, PasswordReset.id, PasswordReset.expires_at, PasswordReset.expires_at < now,
+            batch_size=batch_size, max_batches=max_batches,
+        )
+        counts["revoked_tokens"] = _delete_in_batches(
+            session, RevokedToken.jti, RevokedToken.expires_at, RevokedToken.expires_at < now,
+            batch_size=batch_size, max_batches=max_batches,
+        )
+        counts["email_outbox"] = _delete_in_batches(
+            session, EmailOutbox.id, EmailOutbox.next_attempt_at,
+            EmailOutbox.status.in_((EmailStatus.SENT, EmailStatus.FAILED))
+            & (EmailOutbox.next_attempt_at < now - outbox_retention),
+            batch_size=batch_size, max_batches=max_batches,
+        )
+        counts["assist_attachments"] = _strip_assist_attachments(
+            session, now - assist_attachment_retention, batch_size=batch_size, max_batches=max_batches,
+        )
+
+    for kind, count in counts.items():
+        if count:
+            metrics.incr(f"sweep.{kind}", count)
+    if any(counts.values()):
+        logger.info(f"Expiry sweep: {counts}")
+    return counts
+
+
+expiry_sweep_job = PeriodicJob(
+    "expiry_sweep",
+    settings.EXPIRY_SWEEP_INTERVAL_SECONDS,
+    sweep_expired,
+    engine,
+    batch_size=settings.EXPIRY_SWEEP_BATCH_SIZE,
+    max_batches=settings.EXPIRY_SWEEP_MAX_BATCHES,
+    outbox_retention=timedelta(days=settings.EMAIL_OUTBOX_RETENTION_DAYS),
+    assist_attachment_retention=timedelta(days=settings.HUMAN_ASSIST_ATTACHMENT_RETENTION_DAYS),
+)
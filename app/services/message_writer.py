@@ -0,0 +1,317 @@
+import asyncio
+import json
+import logging
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Deque, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import case, func, select as sa_select, text, update
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session
+
+from app.config import settings
+from app.database import engine, run_db
+from app.metrics import metrics
+from app.models.chat import Conversation, ConversationParticipant, Message, MessageDeadLetter, MessageIdAllocator
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _ConversationUpdate:
+    last_seq: int
+    last_message_at: datetime
+    preview: Optional[str]
+
+
+class MessageWriteBehind:
+    """Acknowledge chat messages immediately and persist them in group commits.
+
+    IDs are reserved in blocks and seqs come from an in-memory counter per
+    conversation, so a message can be fanned out before its row exists.
+    Buffered rows and the matching ``Conversation.last_message_*`` updates
+    are written together every ``flush_interval_ms`` or ``max_batch`` messages.
+
+    Seqs are only gap-free while a single process writes to a conversation, so
+    enable this on single-writer deployments and on every node or none.
+
+    A batch that cannot be written stays buffered and is retried, including
+    when the writer is stopped mid-retry. Rows the database rejects outright
+    go to ``MessageDeadLetter``, since they were already delivered. At most
+    ``seq_cache_size`` conversations keep their seq counter in memory; idle
+    ones are reloaded from ``Conversation.last_seq`` when next used.
+    """
+
+    def __init__(
+        self, *, enabled: bool, flush_interval_ms: int, max_batch: int, id_block_size: int, seq_cache_size: int
+    ):
+        self.enabled = enabled
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_batch = max_batch
+        self.id_block_size = id_block_size
+        self.seq_cache_size = seq_cache_size
+        self._pending: List[Message] = []
+        self._conversation_updates: Dict[int, _ConversationUpdate] = {}
+        # Senders have read their own messages: (conversation_id, user_id) -> seq
+        self._read_updates: Dict[Tuple[int, int], int] = {}
+        # conversation_id -> last seq handed out, least recently used first
+        self._last_seq: "OrderedDict[int, int]" = OrderedDict()
+        self._ids: Deque[int] = deque()
+        self._alloc_lock = asyncio.Lock()
+        self._flush_lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        if self.enabled and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    def known_last_seq(self, conversation_id: int) -> Optional[int]:
+        """Latest seq handed out here, which may not be flushed yet."""
+        return self._last_seq.get(conversation_id)
+
+    async def submit(self, message: Message, preview: Optional[str]) -> Optional[Message]:
+        """Assign ``id``/``seq`` and buffer the row; ``None`` if the conversation is gone."""
+        conversation_id = message.conversation_id
+        while conversation_id not in self._last_seq or not self._ids:
+            async with self._alloc_lock:
+                if conversation_id not in self._last_seq:
+                    last_seq = await run_db(self._load_last_seq, conversation_id)
+                    if last_seq is None:
+                        return None
+                    self._last_seq.setdefault(conversation_id, last_seq)
+                if not self._ids:
+                    self._ids.extend(await run_db(self._reserve_ids, self.id_block_size))
+
+        # No awaits from here on, so concurrent senders cannot interleave.
+        self._last_seq[conversation_id] += 1
+        self._last_seq.move_to_end(conversation_id)
+        message.seq = self._last_seq[conversation_id]
+        message.id = self._ids.popleft()
+        self._pending.append(message)
+
+        current = self._conversation_updates.get(conversation_id)
+        self._conversation_updates[conversation_id] = _ConversationUpdate(
+            last_seq=message.seq,
+            last_message_at=message.timestamp,
+            preview=preview or (current.preview if current else None),
+        )
+        self._read_updates[(conversation_id, message.sender_id)] = message.seq
+        if len(self._pending) >= self.max_batch:
+            self._wakeup.set()
+        return message
+
+    async def flush(self):
+        async with self._flush_lock:
+            if not self._pending:
+                return
+            messages, self._pending = self._pending, []
+            updates, self._conversation_updates = self._conversation_updates, {}
+            reads, self._read_updates = self._read_updates, {}
+            written = row_by_row = False
+            try:
+                while not written:
+                    try:
+                        if row_by_row:
+                            conflicted = await run_db(self._write_rows, messages, updates, reads)
+                            # Someone else wrote to these conversations; reload their seqs
+                            for conversation_id in conflicted:
+                                self._last_seq.pop(conversation_id, None)
+                        else:
+                            await run_db(self._write_batch, messages, updates, reads)
+                        written = True
+                    except IntegrityError:
+                        if row_by_row:
+                            logger.exception(f"Row-by-row write of {len(messages)} chat messages failed; retrying")
+                            await asyncio.sleep(1)
+                        else:
+                            logger.exception(
+                                f"Group commit of {len(messages)} chat messages rejected; retrying row by row"
+                            )
+                            row_by_row = True
+                    except Exception:
+                        logger.exception(f"Group commit of {len(messages)} chat messages failed; retrying")
+                        await asyncio.sleep(1)
+            finally:
+                if not written:
+                    # Cancelled: hand the batch back so the final flush in stop() still writes it
+                    self._requeue(messages, updates, reads)
+            self._evict_idle_seqs()
+
+    def _requeue(
+        self,
+        messages: List[Message],
+        updates: Dict[int, _ConversationUpdate],
+        reads: Dict[Tuple[int, int], int],
+    ):
+        self._pending[:0] = messages
+        # Anything buffered since the swap is newer and wins
+        updates.update(self._conversation_updates)
+        self._conversation_updates = updates
+        for key, seq in self._read_updates.items():
+            reads[key] = max(seq, reads.get(key, 0))
+        self._read_updates = reads
+
+    def _evict_idle_seqs(self):
+        """Forget the least recently used seq counters beyond ``seq_cache_size``.
+
+        Conversations with buffered messages are kept: until they are written
+        ``Conversation.last_seq`` lags behind the counter.
+        """
+        excess = len(self._last_seq) - self.seq_cache_size
+        for conversation_id in list(self._last_seq):
+            if excess <= 0:
+                break
+            if conversation_id not in self._conversation_updates:
+                del self._last_seq[conversation_id]
+                excess -= 1
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    @staticmethod
+    def _load_last_seq(conversation_id: int) -> Optional[int]:
+        with Session(engine) as session:
+            return session.execute(
+                sa_select(Conversation.last_seq).where(Conversation.id == conversation_id)
+            ).scalar_one_or_none()
+
+    @staticmethod
+    def _reserve_ids(count: int) -> List[int]:
+        with Session(engine) as session:
+            if engine.dialect.name == "postgresql":
+                # Draw from the serial sequence so regular inserts stay compatible.
+                rows = session.execute(
+                    text("SELECT nextval(pg_get_serial_sequence('message', 'id')) FROM generate_series(1, :n)"),
+                    {"n": count},
+                ).scalars().all()
+                session.commit()
+                return list(rows)
+
+            reserve = (
+                update(MessageIdAllocator)
+                .where(MessageIdAllocator.name == "message")
+                .values(next_id=MessageIdAllocator.next_id + count)
+                .returning(MessageIdAllocator.next_id)
+            )
+            end = session.execute(reserve).scalar_one_or_none()
+            if end is None:
+                start = (session.execute(sa_select(func.max(Message.id))).scalar() or 0) + 1
+                session.add(MessageIdAllocator(name="message", next_id=start + count))
+                session.commit()
+                return list(range(start, start + count))
+            session.commit()
+            return list(range(end - count, end))
+
+    @staticmethod
+    def _apply_conversation_updates(
+        session: Session, updates: Dict[int, _ConversationUpdate], reads: Dict[Tuple[int, int], int]
+    ):
+        for conversation_id, pending in updates.items():
+            values = {
+                "last_seq": case(
+                    (Conversation.last_seq < pending.last_seq, pending.last_seq),
+                    else_=Conversation.last_seq,
+                ),
+                "last_message_at": pending.last_message_at,
+                "updated_at": datetime.utcnow(),
+            }
+            if pending.preview:
+                values["last_message_preview"] = pending.preview
+            session.execute(
+                update(Conversation)
+                .where(Conversation.id == conversation_id)
+                .values(**values)
+                .execution_options(synchronize_session=False)
+            )
+        for (conversation_id, user_id), seq in reads.items():
+            session.execute(
+                update(ConversationParticipant)
+                .where(
+                    ConversationParticipant.conversation_id == conversation_id,
+                    ConversationParticipant.user_id == user_id,
+                    ConversationParticipant.last_read_seq < seq,
+                )
+                .values(last_read_seq=seq)
+                .execution_options(synchronize_session=False)
+            )
+
+    @classmethod
+    def _write_batch(
+        cls,
+        messages: List[Message],
+        updates: Dict[int, _ConversationUpdate],
+        reads: Dict[Tuple[int, int], int],
+    ):
+        with Session(engine, expire_on_commit=False) as session:
+            session.add_all(messages)
+            cls._apply_conversation_updates(session, updates, reads)
+            session.commit()
+
+    @classmethod
+    def _write_rows(
+        cls,
+        messages: List[Message],
+        updates: Dict[int, _ConversationUpdate],
+        reads: Dict[Tuple[int, int], int],
+    ) -> Set[int]:
+        """Insert ``messages`` one by one; returns the conversations whose rows conflicted."""
+        conflicted: Set[int] = set()
+        with Session(engine, expire_on_commit=False) as session:
+            for message in messages:
+                row = message.model_dump(mode="json")
+                session.add(message)
+                try:
+                    session.commit()
+                    continue
+                except IntegrityError as e:
+                    session.rollback()
+                    error = str(e.orig)
+                stored = session.get(Message, row["id"])
+                if stored is not None and (stored.conversation_id, stored.seq, stored.sender_id, stored.content) == (
+                    row["conversation_id"], row["seq"], row["sender_id"], row["content"]
+                ):
+                    # Written by an earlier, interrupted flush of this batch
+                    continue
+                conflicted.add(message.conversation_id)
+                session.add(
+                    MessageDeadLetter(
+                        message_id=row["id"],
+                        conversation_id=row["conversation_id"],
+                        seq=row["seq"],
+                        payload=json.dumps(row),
+                        error=error[:500],
+                    )
+                )
+                session.commit()
+                metrics.incr("chat.write_behind.dead_letters")
+                logger.error(f"Chat message {row['id']} (seq {row['seq']}) rejected ({error}); moved to dead letters")
+            cls._apply_conversation_updates(session, updates, reads)
+            session.commit()
+        return conflicted
+
+
+message_writer = MessageWriteBehind(
+    enabled=settings.CHAT_WRITE_BEHIND,
+    flush_interval_ms=settings.CHAT_FLUSH_INTERVAL_MS,
+    max_batch=settings.CHAT_FLUSH_MAX_MESSAGES,
+    id_block_size=settings.CHAT_ID_BLOCK_SIZE,
+    seq_cache_size=settings.CHAT_SEQ_CACHE_SIZE,
+)
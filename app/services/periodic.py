@@ -0,0 +1,60 @@
+import asyncio
+import logging
+import time
+from typing import Any, Callable, Optional
+
+from app.database import run_db
+from app.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class PeriodicJob:
+    """Runs a blocking maintenance function on the DB executor every ``interval`` seconds.
+
+    An ``interval`` of 0 leaves the job disabled.
+
+    Every worker process runs its own copy, so ``fn`` must tolerate running
+    concurrently with itself on another node. Durations and failures are
+    recorded as ``job.<name>.*`` metrics.
+    """
+
+    def __init__(self, name: str, interval: float, fn: Callable[..., Any], *args: Any, **kwargs: Any):
+        self.name = name
+        self.interval = interval
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        if self.interval > 0 and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def run_once(self) -> Any:
+        started = time.monotonic()
+        try:
+            result = await run_db(self.fn, *self.args, **self.kwargs)
+        except Exception:
+            metrics.incr(f"job.{self.name}.failures")
+            raise
+        metrics.incr(f"job.{self.name}.runs")
+        metrics.observe(f"job.{self.name}.seconds", time.monotonic() - started)
+        return result
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.run_once()
+            except Exception:
+                logger.exception(f"Periodic job {self.name} failed")
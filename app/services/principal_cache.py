@@ -0,0 +1,156 @@
+import asyncio
+import logging
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from itertools import chain
+from typing import Optional, Set, Tuple
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session as OrmSession
+from sqlmodel import Session, select
+
+from app.config import settings
+from app.models.patient import Patient
+from app.models.pharmacy import Pharmacy
+from app.models.physician import Physician
+from app.models.user import User, UserRole, UserStatus
+from app.services.chat_broker import ChatBroker
+
+logger = logging.getLogger(__name__)
+
+PRINCIPAL_CHANNEL = "auth:principal"
+
+# User columns a cached principal depends on
+_PRINCIPAL_FIELDS = ("role", "status", "is_active")
+_LINKED_PROFILES = (Patient, Physician, Pharmacy)
+
+
+@dataclass(frozen=True)
+class Principal:
+    """What request handlers need to know about the authenticated user.
+
+    Built from one query and cached; it carries the linked profile IDs so
+    handlers do not have to load ``user.physician`` and friends.
+    """
+
+    id: int
+    role: UserRole
+    status: UserStatus
+    is_active: bool
+    patient_id: Optional[int] = None
+    physician_id: Optional[int] = None
+    pharmacy_id: Optional[int] = None
+
+
+class PrincipalCache:
+    """LRU of user ID -> ``Principal`` with a TTL.
+
+    Entries are also dropped as soon as a committed session changes a
+    user's role, status or ``is_active`` flag, or adds or removes a linked
+    patient/physician/pharmacy profile. Other processes hear about it over
+    the chat broker; the TTL bounds staleness for writes made outside the
+    ORM. Used from the event loop and DB executor threads alike.
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[int, Tuple[Principal, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._broker: Optional[ChatBroker] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def get(self, user_id: int) -> Optional[Principal]:
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            principal, expires_at = entry
+            if time.monotonic() >= expires_at:
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return principal
+
+    def set(self, principal: Principal) -> Principal:
+        with self._lock:
+            self._entries[principal.id] = (principal, time.monotonic() + self.ttl)
+            self._entries.move_to_end(principal.id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return principal
+
+    def invalidate(self, user_id: int) -> None:
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def load(self, session: Session, user_id: int) -> Optional[Principal]:
+        principal = self.get(user_id)
+        if principal is not None:
+            return principal
+        row = session.exec(
+            select(User.id, User.role, User.status, User.is_active, Patient.id, Physician.id, Pharmacy.id)
+            .outerjoin(Patient, Patient.user_id == User.id)
+            .outerjoin(Physician, Physician.user_id == User.id)
+            .outerjoin(Pharmacy, Pharmacy.user_id == User.id)
+            .where(User.id == user_id)
+        ).first()
+        if row is None:
+            # Unknown users are not cached; the ID may be taken later.
+            return None
+        return self.set(Principal(*row))
+
+    async def attach(self, broker: ChatBroker) -> None:
+        """Listen for principal changes made by other processes."""
+        self._broker = broker
+        self._loop = asyncio.get_running_loop()
+        await broker.subscribe(PRINCIPAL_CHANNEL, self._on_invalidation)
+
+    def invalidate_everywhere(self, user_id: int) -> None:
+        """Drop ``user_id`` here and on every other node; safe to call from any thread."""
+        self.invalidate(user_id)
+        if self._broker is None or self._loop is None or self._loop.is_closed():
+            return
+        self._loop.call_soon_threadsafe(lambda: asyncio.ensure_future(self._publish(user_id)))
+
+    async def _publish(self, user_id: int) -> None:
+        try:
+            await self._broker.publish(PRINCIPAL_CHANNEL, {"user_id": user_id})
+        except Exception as e:
+            logger.error(f"Could not publish principal invalidation for user {user_id}: {e}")
+
+    async def _on_invalidation(self, data: dict) -> None:
+        self.invalidate(int(data["user_id"]))
+
+
+principal_cache = PrincipalCache(
+    max_entries=settings.PRINCIPAL_CACHE_SIZE,
+    ttl=settings.PRINCIPAL_CACHE_TTL_SECONDS,
+)
+
+
+@event.listens_for(OrmSession, "after_flush")
+def _collect_principal_changes(session: OrmSession, flush_context) -> None:
+    # new/dirty/deleted and attribute history still describe the flush here
+    changed: Set[int] = session.info.setdefault("principal_changes", set())
+    for obj in chain(session.dirty, session.deleted):
+        if isinstance(obj, User) and obj.id is not None:
+            state = inspect(obj)
+            if obj in session.deleted or any(state.attrs[name].history.has_changes() for name in _PRINCIPAL_FIELDS):
+                changed.add(obj.id)
+    for obj in chain(session.new, session.deleted):
+        if isinstance(obj, _LINKED_PROFILES) and obj.user_id is not None:
+            changed.add(obj.user_id)
+
+
+@event.listens_for(OrmSession, "after_commit")
+def _publish_principal_changes(session: OrmSession) -> None:
+    for user_id in session.info.pop("principal_changes", ()):
+        principal_cache.invalidate_everywhere(user_id)
+
+
+@event.listens_for(OrmSession, "after_soft_rollback")
+def _discard_principal_changes(session: OrmSession, previous_transaction) -> None:
+    session.info.pop("principal_changes", None)
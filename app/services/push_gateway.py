@@ -0,0 +1,246 @@
+import asyncio
+import logging
+from abc import ABC, abstractmethod
+from collections import deque
+from dataclasses import asdict, dataclass, field
+from typing import Deque, Dict, Iterable, List, Optional, Tuple
+
+import httpx
+from sqlalchemy import delete
+from sqlmodel import Session, select
+
+from app.config import settings
+from app.database import run_in_session
+from app.metrics import metrics
+from app.models.chat import ConversationParticipant
+from app.models.push import PushDevice
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class PushMessage:
+    """One notification for one device, as handed to a transport."""
+
+    token: str
+    platform: str
+    user_id: int
+    title: str
+    body: str
+    # Providers replace an undelivered notification with the same key
+    collapse_key: str
+    data: dict = field(default_factory=dict)
+
+
+class PushTransport(ABC):
+    """Delivers notifications to a push provider, a batch at a time."""
+
+    @abstractmethod
+    async def send_batch(self, messages: List[PushMessage]) -> List[str]:
+        """Send ``messages`` and return the tokens the provider reports as unregistered."""
+
+    async def close(self) -> None:
+        pass
+
+
+class StubPushTransport(PushTransport):
+    """Logs batches instead of sending them; for development and tests.
+
+    Only the last ``keep`` batches are held for inspection.
+    """
+
+    def __init__(self, keep: int = 20):
+        self.batches: Deque[List[PushMessage]] = deque(maxlen=keep)
+
+    async def send_batch(self, messages: List[PushMessage]) -> List[str]:
+        self.batches.append(list(messages))
+        logger.debug(f"Stub push transport received {len(messages)} notifications")
+        return []
+
+
+class HttpPushTransport(PushTransport):
+    """POSTs ``{"messages": [...]}`` to a push relay.
+
+    The relay answers ``{"invalid_tokens": [...]}`` listing tokens to forget.
+    """
+
+    def __init__(self, url: str, api_key: str = "", timeout: float = 10):
+        headers = {"Authorization": f"Bearer {api_key}"} if api_key else {}
+        self.url = url
+        self._client = httpx.AsyncClient(headers=headers, timeout=timeout)
+
+    async def send_batch(self, messages: List[PushMessage]) -> List[str]:
+        response = await self._client.post(self.url, json={"messages": [asdict(message) for message in messages]})
+        response.raise_for_status()
+        return list(response.json().get("invalid_tokens", []))
+
+    async def close(self) -> None:
+        await self._client.aclose()
+
+
+def create_push_transport(kind: str) -> Optional[PushTransport]:
+    if kind == "http":
+        return HttpPushTransport(settings.PUSH_HTTP_URL, settings.PUSH_HTTP_API_KEY)
+    if kind == "stub":
+        return StubPushTransport()
+    return None
+
+
+@dataclass
+class _PendingNotification:
+    count: int
+    last_seq: int
+    preview: Optional[str]
+
+
+class PushGateway:
+    """Collapses chat messages for offline users into batched push notifications.
+
+    Messages queued for the same user and conversation within one
+    ``collapse_seconds`` window become a single notification ("3 new
+    messages"). At the end of each window, device tokens are loaded in one
+    query and notifications go to the transport ``batch_size`` at a time.
+    """
+
+    def __init__(
+        self,
+        transport: Optional[PushTransport],
+        *,
+        collapse_seconds: float,
+        batch_size: int,
+        max_pending: int,
+        include_preview: bool,
+    ):
+        self.transport = transport
+        self.collapse_seconds = collapse_seconds
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self.include_preview = include_preview
+        self._pending: Dict[Tuple[int, int], _PendingNotification] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.transport is not None
+
+    async def start(self):
+        if self.enabled and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+        if self.transport is not None:
+            await self.transport.close()
+
+    def notify(self, user_ids: Iterable[int], message: dict) -> None:
+        """Queue a push for each of ``user_ids`` about chat ``message`` (a serialized MessageRead)."""
+        if not self.enabled:
+            return
+        conversation_id = message["conversation_id"]
+        for user_id in user_ids:
+            if user_id == message.get("sender_id"):
+                continue
+            key = (user_id, conversation_id)
+            pending = self._pending.get(key)
+            if pending is None:
+                if len(self._pending) >= self.max_pending:
+                    metrics.incr("push.dropped")
+                    continue
+                pending = self._pending[key] = _PendingNotification(count=0, last_seq=0, preview=None)
+            pending.count += 1
+            pending.last_seq = max(pending.last_seq, message.get("seq") or 0)
+            content = message.get("content")
+            pending.preview = content[:140] if content else ("Image attachment" if message.get("attachment_url") else None)
+            metrics.incr("push.queued")
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.collapse_seconds)
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Push flush failed")
+
+    def _build(self, session: Session, pending: Dict[Tuple[int, int], _PendingNotification]) -> List[PushMessage]:
+        user_ids = {user_id for user_id, _ in pending}
+        conversation_ids = {conversation_id for _, conversation_id in pending}
+        # Skip anything the user already read elsewhere before the window closed.
+        read = {
+            (row.user_id, row.conversation_id): row.last_read_seq
+            for row in session.exec(
+                select(ConversationParticipant).where(
+                    ConversationParticipant.user_id.in_(user_ids),
+                    ConversationParticipant.conversation_id.in_(conversation_ids),
+                )
+            )
+        }
+        devices: Dict[int, List[PushDevice]] = {}
+        for device in session.exec(select(PushDevice).where(PushDevice.user_id.in_(user_ids))):
+            devices.setdefault(device.user_id, []).append(device)
+
+        messages: List[PushMessage] = []
+        for (user_id, conversation_id), notification in pending.items():
+            if read.get((user_id, conversation_id), 0) >= notification.last_seq:
+                continue
+            if notification.count == 1:
+                body = notification.preview if self.include_preview and notification.preview else "You have a new message"
+            else:
+                body = f"You have {notification.count} new messages"
+            for device in devices.get(user_id, ()):
+                messages.append(
+                    PushMessage(
+                        token=device.token,
+                        platform=device.platform,
+                        user_id=user_id,
+                        title="ConnectedCare",
+                        body=body,
+                        collapse_key=f"conversation:{conversation_id}",
+                        data={
+                            "conversation_id": conversation_id,
+                            "seq": notification.last_seq,
+                            "count": notification.count,
+                        },
+                    )
+                )
+        return messages
+
+    @staticmethod
+    def _forget_tokens(session: Session, tokens: List[str]) -> None:
+        session.execute(delete(PushDevice).where(PushDevice.token.in_(tokens)))
+        session.commit()
+
+    async def flush(self):
+        if not self._pending or self.transport is None:
+            return
+        pending, self._pending = self._pending, {}
+        messages = await run_in_session(self._build, pending)
+
+        invalid: List[str] = []
+        for start in range(0, len(messages), self.batch_size):
+            batch = messages[start:start + self.batch_size]
+            try:
+                invalid.extend(await self.transport.send_batch(batch))
+                metrics.incr("push.sent", len(batch))
+                metrics.incr("push.batches")
+            except Exception as e:
+                metrics.incr("push.failed", len(batch))
+                logger.error(f"Push batch of {len(batch)} failed: {e}")
+        if invalid:
+            await run_in_session(self._forget_tokens, invalid)
+            logger.info(f"Removed {len(invalid)} unregistered push tokens")
+
+
+push_gateway = PushGateway(
+    create_push_transport(settings.PUSH_TRANSPORT),
+    collapse_seconds=settings.PUSH_COLLAPSE_SECONDS,
+    batch_size=settings.PUSH_BATCH_SIZE,
+    max_pending=settings.PUSH_MAX_PENDING,
+    include_preview=settings.PUSH_INCLUDE_PREVIEW,
+)
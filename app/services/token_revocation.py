@@ -0,0 +1,145 @@
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import List, Optional
+
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, select
+
+from app.config import settings
+from app.database import engine, run_in_session
+from app.metrics import metrics
+from app.models.revoked_token import RevokedToken
+from app.services.chat_broker import ChatBroker
+from app.services.periodic import PeriodicJob
+from app.utils.bloom import BloomFilter
+
+logger = logging.getLogger(__name__)
+
+REVOCATION_CHANNEL = "auth:revoked"
+
+
+class TokenRevocationList:
+    """Revoked access tokens, checked without a query in the common case.
+
+    Every node keeps a Bloom filter of unexpired revoked ``jti`` values.
+    A token whose ``jti`` is not in the filter is certainly not revoked;
+    a filter hit is confirmed against ``RevokedToken`` and the answer
+    remembered. New revocations reach other nodes over the chat broker.
+    The filter is rebuilt from the table periodically, which drops
+    expired entries and resets the false-positive rate.
+    """
+
+    def __init__(self, capacity: int, error_rate: float, max_checked: int = 10000):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.max_checked = max_checked
+        self._filter = BloomFilter(capacity, error_rate)
+        # jti -> revoked?, for filter hits already confirmed against the table
+        self._checked: "OrderedDict[str, bool]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._rebuild_adds: Optional[List[str]] = None
+        self._broker: Optional[ChatBroker] = None
+        metrics.gauge("auth.revocation.filter_items", lambda: self._filter.count)
+
+    def add(self, jti: str) -> None:
+        with self._lock:
+            self._filter.add(jti)
+            self._checked.pop(jti, None)
+            if self._rebuild_adds is not None:
+                self._rebuild_adds.append(jti)
+
+    def might_be_revoked(self, jti: str) -> bool:
+        return jti in self._filter
+
+    def _remember(self, jti: str, revoked: bool) -> None:
+        with self._lock:
+            self._checked[jti] = revoked
+            self._checked.move_to_end(jti)
+            while len(self._checked) > self.max_checked:
+                self._checked.popitem(last=False)
+
+    def confirm(self, session: Session, jti: str) -> bool:
+        """Look a filter hit up in the table."""
+        revoked = session.get(RevokedToken, jti) is not None
+        if not revoked:
+            metrics.incr("auth.revocation.false_positives")
+        self._remember(jti, revoked)
+        return revoked
+
+    async def is_revoked(self, jti: str) -> bool:
+        if not self.might_be_revoked(jti):
+            return False
+        with self._lock:
+            known = self._checked.get(jti)
+        if known is not None:
+            return known
+        return await run_in_session(self.confirm, jti)
+
+    def rebuild(self, session: Session) -> int:
+        """Replace the filter with one holding exactly the unexpired revocations."""
+        with self._lock:
+            self._rebuild_adds = []
+        try:
+            jtis = session.exec(select(RevokedToken.jti).where(RevokedToken.expires_at > datetime.utcnow())).all()
+            fresh = BloomFilter(max(self.capacity, 2 * len(jtis)), self.error_rate)
+            for jti in jtis:
+                fresh.add(jti)
+        finally:
+            with self._lock:
+                # Revocations that arrived while the table was being read
+                for jti in self._rebuild_adds or ():
+                    fresh.add(jti)
+                self._filter = fresh
+                self._checked.clear()
+                self._rebuild_adds = None
+        return len(jtis)
+
+    @staticmethod
+    def _store(session: Session, jti: str, user_id: Optional[int], expires_at: datetime) -> None:
+        session.add(RevokedToken(jti=jti, user_id=user_id, expires_at=expires_at))
+        try:
+            session.commit()
+        except IntegrityError:
+            # Already revoked
+            session.rollback()
+
+    async def revoke(self, jti: str, user_id: Optional[int], expires_at: datetime) -> None:
+        await run_in_session(self._store, jti, user_id, expires_at)
+        self.add(jti)
+        metrics.incr("auth.revocation.revoked")
+        if self._broker is not None:
+            try:
+                await self._broker.publish(REVOCATION_CHANNEL, {"jti": jti})
+            except Exception as e:
+                # Other nodes still pick it up at their next rebuild
+                logger.error(f"Could not publish revocation of {jti}: {e}")
+
+    async def attach(self, broker: ChatBroker) -> None:
+        """Load the filter and listen for revocations made by other processes."""
+        self._broker = broker
+        await broker.subscribe(REVOCATION_CHANNEL, self._on_revoked)
+        count = await run_in_session(self.rebuild)
+        logger.info(f"Loaded {count} revoked tokens")
+
+    async def _on_revoked(self, data: dict) -> None:
+        self.add(str(data["jti"]))
+
+
+revoked_tokens = TokenRevocationList(
+    capacity=settings.TOKEN_REVOCATION_FILTER_CAPACITY,
+    error_rate=settings.TOKEN_REVOCATION_FILTER_ERROR_RATE,
+)
+
+
+def _rebuild_revocation_filter() -> int:
+    with Session(engine) as session:
+        return revoked_tokens.rebuild(session)
+
+
+revocation_filter_job = PeriodicJob(
+    "revocation_filter_rebuild",
+    settings.TOKEN_REVOCATION_REBUILD_SECONDS,
+    _rebuild_revocation_filter,
+)
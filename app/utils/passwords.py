@@ -0,0 +1,124 @@
+import asyncio
+import logging
+import multiprocessing
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Optional, Tuple
+
+from passlib.context import CryptContext
+
+from app.config import settings
+from app.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Hashes made with a different bcrypt cost are upgraded (or downgraded) on
+# the next successful login, so BCRYPT_ROUNDS can change without a migration.
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__min_rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__max_rounds=settings.BCRYPT_ROUNDS,
+)
+
+
+def _hash(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def _verify_and_update(password: str, hashed: str) -> Tuple[bool, Optional[str]]:
+    return pwd_context.verify_and_update(password, hashed)
+
+
+def _warm_up() -> None:
+    pwd_context.hash("")
+
+
+class PasswordHasherBusy(Exception):
+    """More hashing requests are waiting than ``max_queue`` allows."""
+
+
+class PasswordHasher:
+    """Runs bcrypt off the event loop in a dedicated process pool.
+
+    At most ``max_concurrency`` hashes are in flight and at most
+    ``max_queue`` callers wait for a slot; beyond that callers get
+    ``PasswordHasherBusy`` straight away instead of piling up. A burst of
+    registrations or logins therefore costs bounded CPU and never blocks
+    the event loop or the DB executor threads.
+    """
+
+    def __init__(self, *, workers: int, max_concurrency: int, max_queue: int):
+        self.workers = workers
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.waiting = 0
+        self._executor: Optional[Executor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        metrics.gauge("auth.hash.waiting", lambda: self.waiting)
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            # spawn: forking a process that runs an event loop and threads is unsafe
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._executor
+
+    async def _run(self, kind: str, fn, *args):
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_concurrency)
+        if self._slots.locked() and self.waiting >= self.max_queue:
+            metrics.incr("auth.hash.rejected")
+            raise PasswordHasherBusy()
+        queued_at = time.perf_counter()
+        self.waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+        try:
+            started_at = time.perf_counter()
+            metrics.observe("auth.hash.queue_seconds", started_at - queued_at)
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(self._get_executor(), fn, *args)
+            metrics.observe(f"auth.hash.{kind}_seconds", time.perf_counter() - started_at)
+            return result
+        finally:
+            self._slots.release()
+
+    async def start(self) -> None:
+        """Spawn the worker processes now rather than on the first login.
+
+        If they cannot start (spawn re-imports ``__main__``, which fails for
+        unguarded scripts), hashing falls back to threads; bcrypt releases
+        the GIL, so that still keeps the event loop free.
+        """
+        loop = asyncio.get_running_loop()
+        executor = self._get_executor()
+        try:
+            await asyncio.gather(*(loop.run_in_executor(executor, _warm_up) for _ in range(self.workers)))
+        except Exception as e:
+            logger.warning(f"Password hashing processes failed to start ({e!r}); using threads instead")
+            executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+
+    async def hash(self, password: str) -> str:
+        return await self._run("hash", _hash, password)
+
+    async def verify_and_update(self, password: str, hashed: str) -> Tuple[bool, Optional[str]]:
+        """Check ``password``; the second item is a replacement hash when the stored one is outdated."""
+        return await self._run("verify", _verify_and_update, password, hashed)
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+
+password_hasher = PasswordHasher(
+    workers=settings.PASSWORD_HASH_WORKERS,
+    max_concurrency=settings.PASSWORD_HASH_MAX_CONCURRENCY,
+    max_queue=settings.PASSWORD_HASH_MAX_QUEUE,
+)
@@ -0,0 +1,199 @@
+import logging
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from app.config import settings
+from app.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """Classic token bucket: ``rate`` tokens per second, holding at most ``capacity``."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self, tokens: float = 1, now: Optional[float] = None) -> bool:
+        """Spend ``tokens`` if they are available; returns False (spending nothing) otherwise."""
+        self._refill(time.monotonic() if now is None else now)
+        if self.tokens < tokens:
+            return False
+        self.tokens -= tokens
+        return True
+
+    def retry_after(self, tokens: float = 1) -> float:
+        """Seconds until ``tokens`` will be available."""
+        missing = tokens - self.tokens
+        return max(0.0, missing / self.rate) if self.rate else float("inf")
+
+
+_PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+
+
+def parse_rate(spec: str) -> Tuple[float, float]:
+    """``"10/minute"`` -> ``(rate per second, capacity)``: a burst of 10, refilling over a minute."""
+    count, _, period = spec.partition("/")
+    capacity = float(count)
+    return capacity / _PERIODS[period.strip() or "second"], capacity
+
+
+class RateLimitBackend(ABC):
+    """Shared token-bucket state, keyed by strings such as ``"login:ip:10.0.0.1"``."""
+
+    @abstractmethod
+    async def hit(self, key: str, rate: float, capacity: float, tokens: float = 1) -> Optional[float]:
+        """Spend ``tokens`` from ``key``'s bucket; returns None if allowed, else seconds to wait."""
+
+    async def close(self) -> None:
+        pass
+
+
+class InMemoryRateLimitBackend(RateLimitBackend):
+    """Buckets in this process only; each worker enforces its own share of the limit."""
+
+    def __init__(self, max_keys: int = 100000):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+
+    async def hit(self, key: str, rate: float, capacity: float, tokens: float = 1) -> Optional[float]:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(rate, capacity)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+        if bucket.take(tokens):
+            return None
+        return bucket.retry_after(tokens)
+
+
+# Token bucket kept in a Redis hash and updated atomically. Times come from
+# the Redis clock so workers with skewed clocks agree. Fractions are
+# returned as strings because Redis truncates Lua numbers to integers.
+_REDIS_TOKEN_BUCKET = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(state[1]) or capacity
+local updated = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+local allowed = tokens >= cost
+if allowed then
+    tokens = tokens - cost
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 1000) + 1000)
+if allowed then
+    return ''
+end
+return tostring((cost - tokens) / rate)
+"""
+
+
+class RedisRateLimitBackend(RateLimitBackend):
+    """Buckets shared by every worker through Redis."""
+
+    def __init__(self, url: str, prefix: str = "ratelimit:"):
+        self.url = url
+        self.prefix = prefix
+        self._redis = None
+        self._script = None
+
+    async def hit(self, key: str, rate: float, capacity: float, tokens: float = 1) -> Optional[float]:
+        if self._redis is None:
+            from redis import asyncio as aioredis
+
+            self._redis = aioredis.from_url(self.url)
+            self._script = self._redis.register_script(_REDIS_TOKEN_BUCKET)
+        result = await self._script(keys=[self.prefix + key], args=[rate, capacity, tokens])
+        if isinstance(result, bytes):
+            result = result.decode()
+        return float(result) if result else None
+
+    async def close(self) -> None:
+        if self._redis is not None:
+            await self._redis.aclose()
+            self._redis = None
+
+
+def create_rate_limit_backend(url: str) -> RateLimitBackend:
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisRateLimitBackend(url)
+    return InMemoryRateLimitBackend()
+
+
+def client_ip(peer: Optional[str], forwarded_for: Optional[str], trusted_hops: int) -> str:
+    """The client address as seen by the outermost of ``trusted_hops`` proxies.
+
+    Each proxy appends the address it received the request from to
+    X-Forwarded-For, so the entry ``trusted_hops`` from the right was
+    written by our own edge proxy; anything left of it is client-supplied
+    and may be forged. Without the header (or with ``trusted_hops`` 0)
+    the socket peer is used.
+    """
+    if trusted_hops > 0 and forwarded_for:
+        hops = [hop.strip() for hop in forwarded_for.split(",") if hop.strip()]
+        if hops:
+            return hops[-min(trusted_hops, len(hops))]
+    return peer or "unknown"
+
+
+class RateLimiter:
+    """Named limits checked per client IP and per account.
+
+    ``limits`` maps an action to its per-IP and per-account rate specs
+    (see ``parse_rate``); an empty spec disables that check. If the
+    backend fails, requests are let through rather than locking everyone
+    out.
+    """
+
+    def __init__(self, backend: RateLimitBackend, limits: Dict[str, Tuple[str, str]]):
+        self.backend = backend
+        self.limits = {
+            action: tuple(parse_rate(spec) if spec else None for spec in specs)
+            for action, specs in limits.items()
+        }
+
+    async def check(self, action: str, ip: str, account: Optional[str] = None) -> Optional[float]:
+        """Returns None if ``action`` may proceed, otherwise the seconds until it may."""
+        per_ip, per_account = self.limits[action]
+        checks = []
+        if per_ip is not None:
+            checks.append((f"{action}:ip:{ip}", per_ip))
+        if per_account is not None and account:
+            checks.append((f"{action}:account:{account.strip().lower()}", per_account))
+        for key, (rate, capacity) in checks:
+            try:
+                retry_after = await self.backend.hit(key, rate, capacity)
+            except Exception as e:
+                metrics.incr("ratelimit.errors")
+                logger.error(f"Rate limit backend failed for {key}: {e}")
+                return None
+            if retry_after is not None:
+                metrics.incr(f"ratelimit.{action}.rejected")
+                return retry_after
+        return None
+
+
+auth_rate_limiter = RateLimiter(
+    create_rate_limit_backend(settings.AUTH_RATE_LIMIT_URL),
+    {
+        "login": (settings.AUTH_LOGIN_RATE_PER_IP, settings.AUTH_LOGIN_RATE_PER_ACCOUNT),
+        "register": (settings.AUTH_REGISTER_RATE_PER_IP, settings.AUTH_REGISTER_RATE_PER_ACCOUNT),
+        "resend_verification": (settings.AUTH_RESEND_RATE_PER_IP, settings.AUTH_RESEND_RATE_PER_ACCOUNT),
+    },
+)
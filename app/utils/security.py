@@ -1,15 +1,14 @@
-from passlib.context import CryptContext
 from datetime import datetime, timedelta
+import uuid
 import jwt
 from typing import Optional
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlmodel import Session, select
 from app.config import settings
-from app.database import get_session
-from app.models.user import User
-
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+from app.database import run_in_session
+from app.services.principal_cache import Principal, principal_cache
+from app.services.token_revocation import revoked_tokens
+from app.utils.passwords import pwd_context
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
 
@@ -22,7 +21,8 @@ def verify_password(password: str, hashed: str) -> bool:
 def create_access_token(data: dict):
     to_encode = data.copy()
     expire = datetime.utcnow() + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode.update({"exp": expire})
+    # jti identifies the token for revocation (logout)
+    to_encode.update({"exp": expire, "iat": datetime.utcnow(), "jti": uuid.uuid4().hex})
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
     return encoded_jwt
 
@@ -32,49 +32,41 @@ def verify_token(token: str) -> Optional[dict]:
         return payload
     except jwt.PyJWTError:
         return None
-def get_user_from_token(token: str, db: Session) -> Optional[User]:
-    """
-    Used ONLY for WebSocket authentication.
-    (WebSockets cannot use Depends or async dependencies.)
+
+async def principal_from_token(token: str) -> Optional[Principal]:
+    """Resolve a bearer token to a cached ``Principal``.
+
+    Every token path goes through here, so revoked tokens are always
+    rejected. Neither the revocation check nor a principal cache hit needs
+    a query.
     """
     payload = verify_token(token)
     if payload is None:
         return None
-
     user_id = payload.get("sub")
     if user_id is None:
         return None
+    jti = payload.get("jti")
+    if jti and await revoked_tokens.is_revoked(jti):
+        return None
+    principal = principal_cache.get(int(user_id))
+    if principal is None:
+        principal = await run_in_session(principal_cache.load, int(user_id))
+    return principal
 
-    user = db.exec(select(User).where(User.id == int(user_id))).first()
-    return user
-
-async def get_current_user(
-    token: str = Depends(oauth2_scheme),
-    session: Session = Depends(get_session)
-) -> User:
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
-    
-    payload = verify_token(token)
-    if payload is None:
-        raise credentials_exception
-    
-    user_id: str = payload.get("sub")
-    if user_id is None:
-        raise credentials_exception
-    
-    user = session.exec(select(User).where(User.id == int(user_id))).first()
-    if user is None:
-        raise credentials_exception
-    
-    return user
+async def get_current_principal(token: str = Depends(oauth2_scheme)) -> Principal:
+    principal = await principal_from_token(token)
+    if principal is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return principal
 
 async def get_current_active_user(
-    current_user: User = Depends(get_current_user)
-) -> User:
+    current_user: Principal = Depends(get_current_principal)
+) -> Principal:
     if not current_user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
-    return current_user
\ No newline at end of file
+    return current_user
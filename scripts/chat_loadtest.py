@@ -0,0 +1,418 @@
+"""Load-test the chat websocket.
+
+Starts the ASGI app under uvicorn (or targets one already running), seeds
+users and conversations straight into the database, opens one authenticated
+``/ws`` socket per user and drives a send pattern. Reports end-to-end
+delivery latency percentiles, throughput, dropped messages and the server
+process's RSS/CPU.
+
+Examples:
+    python scripts/chat_loadtest.py --clients 2000 --pattern direct --duration 60
+    python scripts/chat_loadtest.py --database-url postgresql://localhost/loadtest \\
+        --clients 5000 --pattern group --group-size 8 --rate 0.2
+    python scripts/chat_loadtest.py --url ws://staging:8000 --pattern burst --burst-size 50
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+# Add the app's root directory to the Python path
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(ROOT)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default="sqlite:///./loadtest.db")
+    parser.add_argument("--reset", action="store_true", help="Delete the SQLite database file first")
+    parser.add_argument("--url", help="ws:// base URL of a running server; omit to start one locally")
+    parser.add_argument("--port", type=int, default=0, help="Port for the local server (default: random)")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers for the local server")
+    parser.add_argument("--server-env", action="append", default=[], metavar="KEY=VALUE",
+                        help="Extra settings for the local server, e.g. CHAT_WRITE_BEHIND=true")
+    parser.add_argument("--clients", type=int, default=200, help="Concurrent sockets (one user each)")
+    parser.add_argument("--pattern", choices=["direct", "group", "burst"], default="direct")
+    parser.add_argument("--group-size", type=int, default=5)
+    parser.add_argument("--senders", type=float, default=1.0, help="Fraction of clients that send")
+    parser.add_argument("--rate", type=float, default=1.0, help="Messages per second per sender")
+    parser.add_argument("--burst-size", type=int, default=20)
+    parser.add_argument("--burst-interval", type=float, default=5.0)
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds of sending")
+    parser.add_argument("--drain", type=float, default=5.0, help="Seconds to wait for stragglers")
+    parser.add_argument("--connect-concurrency", type=int, default=100)
+    parser.add_argument("--subprotocol", choices=["legacy", "json", "msgpack"], default="legacy")
+    return parser.parse_args()
+
+
+# --- Seeding -----------------------------------------------------------------
+
+def seed(args: argparse.Namespace) -> Dict[int, List[int]]:
+    """Create users and conversations; returns conversation id -> member user ids."""
+    from sqlmodel import Session, select
+
+    from app.database import engine, init_db
+    from app.models import Conversation, ConversationParticipant, ConversationParticipantRole, User, UserRole, UserStatus
+
+    init_db()
+    size = 2 if args.pattern == "direct" else args.group_size
+    with Session(engine) as session:
+        existing = {
+            user.email: user.id
+            for user in session.exec(select(User).where(User.email.like("loadtest-%@example.com"))).all()
+        }
+        user_ids = []
+        for index in range(args.clients):
+            email = f"loadtest-{index}@example.com"
+            if email not in existing:
+                user = User(
+                    email=email,
+                    hashed_password="!",
+                    full_name=f"Load Test {index}",
+                    role=UserRole.PATIENT,
+                    status=UserStatus.ACTIVE,
+                    is_email_verified=True,
+                )
+                session.add(user)
+                session.flush()
+                existing[email] = user.id
+            user_ids.append(existing[email])
+
+        conversations: Dict[int, List[int]] = {}
+        for start in range(0, len(user_ids) - size + 1, size):
+            members = user_ids[start:start + size]
+            conversation = Conversation(title=f"loadtest {args.pattern} {start // size}")
+            session.add(conversation)
+            session.flush()
+            for user_id in members:
+                session.add(ConversationParticipant(
+                    conversation_id=conversation.id,
+                    user_id=user_id,
+                    role=ConversationParticipantRole.PATIENT,
+                ))
+            conversations[conversation.id] = members
+        session.commit()
+    return conversations
+
+
+# --- Server process ----------------------------------------------------------
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(args: argparse.Namespace, port: int) -> subprocess.Popen:
+    env = dict(os.environ, DATABASE_URL=args.database_url, DATABASE_ECHO="false")
+    for item in args.server_env:
+        key, _, value = item.partition("=")
+        env[key] = value
+    command = [
+        sys.executable, "-m", "uvicorn", "app.main:app",
+        "--host", "127.0.0.1", "--port", str(port),
+        "--workers", str(args.workers),
+        "--ws", "websockets", "--log-level", "warning",
+    ]
+    process = subprocess.Popen(command, cwd=ROOT, env=env)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return process
+        except OSError:
+            if process.poll() is not None:
+                raise SystemExit("Server exited during startup")
+            time.sleep(0.2)
+    process.terminate()
+    raise SystemExit("Server did not start listening within 30s")
+
+
+class ProcessSampler:
+    """Samples RSS and CPU time of a process (and its children) from /proc or psutil."""
+
+    def __init__(self, pid: int):
+        self.pid = pid
+        self.peak_rss = 0
+        self.last_rss = 0
+        self._start_cpu: Optional[float] = None
+        self._start_wall: Optional[float] = None
+        self.cpu_percent = 0.0
+
+    def _pids(self) -> List[int]:
+        pids = [self.pid]
+        try:
+            with open(f"/proc/{self.pid}/task/{self.pid}/children") as handle:
+                pids += [int(child) for child in handle.read().split()]
+        except OSError:
+            pass
+        return pids
+
+    def _read(self):
+        try:
+            import psutil
+        except ImportError:
+            psutil = None
+        rss = 0
+        cpu = 0.0
+        for pid in self._pids():
+            try:
+                if psutil is not None:
+                    process = psutil.Process(pid)
+                    rss += process.memory_info().rss
+                    times = process.cpu_times()
+                    cpu += times.user + times.system
+                    continue
+                with open(f"/proc/{pid}/statm") as handle:
+                    rss += int(handle.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+                with open(f"/proc/{pid}/stat") as handle:
+                    fields = handle.read().rsplit(")", 1)[1].split()
+                    cpu += (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+            except (OSError, ValueError):
+                continue
+        return rss, cpu
+
+    def sample(self):
+        rss, cpu = self._read()
+        now = time.monotonic()
+        self.last_rss = rss
+        self.peak_rss = max(self.peak_rss, rss)
+        if self._start_cpu is None:
+            self._start_cpu, self._start_wall = cpu, now
+        elif now > self._start_wall:
+            self.cpu_percent = 100 * (cpu - self._start_cpu) / (now - self._start_wall)
+
+
+# --- Clients -----------------------------------------------------------------
+
+SUBPROTOCOLS = {"legacy": None, "json": "connectedcare.json.v1", "msgpack": "connectedcare.msgpack.v1"}
+
+
+@dataclass
+class Stats:
+    sent: int = 0
+    expected: int = 0
+    received: int = 0
+    errors: int = 0
+    connect_failures: int = 0
+    latencies: List[float] = field(default_factory=list)
+    pending: Dict[str, int] = field(default_factory=dict)
+    connect_errors: Dict[str, int] = field(default_factory=dict)
+
+
+class Client:
+    def __init__(self, user_id: int, token: str, conversation_id: int, members: int, stats: Stats, codec: str):
+        self.user_id = user_id
+        self.token = token
+        self.conversation_id = conversation_id
+        self.members = members
+        self.stats = stats
+        self.codec = codec
+        self.socket = None
+        self._counter = 0
+
+    async def connect(self, base_url: str):
+        import websockets
+
+        subprotocol = SUBPROTOCOLS[self.codec]
+        self.socket = await websockets.connect(
+            f"{base_url}/ws?token={self.token}",
+            subprotocols=[subprotocol] if subprotocol else None,
+            max_size=None,
+            open_timeout=30,
+        )
+
+    def _encode(self, payload: dict):
+        if self.codec == "msgpack":
+            import msgpack
+            return msgpack.packb(payload, use_bin_type=True)
+        return json.dumps(payload)
+
+    def _decode(self, frame):
+        if isinstance(frame, bytes):
+            import msgpack
+            return msgpack.unpackb(frame, raw=False)
+        return json.loads(frame)
+
+    async def send(self):
+        self._counter += 1
+        key = f"{self.user_id}:{self._counter}"
+        content = f"lt {key} {time.perf_counter()}"
+        self.stats.pending[key] = self.members
+        self.stats.expected += self.members
+        self.stats.sent += 1
+        await self.socket.send(self._encode({"conversation_id": self.conversation_id, "content": content}))
+
+    async def receive_forever(self):
+        try:
+            async for frame in self.socket:
+                data = self._decode(frame)
+                if data.get("event") == "ping":
+                    await self.socket.send(self._encode({"event": "pong"}))
+                    continue
+                if "error" in data:
+                    self.stats.errors += 1
+                    continue
+                content = data.get("content") or ""
+                if not content.startswith("lt "):
+                    continue
+                _, key, sent_at = content.split(" ")
+                self.stats.latencies.append(time.perf_counter() - float(sent_at))
+                self.stats.received += 1
+                remaining = self.stats.pending.get(key, 0) - 1
+                if remaining <= 0:
+                    self.stats.pending.pop(key, None)
+                else:
+                    self.stats.pending[key] = remaining
+        except Exception:
+            pass
+
+
+async def drive(client: Client, args: argparse.Namespace, stop_at: float):
+    # Desynchronise senders so load is spread rather than lock-stepped.
+    await asyncio.sleep(random.random() * (1 / args.rate if args.pattern != "burst" else args.burst_interval))
+    while time.monotonic() < stop_at:
+        if args.pattern == "burst":
+            for _ in range(args.burst_size):
+                await client.send()
+            await asyncio.sleep(args.burst_interval)
+        else:
+            await client.send()
+            await asyncio.sleep(1 / args.rate)
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def run(args: argparse.Namespace, base_url: str, conversations: Dict[int, List[int]], sampler: Optional[ProcessSampler]):
+    from app.utils.security import create_access_token
+
+    stats = Stats()
+    clients: List[Client] = []
+    for conversation_id, members in conversations.items():
+        for user_id in members:
+            token = create_access_token({"sub": str(user_id), "role": "patient"})
+            clients.append(Client(user_id, token, conversation_id, len(members), stats, args.subprotocol))
+
+    gate = asyncio.Semaphore(args.connect_concurrency)
+
+    async def open_socket(client: Client):
+        async with gate:
+            try:
+                await client.connect(base_url)
+            except Exception as e:
+                stats.connect_failures += 1
+                stats.connect_errors[type(e).__name__] = stats.connect_errors.get(type(e).__name__, 0) + 1
+                if isinstance(e, OSError) and e.errno == 24:
+                    print("Too many open files: raise `ulimit -n` for large runs", file=sys.stderr)
+
+    started = time.monotonic()
+    await asyncio.gather(*(open_socket(client) for client in clients))
+    connected = [client for client in clients if client.socket is not None]
+    print(f"Connected {len(connected)}/{len(clients)} sockets in {time.monotonic() - started:.1f}s")
+    if stats.connect_errors:
+        print(f"Connect failures: {stats.connect_errors}")
+    # Only sockets that are actually open can be expected to receive anything.
+    online: Dict[int, int] = {}
+    for client in connected:
+        online[client.conversation_id] = online.get(client.conversation_id, 0) + 1
+    for client in connected:
+        client.members = online[client.conversation_id]
+
+    receivers = [asyncio.create_task(client.receive_forever()) for client in connected]
+    senders = [client for client in connected if random.random() < args.senders]
+    if sampler:
+        sampler.sample()
+
+    begin = time.monotonic()
+    stop_at = begin + args.duration
+    drivers = [asyncio.create_task(drive(client, args, stop_at)) for client in senders]
+
+    async def sample_loop():
+        while True:
+            if sampler:
+                sampler.sample()
+            await asyncio.sleep(1)
+
+    sampling = asyncio.create_task(sample_loop())
+    await asyncio.gather(*drivers, return_exceptions=True)
+    send_window = time.monotonic() - begin
+    drain_until = time.monotonic() + args.drain
+    while stats.pending and time.monotonic() < drain_until:
+        await asyncio.sleep(0.1)
+    elapsed = time.monotonic() - begin
+    sampling.cancel()
+    if sampler:
+        sampler.sample()
+
+    for client in connected:
+        await client.socket.close()
+    for task in receivers:
+        task.cancel()
+
+    dropped = sum(stats.pending.values())
+    latencies_ms = [value * 1000 for value in stats.latencies]
+    print()
+    print(f"Pattern            {args.pattern} ({len(conversations)} conversations, {len(senders)} senders)")
+    print(f"Sent               {stats.sent} messages in {send_window:.1f}s ({stats.sent / send_window:.0f} msg/s)")
+    print(f"Delivered          {stats.received}/{stats.expected} frames ({stats.received / elapsed:.0f} frames/s)")
+    print(f"Dropped            {dropped} ({100 * dropped / max(stats.expected, 1):.2f}%)")
+    print(f"Errors             {stats.errors} error frames, {stats.connect_failures} failed connects")
+    if latencies_ms:
+        print(
+            "Latency ms         "
+            f"p50 {percentile(latencies_ms, 0.5):.1f}  p90 {percentile(latencies_ms, 0.9):.1f}  "
+            f"p99 {percentile(latencies_ms, 0.99):.1f}  max {max(latencies_ms):.1f}  "
+            f"mean {statistics.fmean(latencies_ms):.1f}"
+        )
+    if sampler:
+        print(
+            f"Server             RSS {sampler.last_rss / 2**20:.0f} MiB (peak {sampler.peak_rss / 2**20:.0f} MiB), "
+            f"CPU {sampler.cpu_percent:.0f}%"
+        )
+
+
+def main():
+    args = parse_args()
+    os.environ["DATABASE_URL"] = args.database_url
+    os.environ["DATABASE_ECHO"] = "false"
+    if args.reset and args.database_url.startswith("sqlite:///"):
+        path = args.database_url[len("sqlite:///"):]
+        if os.path.exists(path):
+            os.remove(path)
+
+    conversations = seed(args)
+    print(f"Seeded {sum(len(members) for members in conversations.values())} users in {len(conversations)} conversations")
+
+    process = None
+    sampler = None
+    base_url = args.url
+    if base_url is None:
+        port = args.port or free_port()
+        process = start_server(args, port)
+        sampler = ProcessSampler(process.pid)
+        base_url = f"ws://127.0.0.1:{port}"
+
+    try:
+        asyncio.run(run(args, base_url, conversations, sampler))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=30)
+
+
+if __name__ == "__main__":
+    main()
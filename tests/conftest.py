@@ -0,0 +1,66 @@
+import os
+import sys
+import tempfile
+import uuid
+from pathlib import Path
+
+# Settings are read at import time, so point the app at a throwaway
+# database before anything imports it.
+_db_dir = tempfile.mkdtemp(prefix="connectedcare-tests-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_db_dir}/test.db")
+os.environ.setdefault("DATABASE_ECHO", "false")
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import pytest  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def database():
+    from app.database import engine, init_db
+
+    init_db()
+    return engine
+
+
+@pytest.fixture
+def make_user(database):
+    """Create an active user; returns its id."""
+    from sqlmodel import Session
+
+    from app.models.user import User, UserRole, UserStatus
+
+    def make() -> int:
+        with Session(database) as session:
+            user = User(
+                email=f"{uuid.uuid4().hex}@example.com",
+                hashed_password="x",
+                full_name="Test User",
+                role=UserRole.PATIENT,
+                status=UserStatus.ACTIVE,
+            )
+            session.add(user)
+            session.commit()
+            return user.id
+
+    return make
+
+
+@pytest.fixture
+def make_conversation(database):
+    """Create a titled conversation between the given user ids; returns its id."""
+    from sqlmodel import Session
+
+    from app.models.chat import Conversation, ConversationParticipant
+
+    def make(*user_ids: int) -> int:
+        with Session(database) as session:
+            conversation = Conversation(title=f"room {uuid.uuid4().hex[:6]}")
+            session.add(conversation)
+            session.flush()
+            for user_id in user_ids:
+                session.add(ConversationParticipant(conversation_id=conversation.id, user_id=user_id))
+            session.commit()
+            return conversation.id
+
+    return make
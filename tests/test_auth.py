@@ -0,0 +1,71 @@
+import uuid
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from passlib.hash import bcrypt
+from sqlmodel import Session, select
+
+from app.models.email_outbox import EmailOutbox
+from app.models.user import User, UserRole, UserStatus
+from app.models.verification import EmailVerification
+from app.routers import auth, chat
+from app.utils.security import create_access_token
+
+
+def test_login_upgrades_an_outdated_hash(database):
+    email = f"{uuid.uuid4().hex}@example.com"
+    with Session(database) as session:
+        user = User(
+            email=email,
+            hashed_password=bcrypt.using(rounds=4).hash("correct horse"),
+            full_name="Test User",
+            role=UserRole.PATIENT,
+            status=UserStatus.ACTIVE,
+            is_email_verified=True,
+        )
+        session.add(user)
+        session.commit()
+        user_id = user.id
+
+    app = FastAPI()
+    app.include_router(auth.router)
+    with TestClient(app) as client:
+        wrong = client.post("/login", data={"username": email, "password": "wrong"})
+        assert wrong.status_code == 401
+        response = client.post("/login", data={"username": email, "password": "correct horse"})
+        assert response.status_code == 200
+        assert response.json()["user"]["id"] == user_id
+
+    with Session(database) as session:
+        assert session.get(User, user_id).hashed_password.startswith(f"$2b${auth.settings.BCRYPT_ROUNDS:02d}$")
+
+
+def test_register_stores_the_user_and_queues_verification(database):
+    email = f"{uuid.uuid4().hex}@example.com"
+    app = FastAPI()
+    app.include_router(auth.router)
+    payload = {"email": email, "password": "correct horse", "first_name": "Ada", "last_name": "Lovelace"}
+    with TestClient(app) as client:
+        response = client.post("/register", json=payload)
+        assert response.status_code == 200
+        assert response.json()["user"]["name"] == "Ada Lovelace"
+        assert client.post("/register", json=payload).status_code == 400
+
+    with Session(database) as session:
+        user = session.exec(select(User).where(User.email == email)).one()
+        assert user.status == UserStatus.PENDING
+        assert session.exec(select(EmailVerification).where(EmailVerification.email == email)).one()
+        assert session.exec(select(EmailOutbox).where(EmailOutbox.recipient == email)).one().kind == "verification"
+
+
+def test_logged_out_token_is_rejected(make_user):
+    user_id = make_user()
+    token = create_access_token({"sub": str(user_id)})
+    app = FastAPI()
+    app.include_router(auth.router)
+    app.include_router(chat.router)
+    headers = {"Authorization": f"Bearer {token}"}
+    with TestClient(app) as client:
+        assert client.get(f"/users/{user_id}/conversations", headers=headers).status_code == 200
+        assert client.post("/logout", headers=headers).status_code == 204
+        assert client.get(f"/users/{user_id}/conversations", headers=headers).status_code == 401
@@ -0,0 +1,57 @@
+import json
+from datetime import datetime, timedelta
+
+from sqlmodel import Session, func, select
+
+from app.models.chat import Conversation, Message
+from app.services import chat_export
+from app.services.chat_archive import archive_cold_messages
+from app.services.chat_export import conversation_header, export_json
+
+
+def _old_conversation(engine, make_user, make_conversation, count):
+    author, reader = make_user(), make_user()
+    conversation_id = make_conversation(author, reader)
+    old = datetime.utcnow() - timedelta(days=400)
+    with Session(engine) as session:
+        for seq in range(1, count + 1):
+            session.add(Message(conversation_id=conversation_id, sender_id=author, seq=seq, content=f"old {seq}", timestamp=old))
+        conversation = session.get(Conversation, conversation_id)
+        conversation.last_seq = count
+        session.add(conversation)
+        session.commit()
+        return conversation_id, conversation_header(conversation)
+
+
+def _archive(engine):
+    return archive_cold_messages(engine, older_than=timedelta(days=180), block_size=4, max_blocks=100)
+
+
+def test_newest_row_stays_hot_so_ids_are_not_reused(database, make_user, make_conversation):
+    conversation_id, _ = _old_conversation(database, make_user, make_conversation, 6)
+    with Session(database) as session:
+        newest_id = session.exec(select(func.max(Message.id))).one()
+
+    assert _archive(database) == 5
+
+    with Session(database) as session:
+        assert session.exec(select(Message.id).where(Message.conversation_id == conversation_id)).all() == [newest_id]
+        message = Message(conversation_id=conversation_id, sender_id=1, seq=7, content="new")
+        session.add(message)
+        session.commit()
+        assert message.id > newest_id
+
+
+def test_export_keeps_rows_archived_mid_read(database, make_user, make_conversation, monkeypatch):
+    conversation_id, header = _old_conversation(database, make_user, make_conversation, 10)
+    # A second, newer conversation so this one can be archived completely
+    _old_conversation(database, make_user, make_conversation, 1)
+    message_rows = chat_export._message_rows
+
+    def archive_first(session, conversation_id, after_seq=0):
+        _archive(database)
+        return message_rows(session, conversation_id, after_seq)
+
+    monkeypatch.setattr(chat_export, "_message_rows", archive_first)
+    document = json.loads("".join(export_json(conversation_id, header)))
+    assert [message["seq"] for message in document["messages"]] == list(range(1, 11))
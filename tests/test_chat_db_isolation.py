@@ -0,0 +1,62 @@
+import threading
+import time
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.routers import chat
+from app.utils.security import create_access_token
+
+
+def _token(user_id: int) -> str:
+    return create_access_token({"sub": str(user_id)})
+
+
+def test_stalled_write_does_not_hold_up_other_conversations(make_user, make_conversation, monkeypatch):
+    slow, slow_peer, sender, recipient = (make_user() for _ in range(4))
+    slow_room = make_conversation(slow, slow_peer)
+    busy_room = make_conversation(sender, recipient)
+
+    # Hold the slow sender's message write on its DB thread until released
+    release = threading.Event()
+    stalled = threading.Event()
+    original = chat.run_in_session
+
+    def blocking(fn):
+        def unit(session, user_id, *args, **kwargs):
+            if user_id == slow:
+                stalled.set()
+                assert release.wait(timeout=5)
+            return fn(session, user_id, *args, **kwargs)
+        return unit
+
+    async def run_in_session(fn, *args, **kwargs):
+        if fn is chat._store_message:
+            fn = blocking(fn)
+        return await original(fn, *args, **kwargs)
+
+    monkeypatch.setattr(chat, "run_in_session", run_in_session)
+
+    app = FastAPI()
+    app.include_router(chat.router)
+    with TestClient(app) as client:
+        with client.websocket_connect(f"/ws?token={_token(slow)}") as slow_socket, \
+                client.websocket_connect(f"/ws?token={_token(sender)}") as sender_socket, \
+                client.websocket_connect(f"/ws?token={_token(recipient)}") as recipient_socket:
+            slow_socket.send_json({"conversation_id": slow_room, "content": "stuck"})
+            assert stalled.wait(timeout=5)
+
+            try:
+                for n in range(3):
+                    sent_at = time.monotonic()
+                    sender_socket.send_json({"conversation_id": busy_room, "content": f"hello {n}"})
+                    received = recipient_socket.receive_json()
+                    assert time.monotonic() - sent_at < 2
+                    assert received["conversation_id"] == busy_room
+                    assert received["content"] == f"hello {n}"
+                    assert not release.is_set()
+            finally:
+                release.set()
+
+            echoed = slow_socket.receive_json()
+            assert echoed["content"] == "stuck"
@@ -0,0 +1,46 @@
+from types import SimpleNamespace
+
+from PIL import PdfParser
+from sqlmodel import Session
+
+from app.config import settings
+from app.models.chat import Conversation, Message
+from app.services.chat_export import _Resolver, conversation_header, export_pdf
+
+
+def _conversation_with_messages(engine, make_user, make_conversation, count):
+    author, reader = make_user(), make_user()
+    conversation_id = make_conversation(author, reader)
+    with Session(engine) as session:
+        for seq in range(1, count + 1):
+            session.add(Message(conversation_id=conversation_id, sender_id=author, seq=seq, content=f"message {seq}"))
+        conversation = session.get(Conversation, conversation_id)
+        conversation.last_seq = count
+        session.add(conversation)
+        session.commit()
+        return conversation_id, conversation_header(conversation)
+
+
+def test_pdf_streams_pages_as_they_are_appended(database, make_user, make_conversation, tmp_path):
+    conversation_id, header = _conversation_with_messages(database, make_user, make_conversation, 300)
+
+    stream = export_pdf(conversation_id, header)
+    first = next(stream)
+    assert first.startswith(b"%PDF")
+    rest = list(stream)
+    assert rest, "the transcript should not arrive as a single chunk"
+
+    path = tmp_path / "transcript.pdf"
+    path.write_bytes(first + b"".join(rest))
+    assert len(PdfParser.PdfParser(str(path)).pages) > 1
+
+
+
+def test_attachment_sizes_come_from_the_upload_dir(monkeypatch, tmp_path):
+    (tmp_path / "chat_images").mkdir()
+    (tmp_path / "chat_images" / "scan.png").write_bytes(b"x" * 123)
+    monkeypatch.setattr(settings, "UPLOAD_DIR", str(tmp_path))
+
+    resolved = _Resolver.attachments([SimpleNamespace(attachment_url="/media/chat_images/scan.png")])
+
+    assert resolved["/media/chat_images/scan.png"]["bytes"] == 123
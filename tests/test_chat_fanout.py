@@ -0,0 +1,137 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+from app.chat_manager import ClientConnection, ConnectionManager, OverflowPolicy
+from app.services import chat_broker
+from app.services.chat_broker import InMemoryBroker, InMemoryHub
+from app.services.chat_codec import JsonCodec
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.sent = []
+        self.closed_with = None
+
+    async def send_text(self, data):
+        self.sent.append(json.loads(data))
+
+    async def close(self, code=1000):
+        self.closed_with = code
+
+
+async def _wait_for(predicate, timeout=2.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not predicate():
+        assert asyncio.get_running_loop().time() < deadline, "timed out"
+        await asyncio.sleep(0.01)
+
+
+def _connection(user_id, websocket, **kwargs):
+    options = {"max_queue": 100, "overflow": OverflowPolicy.DROP}
+    options.update(kwargs)
+    return ClientConnection(user_id, websocket, **options)
+
+
+async def test_broadcast_reaches_sockets_on_another_node():
+    hub = InMemoryHub()
+    node_a = ConnectionManager(broker=InMemoryBroker(hub))
+    node_b = ConnectionManager(broker=InMemoryBroker(hub))
+    await node_a.start()
+    await node_b.start()
+    try:
+        sender_socket, recipient_socket = FakeWebSocket(), FakeWebSocket()
+        await node_a.register(_connection(1, sender_socket))
+        await node_b.register(_connection(2, recipient_socket))
+
+        offline = await node_a.broadcast({"event": "message", "id": 7}, [1, 2, 3])
+
+        assert offline == [3]
+        await _wait_for(lambda: recipient_socket.sent and sender_socket.sent)
+        assert recipient_socket.sent == [{"event": "message", "id": 7}]
+        # The sender's own node delivers locally and ignores its echo from the broker
+        await asyncio.sleep(0.05)
+        assert sender_socket.sent == [{"event": "message", "id": 7}]
+    finally:
+        await node_a.stop()
+        await node_b.stop()
+
+
+async def test_unsubscribed_node_stops_receiving():
+    hub = InMemoryHub()
+    node_a = ConnectionManager(broker=InMemoryBroker(hub))
+    node_b = ConnectionManager(broker=InMemoryBroker(hub))
+    await node_a.start()
+    await node_b.start()
+    try:
+        connection = _connection(2, FakeWebSocket())
+        await node_b.register(connection)
+        await node_b.disconnect(connection)
+
+        assert await node_a.broadcast({"event": "message"}, [2]) == [2]
+    finally:
+        await node_a.stop()
+        await node_b.stop()
+
+
+async def test_full_queue_disconnects_once_and_keeps_the_close_task():
+    websocket = FakeWebSocket()
+    connection = _connection(1, websocket, max_queue=1, overflow=OverflowPolicy.DISCONNECT)
+
+    assert connection.enqueue({"n": 1})
+    assert not connection.enqueue({"n": 2})
+    assert not connection.enqueue({"n": 3})
+
+    close_task = connection._close_task
+    assert close_task is not None
+    await close_task
+    assert connection.closed
+    assert websocket.closed_with == 1013
+    assert connection.dropped == 2
+
+
+async def test_broadcast_encodes_once_per_node(monkeypatch):
+    encodes = []
+    encode = JsonCodec.encode
+    monkeypatch.setattr(JsonCodec, "encode", lambda self, event: encodes.append(event) or encode(self, event))
+    dumps = []
+    monkeypatch.setattr(chat_broker, "json", SimpleNamespace(
+        dumps=lambda data: dumps.append(data) or json.dumps(data), loads=json.loads,
+    ))
+    hub = InMemoryHub()
+    node_a = ConnectionManager(broker=InMemoryBroker(hub))
+    node_b = ConnectionManager(broker=InMemoryBroker(hub))
+    await node_a.start()
+    await node_b.start()
+    try:
+        local_sockets = [FakeWebSocket() for _ in range(5)]
+        for user_id, socket in enumerate(local_sockets, start=1):
+            await node_a.register(_connection(user_id, socket))
+        remote_socket = FakeWebSocket()
+        await node_b.register(_connection(6, remote_socket))
+
+        assert await node_a.broadcast({"event": "message", "id": 9}, range(1, 8)) == [7]
+
+        await _wait_for(lambda: remote_socket.sent and all(socket.sent for socket in local_sockets))
+        assert len(dumps) == 1
+        # One frame per node, shared by all of that node's sockets
+        assert len(encodes) == 2
+    finally:
+        await node_a.stop()
+        await node_b.stop()
+
+
+async def test_in_process_broker_is_skipped():
+    node = ConnectionManager(broker=InMemoryBroker())
+    await node.start()
+    try:
+        async def unexpected(*args):
+            raise AssertionError("publish_many should not be called")
+
+        node.broker.publish_many = unexpected
+        socket = FakeWebSocket()
+        await node.register(_connection(1, socket))
+        assert await node.broadcast({"event": "message"}, [1, 2]) == [2]
+        await _wait_for(lambda: socket.sent)
+    finally:
+        await node.stop()
@@ -0,0 +1,21 @@
+from sqlmodel import Session
+
+from app.database import init_db
+from app.models.chat import Conversation, ConversationParticipant
+
+
+def test_restart_does_not_key_group_chats_created_since(database, make_user):
+    first, second = make_user(), make_user()
+    with Session(database) as session:
+        conversation = Conversation(title=None)
+        session.add(conversation)
+        session.flush()
+        for user_id in (first, second):
+            session.add(ConversationParticipant(conversation_id=conversation.id, user_id=user_id))
+        session.commit()
+        conversation_id = conversation.id
+
+    init_db()
+
+    with Session(database) as session:
+        assert session.get(Conversation, conversation_id).direct_key is None
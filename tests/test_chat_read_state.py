@@ -0,0 +1,38 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.routers import chat
+from app.utils.security import create_access_token
+
+
+def _client() -> TestClient:
+    app = FastAPI()
+    app.include_router(chat.router)
+    return TestClient(app)
+
+
+def _headers(user_id: int) -> dict:
+    return {"Authorization": f"Bearer {create_access_token({'sub': str(user_id)})}"}
+
+
+def test_message_read_flags_follow_the_watermark(make_user, make_conversation):
+    author, reader = make_user(), make_user()
+    conversation_id = make_conversation(author, reader)
+    with _client() as client:
+        with client.websocket_connect(f"/ws?token={create_access_token({'sub': str(author)})}") as socket:
+            for n in range(3):
+                socket.send_json({"conversation_id": conversation_id, "content": f"message {n}"})
+                assert socket.receive_json()["is_read"] is False
+
+        receipt = client.post(f"/conversations/{conversation_id}/read", params={"up_to": 2}, headers=_headers(reader))
+        assert receipt.json()["last_read_seq"] == 2
+        assert receipt.json()["unread_count"] == 1
+
+        history = client.get(f"/conversations/{conversation_id}/messages", headers=_headers(author)).json()
+        assert [(item["seq"], item["is_read"]) for item in history["items"]] == [(1, True), (2, True), (3, False)]
+
+        newest = history["items"][-1]["id"]
+        marked = client.patch(f"/messages/{newest}/read", headers=_headers(reader))
+        assert marked.json()["is_read"] is True
+        history = client.get(f"/conversations/{conversation_id}/messages", headers=_headers(reader)).json()
+        assert all(item["is_read"] for item in history["items"])
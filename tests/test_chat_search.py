@@ -0,0 +1,43 @@
+from sqlmodel import Session
+
+from app.models.chat import Message
+from app.services.chat_search import _like_search, search_messages
+
+
+def _post(engine, conversation_id, sender_id, *contents):
+    with Session(engine) as session:
+        for seq, content in enumerate(contents, start=1):
+            session.add(Message(conversation_id=conversation_id, sender_id=sender_id, seq=seq, content=content))
+        session.commit()
+
+
+def test_search_only_matches_the_callers_conversations(database, make_user, make_conversation):
+    caller, peer, stranger = make_user(), make_user(), make_user()
+    mine = make_conversation(caller, peer)
+    theirs = make_conversation(stranger, peer)
+    _post(database, mine, peer, "zebra crossing at noon", "no match here", "zebra again")
+    _post(database, theirs, stranger, "zebra in someone else's chat")
+
+    with Session(database) as session:
+        hits, cursor = search_messages(session, caller, "zebra", limit=1)
+        assert [hit["conversation_id"] for hit in hits] == [mine]
+        more, last_cursor = search_messages(session, caller, "zebra", limit=5, cursor=cursor)
+
+    assert {hit["conversation_id"] for hit in more} == {mine}
+    assert len(hits + more) == 2
+    assert last_cursor is None
+
+
+def test_like_fallback_pages_newest_first(database, make_user, make_conversation):
+    caller, peer, stranger = make_user(), make_user(), make_user()
+    mine = make_conversation(caller, peer)
+    _post(database, mine, peer, "walrus one", "walrus two", "walrus three")
+    _post(database, make_conversation(stranger, peer), stranger, "walrus elsewhere")
+
+    with Session(database) as session:
+        first = _like_search(session, caller, "walrus", after_id=None, limit=2)
+        assert [hit["seq"] for hit in first] == [3, 2]
+        rest = _like_search(session, caller, "walrus", after_id=first[-1]["message_id"], limit=2)
+        assert [hit["seq"] for hit in rest] == [1]
+        # Every term has to appear
+        assert [hit["seq"] for hit in _like_search(session, caller, "walrus two", after_id=None, limit=5)] == [2]
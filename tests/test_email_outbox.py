@@ -0,0 +1,188 @@
+import asyncio
+import socket
+from datetime import datetime, timedelta
+
+import pytest
+from aiosmtpd.controller import Controller
+from sqlalchemy import delete, update
+from sqlmodel import Session, select
+
+from app.config import settings
+from app.models.email_outbox import EmailOutbox, EmailStatus
+from app.services.email_outbox import CircuitBreaker, EmailOutboxWorker, SmtpPool, enqueue_email
+
+
+class Server:
+    """Local SMTP server that can be taken down and brought back on the same port."""
+
+    def __init__(self, handler, port: int):
+        self.handler = handler
+        self.port = port
+        self.controller = None
+
+    def start(self) -> None:
+        self.controller = Controller(self.handler, hostname="127.0.0.1", port=self.port)
+        self.controller.start()
+
+    def stop(self) -> None:
+        if self.controller is not None:
+            self.controller.stop()
+            self.controller = None
+
+
+class Sink:
+    """aiosmtpd handler that records deliveries and refuses chosen recipients with a 451."""
+
+    def __init__(self):
+        self.received = []
+        self.refuse = set()
+
+    async def handle_DATA(self, server, session, envelope):
+        if self.refuse & set(envelope.rcpt_tos):
+            return "451 Try again later"
+        self.received.append((session.peer, envelope.rcpt_tos[0]))
+        return "250 OK"
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture
+def smtp(database, monkeypatch):
+    """A local SMTP sink; the outbox starts empty and points at it."""
+    with Session(database) as session:
+        session.execute(delete(EmailOutbox))
+        session.commit()
+    port = _free_port()
+    for name, value in {
+        "MAIL_SERVER": "127.0.0.1", "MAIL_PORT": port, "MAIL_STARTTLS": False, "MAIL_SSL_TLS": False,
+        "USE_CREDENTIALS": False, "EMAIL_SMTP_POOL_SIZE": 1, "EMAIL_SMTP_TIMEOUT_SECONDS": 2,
+    }.items():
+        monkeypatch.setattr(settings, name, value)
+    sink = Sink()
+    server = Server(sink, port)
+    server.start()
+    yield sink, server
+    server.stop()
+
+
+def _worker(breaker=None, **options) -> EmailOutboxWorker:
+    config = dict(enabled=True, batch_size=10, poll_interval=60, max_attempts=3, retry_base=30, retry_max=3600, lease_seconds=300)
+    config.update(options)
+    return EmailOutboxWorker(SmtpPool(1, idle_timeout=60), breaker or CircuitBreaker(5, 60), **config)
+
+
+def _enqueue(engine, *recipients) -> list:
+    with Session(engine) as session:
+        emails = [enqueue_email(session, recipient, "Hello", "<p>hi</p>", "test") for recipient in recipients]
+        session.commit()
+        return [email.id for email in emails]
+
+
+def _rows(engine, ids) -> list:
+    with Session(engine) as session:
+        rows = session.exec(select(EmailOutbox).where(EmailOutbox.id.in_(ids)).order_by(EmailOutbox.id)).all()
+        for row in rows:
+            session.expunge(row)
+        return list(rows)
+
+
+def _make_due(engine, ids) -> None:
+    with Session(engine) as session:
+        session.execute(update(EmailOutbox).where(EmailOutbox.id.in_(ids)).values(next_attempt_at=datetime.utcnow()))
+        session.commit()
+
+
+async def test_batch_is_sent_over_one_connection(database, smtp):
+    sink, _ = smtp
+    worker = _worker()
+    ids = _enqueue(database, *(f"user{n}@example.com" for n in range(5)))
+
+    assert await worker.run_once() == 5
+    assert sorted(recipient for _, recipient in sink.received) == sorted(f"user{n}@example.com" for n in range(5))
+    assert len({peer for peer, _ in sink.received}) == 1
+
+    # The next batch reuses the pooled connection too
+    more = _enqueue(database, "late@example.com")
+    assert await worker.run_once() == 1
+    assert len({peer for peer, _ in sink.received}) == 1
+    assert all(row.status == EmailStatus.SENT and row.attempts == 1 for row in _rows(database, ids + more))
+    await worker.pool.close()
+
+
+async def test_refused_email_is_retried_with_backoff_then_failed(database, smtp):
+    sink, _ = smtp
+    sink.refuse.add("busy@example.com")
+    worker = _worker(retry_base=30, max_attempts=3)
+    busy, ok = _enqueue(database, "busy@example.com", "ok@example.com")
+
+    for attempt in (1, 2):
+        started = datetime.utcnow()
+        await worker.run_once()
+        row = _rows(database, [busy])[0]
+        assert row.status == EmailStatus.PENDING and row.attempts == attempt
+        delay = (row.next_attempt_at - started).total_seconds()
+        # Exponential with jitter: between half and all of base * 2 ** (attempt - 1)
+        assert 15 * 2 ** (attempt - 1) - 1 <= delay <= 30 * 2 ** (attempt - 1) + 1
+        assert "451" in row.last_error
+        _make_due(database, [busy])
+
+    await worker.run_once()
+    row = _rows(database, [busy])[0]
+    assert row.status == EmailStatus.FAILED and row.attempts == 3
+    # A refused recipient is not a connection failure: the other email went out
+    assert _rows(database, [ok])[0].status == EmailStatus.SENT
+    assert worker.breaker.failures == 0
+    await worker.pool.close()
+
+
+async def test_breaker_opens_then_half_opens(database, smtp):
+    sink, server = smtp
+    server.stop()
+    breaker = CircuitBreaker(threshold=1, reset_timeout=0.3)
+    worker = _worker(breaker)
+    (email_id,) = _enqueue(database, "patient@example.com")
+
+    await worker.run_once()
+    assert breaker.is_open
+    row = _rows(database, [email_id])[0]
+    # Held back by the breaker, so no attempt is spent
+    assert row.status == EmailStatus.PENDING and row.attempts == 0
+
+    _make_due(database, [email_id])
+    assert await worker.run_once() == 0
+
+    # Half-open: one trial batch goes through; a failure reopens the breaker
+    await asyncio.sleep(0.35)
+    assert breaker.allow()
+    _make_due(database, [email_id])
+    await worker.run_once()
+    assert breaker.is_open
+
+    # Once the server is back the trial succeeds and closes the breaker
+    await asyncio.sleep(0.35)
+    server.start()
+    _make_due(database, [email_id])
+    assert await worker.run_once() == 1
+    assert not breaker.is_open and breaker.failures == 0
+    assert _rows(database, [email_id])[0].status == EmailStatus.SENT
+    assert [recipient for _, recipient in sink.received] == ["patient@example.com"]
+    await worker.pool.close()
+
+
+async def test_unbuildable_email_fails_alone(database, smtp):
+    sink, _ = smtp
+    worker = _worker(max_attempts=1)
+    bad, good = _enqueue(database, "victim@example.com\r\nBcc: everyone@example.com", "ok@example.com")
+
+    assert await worker.run_once() == 2
+    bad_row, good_row = _rows(database, [bad, good])
+    assert bad_row.status == EmailStatus.FAILED and bad_row.attempts == 1
+    assert bad_row.last_error
+    assert good_row.status == EmailStatus.SENT
+    assert [recipient for _, recipient in sink.received] == ["ok@example.com"]
+    assert worker.breaker.failures == 0
+    await worker.pool.close()
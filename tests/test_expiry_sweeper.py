@@ -0,0 +1,34 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete
+from sqlmodel import Session, select
+
+from app.models.human_assist import HumanAssistRequest
+from app.services.expiry_sweeper import _strip_assist_attachments
+
+
+def test_attachment_strip_moves_past_rows_it_has_seen(database):
+    old = datetime.utcnow() - timedelta(days=60)
+    with Session(database) as session:
+        session.execute(delete(HumanAssistRequest))
+        for n in range(5):
+            attachments = [{"name": f"scan{n}.png", "kind": "image", "base64": "aGVsbG8=" if n % 2 else None}]
+            session.add(HumanAssistRequest(
+                mode="chat", service="pharmacist", summary=f"request {n}", status="resolved",
+                attachments=attachments, updated_at=old,
+            ))
+        session.commit()
+
+    cutoff = datetime.utcnow() - timedelta(days=30)
+    runs = []
+    with Session(database) as session:
+        for _ in range(4):
+            runs.append(_strip_assist_attachments(session, cutoff, batch_size=2, max_batches=1))
+
+    # Requests 1 and 3 carry file data; each run picks up where the last one stopped
+    assert runs == [1, 1, 0, 0]
+    with Session(database) as session:
+        requests = session.exec(select(HumanAssistRequest)).all()
+        assert all(request.attachments_stripped_at is not None for request in requests)
+        assert all(request.attachments[0]["base64"] is None for request in requests)
+        assert all(request.attachments[0]["name"] for request in requests)
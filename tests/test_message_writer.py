@@ -0,0 +1,102 @@
+import asyncio
+import uuid
+
+from sqlalchemy.exc import OperationalError
+from sqlmodel import Session, select
+
+from app.models.chat import Conversation, ConversationParticipant, Message, MessageDeadLetter
+from app.models.user import User, UserRole, UserStatus
+from app.services.message_writer import MessageWriteBehind
+
+
+def _writer(**overrides):
+    options = {"enabled": True, "flush_interval_ms": 10, "max_batch": 100, "id_block_size": 10, "seq_cache_size": 100}
+    options.update(overrides)
+    return MessageWriteBehind(**options)
+
+
+def _conversation(engine):
+    with Session(engine) as session:
+        user = User(
+            email=f"{uuid.uuid4().hex}@example.com",
+            hashed_password="x",
+            full_name="Writer Test",
+            role=UserRole.PATIENT,
+            status=UserStatus.ACTIVE,
+        )
+        conversation = Conversation(title="write-behind")
+        session.add(user)
+        session.add(conversation)
+        session.flush()
+        session.add(ConversationParticipant(conversation_id=conversation.id, user_id=user.id))
+        session.commit()
+        return conversation.id, user.id
+
+
+def _message(conversation_id, user_id, content="hi"):
+    return Message(conversation_id=conversation_id, sender_id=user_id, content=content)
+
+
+async def test_rejected_rows_go_to_dead_letters(database):
+    conversation_id, user_id = _conversation(database)
+    writer = _writer()
+    message = await writer.submit(_message(conversation_id, user_id), "hi")
+    # Another writer takes the same seq before this batch is flushed
+    with Session(database) as session:
+        session.add(
+            Message(
+                id=message.id + 100000, conversation_id=conversation_id, sender_id=user_id, seq=message.seq, content="other"
+            )
+        )
+        session.commit()
+
+    await writer.flush()
+
+    with Session(database) as session:
+        dead = session.exec(select(MessageDeadLetter).where(MessageDeadLetter.message_id == message.id)).one()
+        assert (dead.conversation_id, dead.seq) == (conversation_id, message.seq)
+        assert '"content": "hi"' in dead.payload
+    assert writer.known_last_seq(conversation_id) is None
+
+
+async def test_cancelled_retry_keeps_the_batch(database, monkeypatch):
+    conversation_id, user_id = _conversation(database)
+    writer = _writer()
+    message = await writer.submit(_message(conversation_id, user_id), "hi")
+
+    attempted = asyncio.Event()
+
+    def failing(*args):
+        attempted.set()
+        raise OperationalError("INSERT", {}, Exception("database is locked"))
+
+    monkeypatch.setattr(writer, "_write_batch", failing)
+    flush = asyncio.create_task(writer.flush())
+    await attempted.wait()
+    flush.cancel()
+    await asyncio.gather(flush, return_exceptions=True)
+    assert writer._pending == [message]
+
+    monkeypatch.undo()
+    await writer.flush()
+    with Session(database) as session:
+        stored = session.get(Message, message.id)
+        assert (stored.conversation_id, stored.seq) == (conversation_id, message.seq)
+        assert session.get(Conversation, conversation_id).last_seq == message.seq
+
+
+async def test_idle_seq_counters_are_evicted(database):
+    first, user_id = _conversation(database)
+    second, _ = _conversation(database)
+    writer = _writer(seq_cache_size=1)
+    await writer.submit(_message(first, user_id), "one")
+    await writer.submit(_message(second, user_id), "two")
+
+    await writer.flush()
+
+    assert writer.known_last_seq(first) is None
+    assert writer.known_last_seq(second) == 1
+    # An evicted conversation reloads its counter from the table
+    message = await writer.submit(_message(first, user_id), "three")
+    assert message.seq == 2
+    await writer.flush()